@@ -35,60 +35,39 @@ os.environ["PHOENIX_CLIENT_HEADERS"] = f"api_key={os.getenv('PHOENIX_API_KEY')}"
 # - Visual Interface - View all this data in Phoenix's web dashboard
 # This is particularly valuable for debugging complex agent workflows and understanding how your LlamaIndex agents are performing in production.
 
-from openinference.instrumentation.llama_index import LlamaIndexInstrumentor
-from phoenix.otel import register
+from tracing import setup_tracing
 
-tracer_provider = register(
+# tracing (see tracing.py, TRACING_EXPORT=file|otlp|none)
+tracer_provider = setup_tracing(
   project_name="llamaindex_agents_project-sunday",
   endpoint="https://app.phoenix.arize.com/s/bhoga01-ai/v1/traces",
-  auto_instrument=True
 )
-
-LlamaIndexInstrumentor().instrument(tracer_provider=tracer_provider)
+# metrics (see metrics.py)
+from metrics import enable_metrics
+metrics = enable_metrics()
 
 # import libraries
-from llama_index.llms.google_genai import GoogleGenAI
-from google.genai import types
-from tavily import AsyncTavilyClient
+from llm_factory import google_genai_llm
+from tool_registry import get_tool
+from call_policy import turn_budget
 from llama_index.core.agent.workflow import FunctionAgent
 import asyncio
 
 #STEP 1. LLM  - openAI
 # llm = OpenAI(model="gpt-4o-mini", temperature=0.5)
-llm = GoogleGenAI(
-    model="gemini-2.5-flash",temperature=0.5,
-    generation_config=types.GenerateContentConfig(
-        thinking_config=types.ThinkingConfig(
-            thinking_budget=0
-        )  # Disables thinking
-    ),
-)
+# shared LLM client (see llm_factory.py)
+llm = google_genai_llm(model="gemini-2.5-flash", temperature=0.5)
+# Gemini rate-limit priority (see rate_limiter.py)
+from rate_limiter import set_priority
+set_priority("interactive")
 # LLM test
 # prompt="who are you"
 # response=llm.complete(prompt)
 # print(response)
 
 # 2. Tools - one search tool
-# Tavily API
-async def search_web(query: str) -> str:
-    """
-    Search the web using Tavily API and return results as a string.
-    Args:
-        query (str): The search query to execute
-    Returns:
-        str: Search results from Tavily API
-    Raises:
-        TavilyError: If the API request fails
-    """
-    try:
-        client = AsyncTavilyClient()
-        result = await client.search(query)
-        return str(result)
-    except Exception as e:
-        # Handle any errors that occur during the search
-        error_message = f"Error occurred during web search: {str(e)}"
-        print(f"Search error: {error_message}")
-        return f"Search failed: {error_message}"
+# shared Tavily search tool (see tool_registry.py)
+search_web = get_tool("tavily_search").llama_index(name="search_web")
 
 # STEP 3
 # create an functon agent 
@@ -118,7 +97,8 @@ async def main():
             print("Goodbye!")
             break
         try:
-            response = await agent.run(user_msg=user_msg)
+            with turn_budget():
+                response = await agent.run(user_msg=user_msg)
             print(f"Agent: {response}")
         except Exception as e:
             print(f"Error: {e}")
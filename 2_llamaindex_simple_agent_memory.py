@@ -30,9 +30,11 @@ load_dotenv()
 
 # import libraries
 from llama_index.llms.openai import OpenAI
-from llama_index.llms.google_genai import GoogleGenAI
-from google.genai import types
-from tavily import AsyncTavilyClient
+from llm_factory import google_genai_llm
+from tool_registry import get_tool
+from call_policy import turn_budget
+from state_store import read_state, write_state
+from fast_path import FastPath
 from llama_index.core.agent.workflow import FunctionAgent
 import asyncio
 from llama_index.core.workflow import Context
@@ -40,55 +42,34 @@ from llama_index.core.workflow import JsonPickleSerializer, JsonSerializer
 import os
 os.environ["PHOENIX_CLIENT_HEADERS"] = f"api_key={os.getenv('PHOENIX_API_KEY')}"
 
-from openinference.instrumentation.llama_index import LlamaIndexInstrumentor
-from phoenix.otel import register
+from tracing import setup_tracing
 
-tracer_provider = register(
+# tracing (see tracing.py, TRACING_EXPORT=file|otlp|none)
+tracer_provider = setup_tracing(
   project_name="llamaindex_agents_project-sunday",
   endpoint="https://app.phoenix.arize.com/s/bhoga01-ai/v1/traces",
-  auto_instrument=True
 )
-
-LlamaIndexInstrumentor().instrument(tracer_provider=tracer_provider)
+# metrics (see metrics.py)
+from metrics import enable_metrics
+metrics = enable_metrics()
 
 #STEP 1. LLM  - openAI
 
 # llm = OpenAI(model="gpt-4o-mini", temperature=0.5)
 
-llm = GoogleGenAI(
-    model="gemini-2.5-flash",temperature=0.5,
-    generation_config=types.GenerateContentConfig(
-        thinking_config=types.ThinkingConfig(
-            thinking_budget=0
-        )  # Disables thinking
-    ),
-)
+# shared LLM client (see llm_factory.py)
+llm = google_genai_llm(model="gemini-2.5-flash", temperature=0.5)
+# Gemini rate-limit priority (see rate_limiter.py)
+from rate_limiter import set_priority
+set_priority("interactive")
 # LLM test
 # prompt="who are you"
 # response=llm.complete(prompt)
 # print(response)
 
 # 2. Tools - one search tool
-# Tavily API
-async def search_web(query: str) -> str:
-    """
-    Search the web using Tavily API and return results as a string.
-    Args:
-        query (str): The search query to execute
-    Returns:
-        str: Search results from Tavily API
-    Raises:
-        TavilyError: If the API request fails
-    """
-    try:
-        client = AsyncTavilyClient()
-        result = await client.search(query)
-        return str(result)
-    except Exception as e:
-        # Handle any errors that occur during the search
-        error_message = f"Error occurred during web search: {str(e)}"
-        print(f"Search error: {error_message}")
-        return f"Search failed: {error_message}"
+# shared Tavily search tool (see tool_registry.py)
+search_web = get_tool("tavily_search").llama_index(name="search_web")
 
 
 
@@ -116,6 +97,8 @@ agent = FunctionAgent(
 # STEP 4 ADD state to agent.
 
 ctx = Context(agent)
+# arithmetic and repeated search questions are answered locally and recorded in ctx (see fast_path.py)
+fast_path = FastPath(agent, add=add_two_numbers, search=get_tool("tavily_search"))
 # STEP 5
 # Execute the agent with a query
 
@@ -124,10 +107,12 @@ async def main():
     while True:
         user_msg = input("user: ")
         if user_msg.lower() in ['quit', 'exit', 'bye']:
+            print(fast_path.report())
             print("Goodbye!")
             break
         try:
-            response = await agent.run(user_msg=user_msg,ctx=ctx)
+            with turn_budget():
+                response = await fast_path.run(user_msg, ctx=ctx)
             print(f"Agent: {response}")
         except Exception as e:
             print(f"Error: {e}")
@@ -140,12 +125,11 @@ if __name__ == "__main__":
     try:
         ctx_dict = ctx.to_dict(serializer=JsonSerializer())
         
-        # Save to file manually
-        import json
-        with open("agent_state.json", "w") as f:
-            json.dump(ctx_dict, f, indent=2)
+        # Save to file; large tool outputs are stored once in .agent_state_blobs/ and referenced (see state_store.py)
+        saved = write_state("agent_state.json", ctx_dict)
         
-        print("Agent state saved to agent_state.json")
+        print(f"Agent state saved to agent_state.json ({saved['state_bytes'] / 1024:.1f} KB, "
+              f"{saved['texts']} large texts moved to blobs)")
     except Exception as e:
         print(f"Error saving state: {e}")
 
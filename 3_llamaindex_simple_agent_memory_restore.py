@@ -30,52 +30,36 @@ load_dotenv()
 
 # import libraries
 from llama_index.llms.openai import OpenAI
-from llama_index.llms.google_genai import GoogleGenAI
-from google.genai import types
-from tavily import AsyncTavilyClient
+from llm_factory import google_genai_llm
+from tool_registry import get_tool
+from call_policy import turn_budget
+from state_store import read_state, write_state
 from llama_index.core.agent.workflow import FunctionAgent
 import asyncio
 from llama_index.core.workflow import Context
 from llama_index.core.workflow import JsonPickleSerializer, JsonSerializer
 import json
+# metrics (see metrics.py)
+from metrics import enable_metrics
+metrics = enable_metrics()
+
 #STEP 1. LLM  - openAI
 
 # llm = OpenAI(model="gpt-4o-mini", temperature=0.5)
 
-llm = GoogleGenAI(
-    model="gemini-2.5-flash",temperature=0.5,
-    generation_config=types.GenerateContentConfig(
-        thinking_config=types.ThinkingConfig(
-            thinking_budget=0
-        )  # Disables thinking
-    ),
-)
+# shared LLM client (see llm_factory.py)
+llm = google_genai_llm(model="gemini-2.5-flash", temperature=0.5)
+# Gemini rate-limit priority (see rate_limiter.py)
+from rate_limiter import set_priority
+set_priority("interactive")
 # LLM test
 # prompt="who are you"
 # response=llm.complete(prompt)
 # print(response)
 
 # 2. Tools - one search tool
-# Tavily API
-async def search_web(query: str) -> str:
-    """
-    Search the web using Tavily API and return results as a string.
-    Args:
-        query (str): The search query to execute
-    Returns:
-        str: Search results from Tavily API
-    Raises:
-        TavilyError: If the API request fails
-    """
-    try:
-        client = AsyncTavilyClient()
-        result = await client.search(query)
-        return str(result)
-    except Exception as e:
-        # Handle any errors that occur during the search
-        error_message = f"Error occurred during web search: {str(e)}"
-        print(f"Search error: {error_message}")
-        return f"Search failed: {error_message}"
+# shared Tavily search tool (see tool_registry.py)
+search_web = get_tool("tavily_search").llama_index(name="search_web")
 
 # STEP 3
 # create an functon agent 
@@ -96,8 +80,8 @@ agent = FunctionAgent(
 # STEP 4 restore the state from the file
 # Restore the context state from the file
 try:
-    with open("agent_state.json", "r") as f:
-        ctx_dict = json.load(f)
+    # tool outputs stay blob references until sent to the model; a missing blob raises (see state_store.py)
+    ctx_dict = read_state("agent_state.json")
     ctx = Context.from_dict(agent, ctx_dict, serializer=JsonSerializer())
     print("Agent state restored from agent_state.json")
     print(ctx_dict)
@@ -119,7 +103,8 @@ async def main():
             print("Goodbye!")
             break
         try:
-            response = await agent.run(user_msg=user_msg,ctx=ctx)
+            with turn_budget():
+                response = await agent.run(user_msg=user_msg,ctx=ctx)
             print(f"Agent: {response}")
         except Exception as e:
             print(f"Error: {e}")
@@ -132,12 +117,11 @@ if __name__ == "__main__":
     try:
         ctx_dict = ctx.to_dict(serializer=JsonSerializer())
         
-        # Save to file manually
-        import json
-        with open("agent_state.json", "w") as f:
-            json.dump(ctx_dict, f, indent=2)
+        # Save to file; large tool outputs are stored once in .agent_state_blobs/ and referenced (see state_store.py)
+        saved = write_state("agent_state.json", ctx_dict)
         
-        print("Agent state saved to agent_state.json")
+        print(f"Agent state saved to agent_state.json ({saved['state_bytes'] / 1024:.1f} KB, "
+              f"{saved['texts']} large texts moved to blobs)")
     except Exception as e:
         print(f"Error saving state: {e}")
 
@@ -22,11 +22,13 @@ load_dotenv()
 
 # import libraries
 from llama_index.llms.openai import OpenAI
-from llama_index.llms.google_genai import GoogleGenAI
-from google.genai import types
+from llm_factory import google_genai_llm
 from tavily import AsyncTavilyClient
+from tool_registry import get_tool
+from call_policy import turn_budget
 from llama_index.core.agent.workflow import FunctionAgent
 import asyncio
+import os
 from llama_index.core.workflow import Context
 from llama_index.core.workflow import JsonPickleSerializer, JsonSerializer
 import json
@@ -38,41 +40,29 @@ from llama_index.core.agent.workflow import (
     AgentStream,
 )
 from llama_index.core.agent.workflow import AgentWorkflow
+# metrics (see metrics.py)
+from metrics import enable_metrics
+metrics = enable_metrics()
 
 #STEP 1. LLM  - openAI
 
 # llm = OpenAI(model="gpt-4o-mini", temperature=0.5)
 
-llm = GoogleGenAI(
-    model="gemini-2.5-flash",temperature=0.5,
-    generation_config=types.GenerateContentConfig(
-        thinking_config=types.ThinkingConfig(
-            thinking_budget=0
-        )  # Disables thinking
-    ),
-)
+# shared LLM client (see llm_factory.py)
+llm = google_genai_llm(model="gemini-2.5-flash", temperature=0.5)
+# Gemini rate-limit priority (see rate_limiter.py)
+from rate_limiter import set_priority
+set_priority("batch")
 
 # STEP 2. Tools - google search tool
 
-google_search_tool = types.Tool(
-    google_search=types.GoogleSearch()
-)
-
-llm_with_search = GoogleGenAI(
-    model="gemini-2.5-pro",
-    generation_config=types.GenerateContentConfig(tools=[google_search_tool])
-)
+# shared grounded search tool, gemini-2.5-pro + Google Search (see tool_registry.py)
+search_web = get_tool("grounded_search").llama_index(name="search_web")
 
 # A simple test
-# response = llm_with_search.complete("What's the weather like today in New Delhi India?")
+# response = get_tool("grounded_search").call(query="What's the weather like today in New Delhi India?")
 # print(response)
 
-async def search_web(ctx: Context, query: str) -> str:
-    """Useful for searching the web about a specific query or topic"""
-    response = await llm_with_search.acomplete(f"""Please research given this query or topic,
-    and return the result\n<query_or_topic>{query}</query_or_topic>""")
-    return response
-
 async def record_notes(ctx: Context, notes: str, notes_title: str) -> str:
     """Useful for recording notes on a given topic."""
     current_state = await ctx.store.get("state")
@@ -175,34 +165,38 @@ including 21st century developments"""
 
 async def main():
     # Move the workflow execution here:
-    handler = agent_workflow.run(user_msg=research_topic)
+    # one budget for the whole research run (RESEARCH_BUDGET_S), shared by every step and tool call
+    with turn_budget(float(os.getenv("RESEARCH_BUDGET_S", 600))):
+        handler = agent_workflow.run(user_msg=research_topic)
     
-    current_agent = None
-    current_tool_calls = ""
-    async for event in handler.stream_events():
-        if (isinstance(event, AgentInput)
-            and hasattr(event, "current_agent_name")
-            and event.current_agent_name != current_agent
-        ):
-            current_agent = event.current_agent_name
-            print(f"\n{'='*50}")
-            print(f"🤖 Agent: {current_agent}")
-            print(f"{'='*50}\n")
-        elif isinstance(event, AgentOutput):
-            if event.response.content:
-                print("📤 Output:", event.response.content)
-            if event.tool_calls:
-                print(
-                    "🛠️  Planning to use tools:",
-                    [call.tool_name for call in event.tool_calls],
-                )
-        elif isinstance(event, ToolCallResult):
-            print(f"🔧 Tool Result ({event.tool_name}):")
-            print(f"  Arguments: {event.tool_kwargs}")
-            print(f"  Output: {event.tool_output}")
-        elif isinstance(event, ToolCall):
-            print(f"🔨 Calling Tool: {event.tool_name}")
-            print(f"  With arguments: {event.tool_kwargs}")
+        current_agent = None
+        current_tool_calls = ""
+        async for event in handler.stream_events():
+            if (isinstance(event, AgentInput)
+                and hasattr(event, "current_agent_name")
+                and event.current_agent_name != current_agent
+            ):
+                current_agent = event.current_agent_name
+                print(f"\n{'='*50}")
+                print(f"🤖 Agent: {current_agent}")
+                print(f"{'='*50}\n")
+            elif isinstance(event, AgentOutput):
+                if event.response.content:
+                    print("📤 Output:", event.response.content)
+                if event.tool_calls:
+                    print(
+                        "🛠️  Planning to use tools:",
+                        [call.tool_name for call in event.tool_calls],
+                    )
+            elif isinstance(event, ToolCallResult):
+                print(f"🔧 Tool Result ({event.tool_name}):")
+                print(f"  Arguments: {event.tool_kwargs}")
+                print(f"  Output: {event.tool_output}")
+            elif isinstance(event, ToolCall):
+                print(f"🔨 Calling Tool: {event.tool_name}")
+                print(f"  With arguments: {event.tool_kwargs}")
+        # wait for the run itself to finish (raises workflow errors, closes the run's metrics span)
+        await handler
     
     # Move these lines inside the main() function:
     print("--------final report and review --------")
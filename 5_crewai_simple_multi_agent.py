@@ -6,36 +6,43 @@ import os
 load_dotenv()
 os.environ["PHOENIX_CLIENT_HEADERS"] = f"api_key={os.getenv('PHOENIX_API_KEY')}"
 
-from crewai import LLM
+from llm_factory import crewai_llm
 import os
 from crewai import Agent, Task, Crew
-from crewai_tools import SerperDevTool
-from google.genai import types
+from tool_registry import get_tool
+from embedding_cache import batch_memory_writes, crew_embedder_config
+from memory_retention import MemoryRetention
+from run_artifacts import ArtifactStore
+from datetime import date
 
-from phoenix.otel import register
+from tracing import setup_tracing
 
-# configure the Phoenix tracer
-tracer_provider = register(
-  project_name="CrewAI-agent-proeject-sunday", # Default is 'default'
-  auto_instrument=True # Auto-instrument your app based on installed OI dependencies
+# tracing (see tracing.py, TRACING_EXPORT=file|otlp|none)
+tracer_provider = setup_tracing(
+  project_name="CrewAI-agent-proeject-sunday",
 )
+# metrics (see metrics.py)
+from metrics import enable_metrics
+metrics = enable_metrics()
+
 # STEP 1: LLM
 
 
-llm = LLM(
-    model="gemini-2.5-flash",temperature=0.0,
-    generation_config=types.GenerateContentConfig(
-        thinking_config=types.ThinkingConfig(
-            thinking_budget=0
-        )  # Disables thinking
-    ),
-)
+# shared LLM client (see llm_factory.py)
+llm = crewai_llm(model="gemini-2.5-flash", temperature=0.0)
+# Gemini rate-limit priority (see rate_limiter.py)
+from rate_limiter import set_priority
+set_priority("batch")
 # STEP 2:  Agent definion
+# shared Serper search tool (see tool_registry.py, SEARCH_BACKEND=offline to run without Serper)
+search = get_tool("serper_search")
+search_tool = search.crewai(name="Search the internet with Serper")
+
 research_agent = Agent(
     role="Research Specialist",
     goal="Research interesting facts about the topic: {topic}",
     backstory="You are an expert at finding relevant and factual data.",
-    tools=[SerperDevTool()],
+    tools=[search_tool],
     verbose=True,
     llm=llm
 )
@@ -69,16 +76,29 @@ crew = Crew(
     tasks=[task1, task2],
     verbose=True,
     memory=True,
-    embedder={
-        "provider": "google",
-        "config": {
-            "api_key": os.getenv("GOOGLE_API_KEY"),
-            "model": "text-embedding-001"
-        }
-    }
+    # cached + batched Google embeddings (see embedding_cache.py)
+    embedder=crew_embedder_config(
+        model="text-embedding-001",
+        api_key=os.getenv("GOOGLE_API_KEY"),
+    )
 )
 
+# memory saves are queued and embedded in batches (see embedding_cache.py)
+batch_memory_writes(crew)
+
+# Bounded memory: per-store caps, eviction, duplicate merging and background compaction
+memory_retention = MemoryRetention(crew).start()
+
 # STEP 5:  Run the crew
 
 # crew.kickoff(inputs={"topic": "The future of electrical vehicles"})
-crew.kickoff(inputs={"topic": "What is the revenue outlook in this sector?"})
\ No newline at end of file
+# Memoized run: skipped when inputs, prompts, tools and model are unchanged (see run_artifacts.py).
+# Web search results are treated as fresh for one day, like the search cache.
+artifacts = ArtifactStore()
+artifacts.kickoff(
+    crew,
+    inputs={"topic": "What is the revenue outlook in this sector?"},
+    extra={"search_day": date.today().isoformat()},
+)
+print(search.report())
+print(memory_retention.report())
\ No newline at end of file
@@ -14,6 +14,8 @@
 # 4. ASSINGN TASKS - Analyze customer support data, Identify issues, Propose improvements for agents
 # 4. Build a multi agent orchestrator that can coordinate the agents -CREW
 # 5. Agent Execution
+#    SUPPORT_CREW_MODE=fanout runs one analysis + optimization crew per issue category
+#    concurrently and merges the results for the report writer.
 
 # STEP 0 - env and import libraries
 
@@ -21,23 +23,28 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # import libraries
-from crewai import LLM
+import asyncio
+import os
+import time
+from llm_factory import crewai_llm
 from crewai.tools import BaseTool
 from crewai import Agent,Task, Crew, Process
-# import google libraries
-from google.genai import types
+# local ticket store with precomputed aggregates
+from ticket_store import DEFAULT_STORE_PATH, TicketStore
+# memoized crew runs
+from run_artifacts import ArtifactStore
+# metrics (see metrics.py)
+from metrics import enable_metrics
+metrics = enable_metrics()
 
 #STEP 1. LLM  - openAI
 # llm = OpenAI(model="gpt-4o-mini", temperature=0.5)
 
-llm = LLM(
-    model="gemini-2.5-flash",temperature=0.0,
-    generation_config=types.GenerateContentConfig(
-        thinking_config=types.ThinkingConfig(
-            thinking_budget=0
-        )  # Disables thinking
-    ),
-)
+# shared LLM client (see llm_factory.py)
+llm = crewai_llm(model="gemini-2.5-flash", temperature=0.0)
+# Gemini rate-limit priority (see rate_limiter.py)
+from rate_limiter import set_priority
+set_priority("batch")
 #A simple test
 # 
 
@@ -48,12 +55,23 @@ class CustomerSupportDataTool(BaseTool):
     name: str = "Customer Support Data Fetcher"
     description: str = (
       "Fetches recent customer support interactions, tickets, and feedback. "
+      "Pass an issue category (e.g. 'login issues') to get details for that category only. "
       "Returns a summary string.")
 
     def _run(self, argument: str) -> str:
-        # In a real scenario, this would query a database or API.
-        # For this example, return simulated data.
         print(f"--- Fetching data for query: {argument} ---")
+        # Answer from the local ticket store once a real export has been ingested
+        # (python ticket_store.py ingest <export.csv>). The summary comes from the
+        # precomputed aggregates, so it stays small and fast even for millions of tickets.
+        if os.path.exists(DEFAULT_STORE_PATH):
+            store = TicketStore()
+            try:
+                if not store.is_empty():
+                    category = argument.strip().lower()
+                    return store.summary(category if category in store.categories() else None)
+            finally:
+                store.close()
+        # Otherwise return simulated data.
         return (
             """Recent Support Data Summary:
 - 50 tickets related to 'login issues'. High resolution time (avg 48h).
@@ -179,12 +197,121 @@ support_analysis_crew = Crew(
     verbose=True
 )
 
+# STEP 5b: FAN-OUT mode - one analysis + optimization crew per issue category
+# In the sequential crew a single analyst works through every category one after another.
+# In fan-out mode each category gets its own small crew; the crews run concurrently
+# (kickoff_async) and the report writer merges their results, so the end-to-end time
+# tracks the slowest category instead of the sum of all categories.
+
+DEFAULT_ISSUE_CATEGORIES = ["login issues", "billing discrepancies", "feature requests", "account verification"]
+MAX_FANOUT_CATEGORIES = 8
+
+def issue_categories() -> list:
+    """Top categories from the ticket store, or the default categories when no export was ingested."""
+    if os.path.exists(DEFAULT_STORE_PATH):
+        store = TicketStore()
+        try:
+            if not store.is_empty():
+                return store.categories()[:MAX_FANOUT_CATEGORIES]
+        finally:
+            store.close()
+    return DEFAULT_ISSUE_CATEGORIES
+
+category_analysis_task = Task(
+    description=(
+        """Fetch and analyze the customer support data for the '{category}' issue category only.
+        Call the Customer Support Data Fetcher tool with '{category}' as the argument.
+        Quantify the frequency and impact of this issue (resolution time, customer sentiment)."""
+    ),
+    expected_output=(
+        """A short analysis of the '{category}' issue category: ticket volume, resolution times,
+        key customer pain points and the sentiment trend."""
+    ),
+    agent=data_analyst
+)
+
+category_optimization_task = Task(
+    description=(
+        """Based on the analysis of the '{category}' issue category, identify the process bottlenecks
+        behind it and propose 1-2 concrete, actionable process improvements."""
+    ),
+    expected_output=(
+        """The main bottlenecks for '{category}' and 1-2 specific, actionable recommendations."""
+    ),
+    agent=process_optimizer,
+    context=[category_analysis_task]
+)
+
+category_crew = Crew(
+    agents=[data_analyst, process_optimizer],
+    tasks=[category_analysis_task, category_optimization_task],
+    process=Process.sequential,
+    verbose=True
+)
+
+fanout_report_task = Task(
+    description=report_task.description + "\n\nFindings per issue category:\n{category_findings}",
+    expected_output=report_task.expected_output,
+    agent=report_writer,
+    output_file="./customer_support_report.txt"
+)
+
+report_crew = Crew(
+    agents=[report_writer],
+    tasks=[fanout_report_task],
+    process=Process.sequential,
+    verbose=True
+)
+
+# Memoized runs: a crew is skipped when its inputs, prompts, model and the ticket data are unchanged
+artifacts = ArtifactStore()
+
+def ticket_data_fingerprint() -> str:
+    """What the Customer Support Data Fetcher would see: the aggregate summary, or the simulated data."""
+    if os.path.exists(DEFAULT_STORE_PATH):
+        store = TicketStore()
+        try:
+            if not store.is_empty():
+                return store.summary(top_n=len(store.categories()))
+        finally:
+            store.close()
+    return "simulated"
+
+async def analyze_category(category: str, extra: dict):
+    """Run the analysis + optimization crew for one category on its own copy of the crew."""
+    start = time.perf_counter()
+    output = await asyncio.to_thread(artifacts.kickoff, category_crew.copy(), {"category": category}, extra)
+    print(f"--- '{category}' analyzed in {time.perf_counter() - start:.1f}s ---")
+    return category, output
+
+async def run_fanout_analysis():
+    categories = issue_categories()
+    print(f"--- Fan-out over {len(categories)} categories: {categories} ---")
+    extra = {"tickets": ticket_data_fingerprint()}
+    results = await asyncio.gather(*(analyze_category(category, extra) for category in categories))
+
+    # Merge: analysis + recommendations of every category for the report writer
+    findings = []
+    for category, output in results:
+        analysis, optimization = output.tasks_output[0].raw, output.tasks_output[1].raw
+        findings.append(f"## {category}\nAnalysis:\n{analysis}\nRecommendations:\n{optimization}")
+    return await asyncio.to_thread(artifacts.kickoff, report_crew, {"category_findings": "\n\n".join(findings)})
+
 # STEP 6: EXECUTE the agents and tasks
 # Start the crew's work
 print("--- Starting Customer Support Analysis Crew ---")
-# The 'inputs' dictionary provides initial context if needed by the first task.
-# In this case, the tool simulates data fetching regardless of the input.
-result = support_analysis_crew.kickoff(inputs={'data_query': 'last quarter support data'})
+start = time.perf_counter()
+if os.getenv("SUPPORT_CREW_MODE", "sequential") == "fanout":
+    result = asyncio.run(run_fanout_analysis())
+else:
+    # The 'inputs' dictionary provides initial context if needed by the first task.
+    # In this case, the tool simulates data fetching regardless of the input.
+    result = artifacts.kickoff(
+        support_analysis_crew,
+        inputs={'data_query': 'last quarter support data'},
+        extra={"tickets": ticket_data_fingerprint()},
+    )
+print(f"--- Crew finished in {time.perf_counter() - start:.1f}s ---")
 
 print("--- Crew Execution Finished ---")
 print("--- Final Report for COO ---")
@@ -1,4 +1,4 @@
- STEP 0 env and import libraries
+# STEP 0 env and import libraries
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -6,29 +6,30 @@ import os
 load_dotenv()
 os.environ["PHOENIX_CLIENT_HEADERS"] = f"api_key={os.getenv('PHOENIX_API_KEY')}"
 
-from crewai import LLM
+from llm_factory import crewai_llm
 import os
 from crewai import Agent, Task, Crew
-from google.genai import types
+from embedding_cache import batch_memory_writes, crew_embedder_config
+from memory_retention import MemoryRetention
 
-from phoenix.otel import register
+from tracing import setup_tracing
 
-# configure the Phoenix tracer
-tracer_provider = register(
-  project_name="CrewAI-invoice-parser-agent",  # Default is 'default'
-  auto_instrument=True # Auto-instrument your app based on installed OI dependencies
+# tracing (see tracing.py, TRACING_EXPORT=file|otlp|none)
+tracer_provider = setup_tracing(
+  project_name="CrewAI-invoice-parser-agent",
 )
+# metrics (see metrics.py)
+from metrics import enable_metrics
+metrics = enable_metrics()
+
 # STEP 1: LLM
 
 
-llm = LLM(
-    model="gemini-2.5-flash",temperature=0.0,
-    generation_config=types.GenerateContentConfig(
-        thinking_config=types.ThinkingConfig(
-            thinking_budget=0
-        )  # Disables thinking
-    ),
-)
+# shared LLM client (see llm_factory.py)
+llm = crewai_llm(model="gemini-2.5-flash", temperature=0.0)
+# Gemini rate-limit priority (see rate_limiter.py)
+from rate_limiter import set_priority
+set_priority("batch")
 ## Tool
 from crewai_tools import PDFSearchTool
 
@@ -65,15 +66,19 @@ crew = Crew(
     tasks=[task1],
     verbose=True,
     memory=True,
-    embedder={
-        "provider": "google",
-        "config": {
-            "api_key": os.getenv("GOOGLE_API_KEY"),
-            "model": "text-embedding-001"
-        }
-    }
+    # cached + batched Google embeddings (see embedding_cache.py)
+    embedder=crew_embedder_config(
+        model="text-embedding-001",
+        api_key=os.getenv("GOOGLE_API_KEY"),
+    )
 )
 
+# memory saves are queued and embedded in batches (see embedding_cache.py)
+batch_memory_writes(crew)
+
+# Bounded memory: per-store caps, eviction, duplicate merging and background compaction
+memory_retention = MemoryRetention(crew).start()
+
 # STEP 5:  Run the crew
 
 # crew.kickoff(inputs={"topic": "The future of electrical vehicles"})
@@ -82,4 +87,5 @@ while True:
     if user_input.lower() == "exit":
         break
     response = crew.kickoff(inputs={"question": user_input})
-    print(response)
\ No newline at end of file
+    print(response)
+print(memory_retention.report())
\ No newline at end of file
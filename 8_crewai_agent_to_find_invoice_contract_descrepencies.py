@@ -5,34 +5,41 @@ load_dotenv()
 import os
 os.environ["PHOENIX_CLIENT_HEADERS"] = f"api_key={os.getenv('PHOENIX_API_KEY')}"
 
-from crewai import LLM
+from llm_factory import crewai_llm
 from crewai import Agent, Task, Crew
-from google.genai import types
+from embedding_cache import batch_memory_writes, crew_embedder_config
+from memory_retention import MemoryRetention
+from run_artifacts import ArtifactStore, file_digest
+from structured_output import json_schema_guardrail, repair_stats
+from pydantic import BaseModel
+from typing import List
 
-from phoenix.otel import register
+from tracing import setup_tracing
 
-# configure the Phoenix tracer
-tracer_provider = register(
-  project_name="CrewAI-invoice-parser-agent",  # Default is 'default'
-  auto_instrument=True # Auto-instrument your app based on installed OI dependencies
+# tracing (see tracing.py, TRACING_EXPORT=file|otlp|none)
+tracer_provider = setup_tracing(
+  project_name="CrewAI-invoice-parser-agent",
 )
+# metrics (see metrics.py)
+from metrics import enable_metrics
+metrics = enable_metrics()
+
 # STEP 1: LLM
 
 
-llm = LLM(
-    model="gemini-2.5-flash",temperature=0.0,
-    generation_config=types.GenerateContentConfig(
-        thinking_config=types.ThinkingConfig(
-            thinking_budget=0
-        )  # Disables thinking
-    ),
-)
+# shared LLM client (see llm_factory.py)
+llm = crewai_llm(model="gemini-2.5-flash", temperature=0.0)
+# Gemini rate-limit priority (see rate_limiter.py)
+from rate_limiter import set_priority
+set_priority("batch")
 ## Tool
 from crewai_tools import PDFSearchTool
 
 # Initialize the tool with a specific PDF path for exclusive search within that document
-pdf_invoice_tool = PDFSearchTool(pdf='/Users/bhogaai/week03-saturday-llamaindex-crewai/week3-llamaindex-crewai-agents/sample_invoice.pdf')
-pdf_contract_tool = PDFSearchTool(pdf='/Users/bhogaai/week03-saturday-llamaindex-crewai/week3-llamaindex-crewai-agents/purchase_terms_conditions.pdf')
+INVOICE_PDF = '/Users/bhogaai/week03-saturday-llamaindex-crewai/week3-llamaindex-crewai-agents/sample_invoice.pdf'
+CONTRACT_PDF = '/Users/bhogaai/week03-saturday-llamaindex-crewai/week3-llamaindex-crewai-agents/purchase_terms_conditions.pdf'
+pdf_invoice_tool = PDFSearchTool(pdf=INVOICE_PDF)
+pdf_contract_tool = PDFSearchTool(pdf=CONTRACT_PDF)
 
 # STEP 2:  Agent definion
 invoice_parser_agent = Agent(
@@ -45,6 +52,28 @@ invoice_parser_agent = Agent(
 )
 
 # STEP 3:  Assign tasks to agnets
+# declared output schema, repaired locally by the guardrail (see structured_output.py)
+class FieldDiscrepancy(BaseModel):
+    field: str
+    invoice_value: str
+    contract_value: str
+    severity: str
+    rationale: str
+
+class LineItemDiscrepancy(BaseModel):
+    description: str
+    issue: str
+    invoice_value: str
+    contract_value: str
+    rationale: str
+
+class ReconciliationReport(BaseModel):
+    matched_fields: List[str]
+    discrepancies: List[FieldDiscrepancy]
+    missing_in_invoice: List[str]
+    missing_in_contract: List[str]
+    line_item_discrepancies: List[LineItemDiscrepancy]
+
 task1 = Task(
     description=(
         "Analyze both the invoice PDF and the contract PDF using the available tools to extract comparable data, "
@@ -64,6 +93,7 @@ task1 = Task(
     output_file="invoice_contract_reconciliation.json",
     output_format="json",
     agent=invoice_parser_agent,
+    guardrail=json_schema_guardrail(ReconciliationReport, llm),
 )
 
 
@@ -73,15 +103,26 @@ crew = Crew(
     tasks=[task1],
     verbose=True,
     memory=True,
-    embedder={
-        "provider": "google",
-        "config": {
-            "api_key": os.getenv("GOOGLE_API_KEY"),
-            "model": "text-embedding-001"
-        }
-    }
+    # cached + batched Google embeddings (see embedding_cache.py)
+    embedder=crew_embedder_config(
+        model="text-embedding-001",
+        api_key=os.getenv("GOOGLE_API_KEY"),
+    )
 )
 
+# memory saves are queued and embedded in batches (see embedding_cache.py)
+batch_memory_writes(crew)
+
+# Bounded memory: per-store caps, eviction, duplicate merging and background compaction
+memory_retention = MemoryRetention(crew).start()
+
 # STEP 5:  Run the crew
-response = crew.kickoff()
+# Memoized run: skipped when the PDFs, prompts and model are unchanged (see run_artifacts.py)
+artifacts = ArtifactStore()
+response = artifacts.kickoff(
+    crew,
+    extra={"invoice": file_digest(INVOICE_PDF), "contract": file_digest(CONTRACT_PDF)},
+)
 print(response)
+print(memory_retention.report())
+print(f"Structured output: {repair_stats}")
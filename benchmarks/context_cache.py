@@ -0,0 +1,111 @@
+# Context caching of stable prefixes against the local Gemini stand-in
+#
+#   python -m benchmarks.context_cache                       # 8 turns, ~2000-token system prompt
+#   python -m benchmarks.context_cache --turns 20 --prompt-tokens 5000 --per-token-ms 0.2
+#
+# A LlamaIndex FunctionAgent (the real GoogleGenAI client and google-genai request encoding) answers
+# --turns short user messages against context_cache.LocalGeminiBackend, whose time to first token
+# grows with the uncached prompt tokens. The system prompt is padded to --prompt-tokens, the size
+# of a CrewAI agent with a long backstory and several tool schemas.
+# Modes:
+#   off     - requests sent as they are
+#   cached  - through ContextCachingTransport (prefix registered after two uses)
+# Reported: prompt tokens processed uncached, tokens served from cache and the mean TTFT.
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+os.environ.setdefault("RATE_LIMIT", "0")
+os.environ.setdefault("METRICS_FILE", os.devnull)
+
+SYSTEM_PROMPT = """You are a helpful assistant with access to web search and arithmetic capabilities.
+You can search the web using tool:`search_web` for current information including weather forecasts,
+the latest news and events, real-time data and general information and facts.
+You can add two numbers with tool:`add_two_numbers`."""
+
+
+async def search_web(query: str) -> str:
+    """Search the web and return results as a string."""
+    return f"results for {query}"
+
+
+async def add_two_numbers(a: float, b: float) -> float:
+    """Add two numbers."""
+    return float(a) + float(b)
+
+
+async def run_mode(mode: str, turns: int, prompt_tokens: int, base_ms: float, per_token_ms: float) -> dict:
+    from google.genai import types
+    from llama_index.core.agent.workflow import FunctionAgent
+    from llama_index.core.workflow import Context
+    from llama_index.llms.google_genai import GoogleGenAI
+
+    import context_cache
+    from llm_factory import NO_THINKING, PooledAsyncTransport
+
+    backend = context_cache.LocalGeminiBackend(base_s=base_ms / 1000, per_token_s=per_token_ms / 1000)
+    sync_transport, async_transport = backend, PooledAsyncTransport(backend)
+    if mode == "cached":
+        sync_transport = context_cache.ContextCachingTransport(sync_transport)
+        async_transport = context_cache.AsyncContextCachingTransport(async_transport)
+    context_cache.cache.reset()
+
+    llm = GoogleGenAI(
+        model="gemini-2.5-flash",
+        api_key="local",
+        generation_config=NO_THINKING,
+        http_options=types.HttpOptions(client_args={"transport": sync_transport},
+                                       async_client_args={"transport": async_transport}),
+    )
+    padding = "\n".join(f"Guideline {i}: answer precisely and cite the source of every fact you use."
+                        for i in range(max(0, prompt_tokens - 120) // 16))
+    agent = FunctionAgent(llm=llm, tools=[search_web, add_two_numbers], system_prompt=f"{SYSTEM_PROMPT}\n{padding}")
+    ctx = Context(agent)
+
+    start = time.perf_counter()
+    for turn in range(turns):
+        await agent.run(user_msg=f"Question {turn}: what is {turn} + 1?", ctx=ctx)
+    elapsed = time.perf_counter() - start
+
+    # Counted by the backend, so both modes are measured the same way
+    totals, generate_requests = backend.totals, backend.requests.get("generate", 0) or 1
+    return {
+        "seconds": elapsed,
+        "uncached_tokens": totals["uncached_tokens"],
+        "cached_tokens": totals["cached_tokens"],
+        "ttft_ms": totals["ttft_s"] / generate_requests * 1000,
+        "caches_created": backend.requests.get("cache_create", 0),
+        "report": context_cache.context_cache_report(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure context caching against the local Gemini stand-in")
+    parser.add_argument("--turns", type=int, default=8)
+    parser.add_argument("--prompt-tokens", type=int, default=2000)
+    parser.add_argument("--base-ms", type=float, default=20.0)
+    parser.add_argument("--per-token-ms", type=float, default=0.1, help="prompt processing per uncached token")
+    args = parser.parse_args()
+    os.environ.setdefault("CONTEXT_CACHE_MIN_TOKENS", str(min(1024, args.prompt_tokens // 2)))
+
+    results = {}
+    for mode in ("off", "cached"):
+        results[mode] = asyncio.run(run_mode(mode, args.turns, args.prompt_tokens, args.base_ms, args.per_token_ms))
+
+    print(f"{'mode':<8}{'total s':>9}{'TTFT ms':>9}{'uncached tok':>14}{'cached tok':>12}{'caches':>8}")
+    for mode, r in results.items():
+        print(f"{mode:<8}{r['seconds']:>9.2f}{r['ttft_ms']:>9.0f}{r['uncached_tokens']:>14.0f}"
+              f"{r['cached_tokens']:>12.0f}{r['caches_created']:>8}")
+    for line in results["cached"]["report"]:
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
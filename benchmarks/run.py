@@ -0,0 +1,228 @@
+# Benchmark runner: every script against offline stand-ins, with a stored baseline
+#
+#   python -m benchmarks.run                                  # all scenarios, 5 iterations each
+#   python -m benchmarks.run single_turn research_crew -n 10  # selected scenarios
+#   python -m benchmarks.run --llm-latency 0.5 --search-latency 1.0
+#   python -m benchmarks.run --save-baseline                  # write benchmarks/baseline.json
+#   python -m benchmarks.run --compare                        # compare with it, exit 1 on regression
+#
+# Reported per scenario:
+#   p50 / p99 latency   - wall time of one iteration (the stand-ins' latency is included)
+#   LLM calls, tool calls, prompt / completion tokens - per iteration, counted by the stand-ins
+#   remote calls        - Tavily / Serper / PDF searches and embedding requests per iteration
+#   peak memory         - tracemalloc peak of one extra (untimed) iteration
+# Call and token counts are deterministic (every iteration starts from the same state, whatever
+# the stand-in latency), so any increase is reported as a regression; p50 latency and memory
+# regress when they exceed the baseline by more than --tolerance. p99 is only gated with at least
+# P99_MIN_ITERATIONS iterations - with fewer it is just the slowest iteration.
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+DEFAULT_BASELINE = os.path.join(REPO_ROOT, "benchmarks", "baseline.json")
+COUNT_METRICS = ["llm_calls", "tool_calls", "prompt_tokens", "completion_tokens", "remote_calls"]
+REMOTE_COUNTERS = ["tavily_searches", "serper_searches", "pdf_searches", "embedding_calls"]
+P99_MIN_ITERATIONS = 50
+
+# No telemetry, tracing / metrics exports or writes outside the per-iteration working directory
+# (tracing overhead is measured separately: python -m benchmarks.tracing_overhead)
+os.environ.setdefault("TRACING_EXPORT", "none")
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+os.environ.setdefault("CREWAI_STORAGE_DIR", "benchmark")
+os.environ.setdefault("METRICS_FILE", os.devnull)
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+@contextlib.contextmanager
+def iteration_dir(env: Optional[Dict[str, str]] = None):
+    """Fresh working directory (and CrewAI storage directory) for one iteration."""
+    previous_cwd, previous_env = os.getcwd(), dict(os.environ)
+    with tempfile.TemporaryDirectory(prefix="bench-") as workdir:
+        os.environ.update(env or {})
+        os.environ["XDG_DATA_HOME"] = os.path.join(workdir, "xdg")
+        os.chdir(workdir)
+        try:
+            yield workdir
+        finally:
+            os.chdir(previous_cwd)
+            os.environ.clear()
+            os.environ.update(previous_env)
+
+
+@contextlib.contextmanager
+def quiet(verbose: bool):
+    """Swallow the scripts' (very verbose) output unless --verbose."""
+    if verbose:
+        yield
+        return
+    sink = io.StringIO()
+    with contextlib.redirect_stdout(sink), contextlib.redirect_stderr(sink):
+        yield
+
+
+def run_scenario(scenario, iterations: int, warmup: int, verbose: bool = False) -> dict:
+    from benchmarks.standins import usage
+    from tool_registry import reset_tools
+
+    with iteration_dir(scenario.env) as workdir, quiet(verbose):
+        state = scenario.setup(workdir) if scenario.setup else None
+
+    latencies, counts = [], []
+    for i in range(warmup + iterations):
+        with iteration_dir(scenario.env) as workdir, quiet(verbose):
+            usage.reset()
+            reset_tools()  # the shared tools' caches start cold too
+            start = time.perf_counter()
+            scenario.run(state, workdir)
+            elapsed = time.perf_counter() - start
+        if i >= warmup:
+            latencies.append(elapsed)
+            counts.append(usage.snapshot())
+
+    # Memory is measured separately: tracemalloc slows everything down
+    with iteration_dir(scenario.env) as workdir, quiet(verbose):
+        reset_tools()
+        tracemalloc.start()
+        try:
+            scenario.run(state, workdir)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def mean(key: str) -> float:
+        return sum(c.get(key, 0) for c in counts) / len(counts)
+
+    result = {
+        "p50_s": percentile(latencies, 50),
+        "p99_s": percentile(latencies, 99),
+        "llm_calls": mean("llm_calls"),
+        "tool_calls": mean("tool_calls"),
+        "prompt_tokens": mean("prompt_tokens"),
+        "completion_tokens": mean("completion_tokens"),
+        "remote_calls": sum(mean(key) for key in REMOTE_COUNTERS),
+        "peak_mem_mb": peak / 2 ** 20,
+    }
+    result.update({key: mean(key) for key in REMOTE_COUNTERS})
+    return result
+
+
+def format_table(results: Dict[str, dict]) -> str:
+    header = f"{'scenario':<22}{'p50 s':>8}{'p99 s':>8}{'LLM':>6}{'tools':>6}{'tok in':>9}{'tok out':>9}{'remote':>8}{'mem MB':>8}"
+    lines = [header, "-" * len(header)]
+    for name, r in results.items():
+        lines.append(
+            f"{name:<22}{r['p50_s']:>8.2f}{r['p99_s']:>8.2f}{r['llm_calls']:>6.0f}{r['tool_calls']:>6.0f}"
+            f"{r['prompt_tokens']:>9.0f}{r['completion_tokens']:>9.0f}{r['remote_calls']:>8.0f}{r['peak_mem_mb']:>8.1f}"
+        )
+    return "\n".join(lines)
+
+
+def compare(results: Dict[str, dict], baseline: dict, tolerance: float, iterations: int) -> List[str]:
+    """Regressions of results against a stored baseline (p99 only with P99_MIN_ITERATIONS iterations)."""
+    if baseline.get("latency") != results_config()["latency"]:
+        print(f"Note: baseline was recorded with stand-in latency {baseline.get('latency')}")
+    regressions = []
+    for name, r in results.items():
+        base = baseline["scenarios"].get(name)
+        if base is None:
+            print(f"{name}: not in baseline")
+            continue
+        for metric in COUNT_METRICS:
+            if r[metric] > base[metric] + 1e-9:
+                regressions.append(f"{name}: {metric} {base[metric]:.0f} -> {r[metric]:.0f}")
+        gated = ["p50_s", "peak_mem_mb"]
+        if iterations >= P99_MIN_ITERATIONS and baseline.get("iterations", 0) >= P99_MIN_ITERATIONS:
+            gated.append("p99_s")
+        for metric in gated:
+            if r[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{name}: {metric} {base[metric]:.2f} -> {r[metric]:.2f} (+{r[metric] / base[metric] - 1:.0%})")
+        changes = ", ".join(
+            f"{metric} {r[metric] / base[metric] - 1:+.0%}" for metric in ("p50_s", "llm_calls", "prompt_tokens", "peak_mem_mb")
+            if base[metric]
+        )
+        print(f"{name:<22}{changes}")
+    return regressions
+
+
+def results_config() -> dict:
+    from benchmarks.standins import LATENCY
+
+    return {"latency": dict(LATENCY)}
+
+
+def main():
+    from benchmarks import standins
+    from benchmarks.scenarios import SCENARIOS
+
+    parser = argparse.ArgumentParser(description="Benchmark the scripts against offline stand-ins")
+    parser.add_argument("scenarios", nargs="*", help=f"Scenarios to run (default: all): {', '.join(s.name for s in SCENARIOS)}")
+    parser.add_argument("-n", "--iterations", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--llm-latency", type=float, default=standins.LATENCY["llm"])
+    parser.add_argument("--search-latency", type=float, default=standins.LATENCY["search"])
+    parser.add_argument("--embed-latency", type=float, default=standins.LATENCY["embed"])
+    parser.add_argument("--pdf-latency", type=float, default=standins.LATENCY["pdf"])
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, metavar="PATH")
+    parser.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE, metavar="PATH")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed latency/memory increase (0.25 = 25%%)")
+    parser.add_argument("--json", metavar="PATH", help="Also write the results to a JSON file")
+    parser.add_argument("--verbose", action="store_true", help="Show the scripts' output")
+    args = parser.parse_args()
+
+    selected = [s for s in SCENARIOS if not args.scenarios or s.name in args.scenarios]
+    unknown = set(args.scenarios) - {s.name for s in SCENARIOS}
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    standins.install({
+        "llm": args.llm_latency, "search": args.search_latency, "embed": args.embed_latency, "pdf": args.pdf_latency,
+    })
+
+    results = {}
+    for scenario in selected:
+        print(f"--- {scenario.name}: {scenario.description} ---", flush=True)
+        results[scenario.name] = run_scenario(scenario, args.iterations, args.warmup, args.verbose)
+    print()
+    print(format_table(results))
+
+    report = {**results_config(), "iterations": args.iterations, "scenarios": results}
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline saved to {args.save_baseline}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {args.compare}:")
+        regressions = compare(results, baseline, args.tolerance, args.iterations)
+        if regressions:
+            print("\nRegressions:\n" + "\n".join(f"- {r}" for r in regressions))
+            sys.exit(1)
+        print("\nNo regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+# One benchmark scenario per script
+#
+# A scenario is `setup(workdir) -> state` (run once, not timed) and `run(state, workdir)` (one timed
+# iteration). Every iteration runs in a fresh working directory, so the local caches
+# (.cache/, .artifacts/, CrewAI memory) start cold and runs do not influence each other.
+# The scripts are executed with runpy under a run_name other than "__main__", which runs the
+# module level (agent/crew construction, and the kickoff for the CrewAI scripts) but not the
+# interactive `if __name__ == "__main__":` loops.
+
+import asyncio
+import builtins
+import copy
+import os
+import runpy
+import shutil
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+from unittest import mock
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WEATHER_QUESTION = "What's the weather like today in Phoenix, Arizona?"
+FOLLOW_UPS = ["What is 12.5 + 30?", "And what about tomorrow?"]
+PDF_QUESTION = "What is the total amount due on the invoice?"
+
+
+@dataclass
+class Scenario:
+    name: str
+    script: str
+    description: str
+    run: Callable[[Any, str], None]
+    setup: Optional[Callable[[str], Any]] = None
+    env: Optional[Dict[str, str]] = None
+
+
+def load_script(script: str) -> dict:
+    """Execute a script's module level and return its globals."""
+    return runpy.run_path(os.path.join(REPO_ROOT, script), run_name="benchmark")
+
+
+def _stop_background_work(module: dict) -> None:
+    retention = module.get("memory_retention")
+    if retention is not None:
+        retention.stop()
+
+
+# LlamaIndex scenarios
+
+async def ask(agent, user_msg: str, ctx=None):
+    # agent.run() schedules the workflow on the running loop, so it must be called inside one
+    return await agent.run(user_msg=user_msg, ctx=ctx)
+
+
+def run_single_turn(module: dict, workdir: str) -> None:
+    asyncio.run(ask(module["agent"], WEATHER_QUESTION))
+
+
+def run_multi_turn(module: dict, workdir: str) -> None:
+    agent, ctx = module["agent"], module["Context"](module["agent"])
+    fast_path = module.get("fast_path")
+
+    async def conversation():
+        for user_msg in [WEATHER_QUESTION, *FOLLOW_UPS]:
+            if fast_path is not None:
+                await fast_path.run(user_msg, ctx=ctx)
+            else:
+                await ask(agent, user_msg, ctx)
+
+    asyncio.run(conversation())
+
+
+def run_state_restore(state: None, workdir: str) -> None:
+    # Restoring happens at module level, from agent_state.json in the working directory
+    shutil.copy(os.path.join(REPO_ROOT, "agent_state.json"), os.path.join(workdir, "agent_state.json"))
+    module = load_script("3_llamaindex_simple_agent_memory_restore.py")
+    asyncio.run(ask(module["agent"], FOLLOW_UPS[1], module["ctx"]))
+
+
+def setup_research_workflow(workdir: str) -> dict:
+    module = load_script("4_llamaindex_research_workflow_multi_agent.py")
+    # The tools mutate the workflow's state dict in place, and the first run's state is
+    # initial_state itself: without a fresh copy every iteration would start with the notes,
+    # report and review of the previous one (and send more prompt tokens)
+    module["initial_state"] = copy.deepcopy(module["agent_workflow"].initial_state)
+    return module
+
+
+def run_research_workflow(module: dict, workdir: str) -> None:
+    module["agent_workflow"].initial_state = copy.deepcopy(module["initial_state"])
+    asyncio.run(module["main"]())
+
+
+# CrewAI scenarios - the kickoff runs at module level
+
+def run_crew_script(script: str) -> Callable[[Any, str], None]:
+    def run(state: None, workdir: str) -> None:
+        _stop_background_work(load_script(script))
+
+    return run
+
+
+def run_pdf_question(state: None, workdir: str) -> None:
+    answers = iter([PDF_QUESTION, "exit"])
+    with mock.patch.object(builtins, "input", lambda prompt="": next(answers)):
+        _stop_background_work(load_script("7_crewai_simple_agent_pdf_parsing.py"))
+
+
+SCENARIOS = [
+    Scenario(
+        "single_turn", "1_llamaindex_simple_agent.py",
+        "FunctionAgent, one question answered with one web search",
+        run_single_turn, setup=lambda workdir: load_script("1_llamaindex_simple_agent.py"),
+    ),
+    Scenario(
+        "multi_turn", "2_llamaindex_simple_agent_memory.py",
+        "FunctionAgent with Context memory, three turns (search, arithmetic, follow-up)",
+        run_multi_turn, setup=lambda workdir: load_script("2_llamaindex_simple_agent_memory.py"),
+    ),
+    Scenario(
+        "state_restore", "3_llamaindex_simple_agent_memory_restore.py",
+        "Restore Context from agent_state.json, then one turn",
+        run_state_restore,
+    ),
+    Scenario(
+        "research_workflow", "4_llamaindex_research_workflow_multi_agent.py",
+        "AgentWorkflow: research -> write -> review with handoffs",
+        run_research_workflow, setup=setup_research_workflow,
+    ),
+    Scenario(
+        "research_crew", "5_crewai_simple_multi_agent.py",
+        "Research + writer crew with search, memory and artifacts (cold caches)",
+        run_crew_script("5_crewai_simple_multi_agent.py"),
+    ),
+    Scenario(
+        "support_crew", "6_crewai_customersupport_multi_agent.py",
+        "Customer support crew, sequential",
+        run_crew_script("6_crewai_customersupport_multi_agent.py"),
+        env={"SUPPORT_CREW_MODE": "sequential"},
+    ),
+    Scenario(
+        "support_crew_fanout", "6_crewai_customersupport_multi_agent.py",
+        "Customer support crew, one crew per issue category run concurrently",
+        run_crew_script("6_crewai_customersupport_multi_agent.py"),
+        env={"SUPPORT_CREW_MODE": "fanout"},
+    ),
+    Scenario(
+        "pdf_question", "7_crewai_simple_agent_pdf_parsing.py",
+        "Invoice PDF question answering crew with memory, one question",
+        run_pdf_question,
+    ),
+    Scenario(
+        "reconciliation_crew", "8_crewai_agent_to_find_invoice_contract_descrepencies.py",
+        "Invoice/contract reconciliation with structured JSON output and memory",
+        run_crew_script("8_crewai_agent_to_find_invoice_contract_descrepencies.py"),
+    ),
+]
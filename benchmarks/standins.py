@@ -0,0 +1,445 @@
+# Offline stand-ins for every remote dependency of the eight scripts
+#
+# The benchmarks must run without API keys or network, and must be repeatable, so each
+# remote service is replaced by a deterministic local fake that sleeps for a configurable
+# latency (see LATENCY) and records what it was asked to do in `usage`:
+#   - Gemini (LlamaIndex)  -> StandInGemini: a FunctionCallingLLM that calls each of the agent's
+#                             tools once, hands off to the next agent in a workflow, then answers
+#   - Gemini (CrewAI)      -> StandInCrewLLM: a ReAct-style crewai LLM (one Action, then Final Answer)
+#   - Tavily               -> StandInTavily
+#   - Serper               -> StandInSerperBackend (behind the serper_search shared tool)
+#   - PDFSearchTool        -> StandInPDFSearchTool (no embedchain / vector DB)
+#   - Google embeddings    -> StandInEmbeddingBackend (behind embedding_cache.CachedBatchEmbedder)
+# install() patches the modules the scripts import from; the scripts themselves are unchanged.
+
+import ast
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Type
+
+from llama_index.core.base.llms.types import (
+    ChatMessage,
+    ChatResponse,
+    CompletionResponse,
+    LLMMetadata,
+    MessageRole,
+)
+from llama_index.core.llms.callbacks import llm_chat_callback, llm_completion_callback
+from llama_index.core.llms.function_calling import FunctionCallingLLM
+from llama_index.core.llms.llm import ToolSelection
+from pydantic import BaseModel, Field
+
+# Seconds each fake service takes per call (set by the benchmark runner)
+LATENCY = {"llm": 0.05, "search": 0.1, "embed": 0.02, "pdf": 0.02}
+EMBEDDING_DIM = 64
+
+
+class Usage:
+    """Thread-safe counters of everything the stand-ins were asked to do."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counts: Counter = Counter()
+
+    def add(self, **counts: int) -> None:
+        with self._lock:
+            self.counts.update(counts)
+
+    def llm_call(self, prompt: str, completion: str, tool_calls: int = 0) -> None:
+        self.add(
+            llm_calls=1,
+            prompt_tokens=estimate_tokens(prompt),
+            completion_tokens=estimate_tokens(completion),
+            tool_calls=tool_calls,
+        )
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counts)
+
+
+usage = Usage()
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), good enough to compare runs."""
+    return (len(text) + 3) // 4
+
+
+def _sample_value(name: str, schema: dict, topic: str) -> Any:
+    kind = schema.get("type")
+    if kind in ("number", "integer"):
+        return 2
+    if kind == "boolean":
+        return True
+    if kind == "array":
+        return []
+    if kind == "object":
+        return {}
+    return f"{topic} ({name})" if topic else name
+
+
+def _numbers(text: str) -> List[str]:
+    return re.findall(r"-?\d+(?:\.\d+)?", text)
+
+
+# Gemini for LlamaIndex
+
+class StandInGemini(FunctionCallingLLM):
+    """
+    Deterministic GoogleGenAI replacement.
+    Policy for chat with tools: for the latest user message, call each of the agent's tools once
+    (numeric tools only when the message contains two numbers, then only those), then hand off to
+    a workflow agent that has not had a turn yet, then answer.
+    """
+
+    model: str = Field(default="gemini-2.5-flash")
+    temperature: float = Field(default=0.0)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "StandInGemini"
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(model_name=self.model, is_chat_model=True, is_function_calling_model=True)
+
+    # Policy
+
+    @staticmethod
+    def _turn(messages: Sequence[ChatMessage]) -> tuple:
+        """(latest user message, messages after it)"""
+        for i in range(len(messages) - 1, -1, -1):
+            if messages[i].role == MessageRole.USER:
+                return messages[i].content or "", list(messages[i + 1:])
+        return "", list(messages)
+
+    def _next_step(self, tools: Sequence[Any], messages: Sequence[ChatMessage]) -> tuple:
+        """(text, tool calls) for the next assistant message."""
+        user_msg, turn = self._turn(messages)
+        called = [
+            call["name"]
+            for m in turn if m.role == MessageRole.ASSISTANT
+            for call in m.additional_kwargs.get("stand_in_tool_calls", [])
+        ]
+        handed_to = set(re.findall(r"Agent (\w+) is now handling", " ".join(str(m.content) for m in turn)))
+        # AgentWorkflow prepends its state to the user message
+        topic = re.sub(r"\s+", " ", user_msg.split("Current message:")[-1]).strip()[:120]
+
+        plain = [t for t in tools if t.metadata.name != "handoff"]
+        numeric = []
+        for t in plain:
+            properties = t.metadata.get_parameters_dict()["properties"].values()
+            if properties and all(p.get("type") in ("number", "integer") for p in properties):
+                numeric.append(t)
+        if numeric and len(_numbers(user_msg)) >= 2:
+            plan = numeric
+        else:
+            plan = [t for t in plain if t not in numeric]
+        # Tools since the last handoff belong to the current agent
+        since_handoff = called[len(called) - called[::-1].index("handoff"):] if "handoff" in called else called
+
+        for tool in plan:
+            if tool.metadata.name not in since_handoff:
+                params = tool.metadata.get_parameters_dict()
+                numbers = iter(_numbers(user_msg))
+                kwargs = {}
+                for name, schema in params["properties"].items():
+                    if name in params.get("required", []) or name in ("query", "topic"):
+                        if schema.get("type") in ("number", "integer"):
+                            kwargs[name] = float(next(numbers, 2))
+                        else:
+                            kwargs[name] = _sample_value(name, schema, topic)
+                return "", [{"id": f"call_{len(called)}", "name": tool.metadata.name, "args": kwargs}]
+
+        handoff = next((t for t in tools if t.metadata.name == "handoff"), None)
+        if handoff is not None:
+            info = handoff.metadata.description.split("Currently available agents:", 1)[-1].strip()
+            agents = list(ast.literal_eval(info)) if info.startswith("{") else []
+            # Every agent in the workflow gets one turn (the targets plus the current agent), moving
+            # forward through the workflow's agent order, which lists the root agent first
+            if len(handed_to) < len(agents):
+                target = next((a for a in reversed(agents) if a not in handed_to), None)
+                if target is not None:
+                    return "", [{
+                        "id": f"call_{len(called)}",
+                        "name": "handoff",
+                        "args": {"to_agent": target, "reason": "benchmark handoff"},
+                    }]
+        return f"Stand-in answer to: {topic}", []
+
+    def _respond(self, prompt: str, text: str, tool_calls: List[dict]) -> ChatResponse:
+        usage.llm_call(prompt, text + json.dumps([c["args"] for c in tool_calls]), len(tool_calls))
+        return ChatResponse(
+            message=ChatMessage(
+                role=MessageRole.ASSISTANT,
+                content=text,
+                additional_kwargs={"stand_in_tool_calls": tool_calls},
+            ),
+            delta=text,
+        )
+
+    def _chat(self, messages: Sequence[ChatMessage], tools: Sequence[Any]) -> ChatResponse:
+        text, tool_calls = self._next_step(tools, messages)
+        return self._respond("\n".join(str(m.content) for m in messages), text, tool_calls)
+
+    def _complete_text(self, prompt: str) -> CompletionResponse:
+        summary = re.sub(r"\s+", " ", prompt)[:200]
+        text = f"Stand-in completion ({self.model}) for: {summary}"
+        usage.llm_call(prompt, text)
+        return CompletionResponse(text=text)
+
+    # FunctionCallingLLM interface
+
+    def _prepare_chat_with_tools(self, tools, user_msg=None, chat_history=None, verbose=False,
+                                 allow_parallel_tool_calls=False, tool_required=False, **kwargs) -> Dict[str, Any]:
+        messages = list(chat_history or [])
+        if user_msg is not None:
+            messages.append(user_msg if isinstance(user_msg, ChatMessage) else ChatMessage(role="user", content=user_msg))
+        return {"messages": messages, "tools": tools}
+
+    def get_tool_calls_from_response(self, response: ChatResponse, error_on_no_tool_call: bool = True,
+                                     **kwargs) -> List[ToolSelection]:
+        calls = response.message.additional_kwargs.get("stand_in_tool_calls", [])
+        if not calls and error_on_no_tool_call:
+            raise ValueError("Expected at least one tool call")
+        return [ToolSelection(tool_id=c["id"], tool_name=c["name"], tool_kwargs=c["args"]) for c in calls]
+
+    @llm_chat_callback()
+    def chat(self, messages, tools=(), **kwargs) -> ChatResponse:
+        time.sleep(LATENCY["llm"])
+        return self._chat(messages, tools)
+
+    @llm_chat_callback()
+    async def achat(self, messages, tools=(), **kwargs) -> ChatResponse:
+        await asyncio.sleep(LATENCY["llm"])
+        return self._chat(messages, tools)
+
+    def stream_chat(self, messages, tools=(), **kwargs):
+        response = self.chat(messages, tools=tools)
+        yield response
+
+    async def astream_chat(self, messages, tools=(), **kwargs):
+        response = await self.achat(messages, tools=tools)
+
+        async def gen():
+            yield response
+
+        return gen()
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs) -> CompletionResponse:
+        time.sleep(LATENCY["llm"])
+        return self._complete_text(prompt)
+
+    @llm_completion_callback()
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs) -> CompletionResponse:
+        await asyncio.sleep(LATENCY["llm"])
+        return self._complete_text(prompt)
+
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs):
+        response = self.complete(prompt)
+        yield response
+
+    async def astream_complete(self, prompt: str, formatted: bool = False, **kwargs):
+        response = await self.acomplete(prompt)
+
+        async def gen():
+            yield response
+
+        return gen()
+
+
+def stand_in_google_genai(model: str = "gemini-2.5-flash", temperature: float = 0.0, **kwargs) -> StandInGemini:
+    """Accepts the GoogleGenAI constructor arguments (generation_config, ...) and ignores the rest."""
+    return StandInGemini(model=model, temperature=temperature)
+
+
+# Gemini for CrewAI
+
+TASK_EVALUATION = {
+    "suggestions": ["Cite the source of each fact."],
+    "quality": 8.0,
+    "entities": [
+        {"name": "Benchmark Entity", "type": "Organization", "description": "Stand-in entity", "relationships": []}
+    ],
+}
+
+
+def _crew_llm_class():
+    from crewai.llms.base_llm import BaseLLM
+    from crewai.utilities.events import LLMCallCompletedEvent, LLMCallStartedEvent, crewai_event_bus
+    from crewai.utilities.events.llm_events import LLMCallType
+
+    class StandInCrewLLM(BaseLLM):
+        """
+        Deterministic crewai LLM replacement (ReAct text format).
+        Calls the first listed tool once, then gives the Final Answer. JSON tasks get a partial
+        JSON object, so the structured-output repair path is exercised too.
+        """
+
+        def __init__(self, model: str = "gemini-2.5-flash", temperature: Optional[float] = None, **kwargs):
+            super().__init__(model=model, temperature=temperature)
+            self.additional_params = {}
+
+        def call(self, messages, tools=None, callbacks=None, available_functions=None, from_task=None,
+                 from_agent=None, **kwargs) -> str:
+            # Emitted like crewai.LLM does, so listeners (metrics.py) see the calls
+            crewai_event_bus.emit(self, event=LLMCallStartedEvent(messages=messages, model=self.model))
+            time.sleep(LATENCY["llm"])
+            if isinstance(messages, str):
+                messages = [{"role": "user", "content": messages}]
+            prompt = "\n".join(str(m.get("content", "")) for m in messages)
+            observed = any("Observation:" in str(m.get("content", "")) for m in messages if m.get("role") == "assistant")
+            answer, tool_calls = self._answer(prompt, observed), 0
+            if answer.startswith("Thought: I should use"):
+                tool_calls = 1
+            usage.llm_call(prompt, answer, tool_calls)
+            crewai_event_bus.emit(self, event=LLMCallCompletedEvent(
+                messages=messages, response=answer, call_type=LLMCallType.LLM_CALL, model=self.model,
+            ))
+            return answer
+
+        @staticmethod
+        def _answer(prompt: str, observed: bool) -> str:
+            if "Assess the quality of the task completed" in prompt:
+                return json.dumps(TASK_EVALUATION)
+            wanted = re.search(r"Return ONLY a JSON object with these keys: ([\w, ]+)\.", prompt)
+            if wanted:
+                return json.dumps({key.strip(): [] for key in wanted.group(1).split(",")})
+            if "Return only valid JSON" in prompt or "Ensure your final answer contains only the content" in prompt:
+                return "{}"
+
+            tool = re.search(r"Tool Name: (.+)\nTool Arguments: (.+)", prompt)
+            if tool and not observed:
+                try:
+                    schema = ast.literal_eval(tool.group(2).strip())
+                except (ValueError, SyntaxError):
+                    schema = {}
+                args = {name: _sample_value(name, {}, "benchmark") for name in schema}
+                return (
+                    f"Thought: I should use {tool.group(1).strip()}\n"
+                    f"Action: {tool.group(1).strip()}\n"
+                    f"Action Input: {json.dumps(args)}"
+                )
+            keys = re.search(r"JSON object with keys: (\w+)", prompt)
+            if keys:
+                return f"Thought: I now know the final answer\nFinal Answer: {json.dumps({keys.group(1): ['total amount']})}"
+            return "Thought: I now know the final answer\nFinal Answer: Stand-in final answer."
+
+        def supports_function_calling(self) -> bool:
+            return False
+
+        def supports_stop_words(self) -> bool:
+            return False
+
+        def get_context_window_size(self) -> int:
+            return 1_000_000
+
+    return StandInCrewLLM
+
+
+# Tools and embeddings
+
+class StandInTavily:
+    """AsyncTavilyClient replacement."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def search(self, query: str, **kwargs) -> dict:
+        await asyncio.sleep(LATENCY["search"])
+        usage.add(tavily_searches=1)
+        return {
+            "query": query,
+            "results": [{"title": f"Stand-in result for {query}", "url": "https://example.com", "content": "..."}],
+        }
+
+
+class StandInSerperBackend:
+    """Serper backend replacement for cached_search.default_backend() (serper_search shared tool)."""
+
+    def __init__(self, **kwargs):
+        pass
+
+    def search(self, query: str, search_type: str = "search") -> dict:
+        time.sleep(LATENCY["search"])
+        usage.add(serper_searches=1)
+        return {"searchParameters": {"q": query, "type": search_type}, "organic": [{"title": query, "position": 1}]}
+
+
+class StandInEmbeddingBackend:
+    """GoogleEmbeddingBackend replacement: deterministic unit vectors, one call per batch."""
+
+    def __init__(self, model: str = "text-embedding-001", api_key: Optional[str] = None,
+                 task_type: str = "RETRIEVAL_DOCUMENT"):
+        self.model = model
+        self.task_type = task_type
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(LATENCY["embed"])
+        usage.add(embedding_calls=1, texts_embedded=len(texts))
+        vectors = []
+        for text in texts:
+            digest = hashlib.sha256(text.encode("utf-8")).digest() * (EMBEDDING_DIM // 32)
+            vector = [b - 127.5 for b in digest[:EMBEDDING_DIM]]
+            norm = sum(v * v for v in vector) ** 0.5
+            vectors.append([v / norm for v in vector])
+        return vectors
+
+
+def _pdf_tool_class():
+    from crewai.tools import BaseTool
+    from crewai_tools.tools.pdf_search_tool.pdf_search_tool import FixedPDFSearchToolSchema
+
+    class StandInPDFSearchTool(BaseTool):
+        """PDFSearchTool replacement that returns a fixed passage."""
+
+        name: str = "Search a PDF's content"
+        description: str = "A tool that can be used to semantic search a query from a PDF's content."
+        args_schema: Type[BaseModel] = FixedPDFSearchToolSchema
+
+        def __init__(self, pdf: Optional[str] = None, **kwargs):
+            if pdf is not None:
+                kwargs.setdefault("description", f"A tool that can be used to semantic search a query the {pdf} PDF's content.")
+            super().__init__(**kwargs)
+
+        def _run(self, query: str, **kwargs) -> str:
+            time.sleep(LATENCY["pdf"])
+            usage.add(pdf_searches=1)
+            return f"Relevant content: Invoice INV-001, total amount 1,000.00 USD, payment terms net 30 ({query})"
+
+    return StandInPDFSearchTool
+
+
+def install(latency: Optional[Dict[str, float]] = None) -> None:
+    """
+    Patch the libraries the scripts import from with the stand-ins.
+    Args:
+        latency (dict): Overrides for LATENCY, e.g. {"llm": 0.2}
+    """
+    LATENCY.update(latency or {})
+
+    import crewai
+    import crewai_tools
+    import llama_index.llms.google_genai
+    import tavily
+
+    import cached_search
+    import embedding_cache
+
+    llama_index.llms.google_genai.GoogleGenAI = stand_in_google_genai
+    crewai.LLM = _crew_llm_class()
+    tavily.AsyncTavilyClient = StandInTavily
+    cached_search.SerperSearchBackend = StandInSerperBackend
+    crewai_tools.PDFSearchTool = _pdf_tool_class()
+    embedding_cache.GoogleEmbeddingBackend = StandInEmbeddingBackend
@@ -0,0 +1,129 @@
+# Tracing overhead per agent turn
+#
+#   python -m benchmarks.tracing_overhead            # 50 turns per mode
+#   python -m benchmarks.tracing_overhead -n 200
+#
+# Runs the FunctionAgent of script 1 against the stand-ins with zero latency, so each turn
+# costs only framework + tracing CPU time, once per tracing mode (each in its own process,
+# because instrumentation is process-wide):
+#   off         - TRACING_EXPORT=none, no instrumentation
+#   inline      - what phoenix.otel.register() did: SimpleSpanProcessor, export inside the turn
+#   batched     - tracing.setup_tracing(): BatchSpanProcessor, export on a background thread
+#   head_10pct  - batched, TRACING_SAMPLE_RATIO=0.1
+#   tail        - batched, TRACING_TAIL=1 (keep slow / failed traces and 10% of the rest)
+# Spans go to a local JSON lines file in every mode, so no collector is needed.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+MODES = {
+    "off": {"TRACING_EXPORT": "none"},
+    "inline": {"TRACING_EXPORT": "none"},
+    "batched": {"TRACING_EXPORT": "file"},
+    "head_10pct": {"TRACING_EXPORT": "file", "TRACING_SAMPLE_RATIO": "0.1"},
+    "tail": {"TRACING_EXPORT": "file", "TRACING_TAIL": "1"},
+}
+
+
+def run_mode(mode: str, turns: int) -> dict:
+    """Child process: run `turns` agent turns with one tracing mode."""
+    import asyncio
+    import contextlib
+    import io
+
+    from benchmarks import standins
+    from benchmarks.scenarios import WEATHER_QUESTION, ask, load_script
+
+    standins.install({"llm": 0.0, "search": 0.0, "embed": 0.0, "pdf": 0.0})
+    provider = None
+    if mode == "inline":
+        from opentelemetry import trace
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+
+        from tracing import JsonLinesSpanExporter, instrument_installed_libraries
+
+        provider = TracerProvider()
+        provider.add_span_processor(SimpleSpanProcessor(JsonLinesSpanExporter(os.environ["TRACING_FILE"])))
+        trace.set_tracer_provider(provider)
+        instrument_installed_libraries(provider)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        module = load_script("1_llamaindex_simple_agent.py")
+    provider = provider or module["tracer_provider"]
+    agent = module["agent"]
+
+    async def turns_loop():
+        await ask(agent, WEATHER_QUESTION)  # warm-up
+        latencies = []
+        for _ in range(turns):
+            start = time.perf_counter()
+            await ask(agent, WEATHER_QUESTION)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    latencies = asyncio.run(turns_loop())
+    start = time.perf_counter()
+    if provider is not None:
+        provider.shutdown()  # flushes the export queue
+    shutdown_s = time.perf_counter() - start
+
+    spans = 0
+    if os.path.exists(os.environ["TRACING_FILE"]):
+        with open(os.environ["TRACING_FILE"]) as f:
+            spans = sum(1 for _ in f)
+    latencies.sort()
+    return {
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "mean_ms": sum(latencies) / len(latencies) * 1000,
+        "spans_per_turn": spans / (turns + 1),
+        "shutdown_ms": shutdown_s * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure tracing overhead per agent turn")
+    parser.add_argument("-n", "--turns", type=int, default=50)
+    parser.add_argument("--mode", choices=list(MODES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.turns)))
+        return
+
+    results = {}
+    for mode, env in MODES.items():
+        print(f"--- {mode} ---", flush=True)
+        with tempfile.TemporaryDirectory(prefix="bench-tracing-") as workdir:
+            child_env = {
+                **os.environ, **env,
+                "TRACING_FILE": os.path.join(workdir, "traces.jsonl"),
+                "OTEL_SDK_DISABLED": "false",
+                "CREWAI_DISABLE_TELEMETRY": "true",
+            }
+            out = subprocess.run(
+                [sys.executable, "-W", "ignore", "-m", "benchmarks.tracing_overhead", "--mode", mode, "-n", str(args.turns)],
+                cwd=REPO_ROOT, env=child_env, capture_output=True, text=True, check=True,
+            )
+            results[mode] = json.loads(out.stdout.strip().splitlines()[-1])
+
+    base = results["off"]["p50_ms"]
+    print(f"\n{'mode':<12}{'p50 ms':>9}{'mean ms':>9}{'overhead ms':>13}{'spans/turn':>12}{'flush ms':>10}")
+    for mode, r in results.items():
+        print(
+            f"{mode:<12}{r['p50_ms']:>9.1f}{r['mean_ms']:>9.1f}{r['p50_ms'] - base:>+13.1f}"
+            f"{r['spans_per_turn']:>12.1f}{r['shutdown_ms']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# Search backends and query normalization for the serper_search shared tool (script 5)
+#
+# The research agent used SerperDevTool() directly, so repeated kickoffs on the same {topic}
+# and the agent's own near-duplicate queries within a run all hit Serper again. Caching,
+# deduplication and pooling are done by the serper_search tool in tool_registry.py (cache in
+# .cache/tools.sqlite3); this module provides its parts:
+# 1. Query normalization - lowercase, punctuation removed, whitespace collapsed, so "EV sector:
+#    revenue outlook 2025?" and "ev sector revenue  outlook 2025" share one cache entry. Word order
+#    is kept ("flights from Paris to London" is not "flights from London to Paris")
+# 2. is_cacheable()      - errors and empty results are never cached, so the next search tries
+#    the backend again instead of serving them for the whole TTL
+# 3. Backends            - Serper through a pooled httpx client (PooledSerperDevTool), or
+#    SEARCH_BACKEND=offline, which answers from SEARCH_FIXTURES (JSON file) or canned results,
+#    so the crew runs without network or Serper credits
+
+import json
+import os
+import re
+from typing import Any, Dict, Optional
+
+from crewai_tools import SerperDevTool
+from pydantic import PrivateAttr
+
+RESULT_SECTIONS = ("organic", "news", "knowledgeGraph", "answerBox", "peopleAlsoAsk")
+
+
+def is_cacheable(result: Any) -> bool:
+    """False for error and empty search results (cached, they would be served for the whole TTL)."""
+    if not result:
+        return False
+    if isinstance(result, str):
+        return not re.match(r"\s*(error|search failed)\b", result, re.I)
+    if isinstance(result, dict) and any(k in result for k in ("error", "statusCode", *RESULT_SECTIONS)):
+        return any(result.get(k) for k in RESULT_SECTIONS)
+    return True
+
+
+def normalize_query(query: str) -> str:
+    """Canonical form of a search query used as the cache key (word order is kept)."""
+    words = re.findall(r"[^\W_]+(?:\.\d+)?", query.lower())
+    return " ".join(words) or query.strip().lower()
+
+
+class OfflineSearchBackend:
+    """
+    Local stand-in for Serper. Answers from a JSON fixtures file ({normalized query: result})
+    when one is given, otherwise with a small deterministic placeholder result.
+    """
+
+    def __init__(self, fixtures_path: Optional[str] = None):
+        self.fixtures: Dict[str, Any] = {}
+        if fixtures_path and os.path.exists(fixtures_path):
+            with open(fixtures_path) as f:
+                self.fixtures = {normalize_query(k): v for k, v in json.load(f).items()}
+
+    def search(self, query: str, search_type: str = "search") -> Any:
+        key = normalize_query(query)
+        if key in self.fixtures:
+            return self.fixtures[key]
+        return {
+            "searchParameters": {"q": query, "type": search_type, "offline": True},
+            "organic": [
+                {
+                    "title": f"Offline result for: {query}",
+                    "link": "https://example.com/offline",
+                    "snippet": "Offline search backend - no live data. Set SEARCH_BACKEND=serper for real results.",
+                    "position": 1,
+                }
+            ],
+        }
+
+
+class PooledSerperDevTool(SerperDevTool):
+    """SerperDevTool that posts through a shared httpx.Client (keep-alive) instead of one requests.post per search."""
+
+    _client: Any = PrivateAttr(default=None)
+
+    def _make_api_request(self, search_query: str, search_type: str) -> dict:
+        payload = {"q": search_query, "num": self.n_results}
+        for field, value in (("gl", self.country), ("location", self.location), ("hl", self.locale)):
+            if value:
+                payload[field] = value
+        response = self._client.post(
+            self._get_search_url(search_type),
+            headers={"X-API-KEY": os.environ["SERPER_API_KEY"], "content-type": "application/json"},
+            json=payload,
+            timeout=10,
+        )
+        response.raise_for_status()
+        results = response.json()
+        if not results:
+            raise ValueError("Empty response from Serper API")
+        return results
+
+
+class SerperSearchBackend:
+    """
+    Live backend: the crewai_tools SerperDevTool.
+    Args:
+        client: httpx.Client to send the requests through (e.g. a pooled one, see tool_registry.py)
+    """
+
+    def __init__(self, client=None, **serper_kwargs):
+        if client is None:
+            self.tool = SerperDevTool(**serper_kwargs)
+        else:
+            self.tool = PooledSerperDevTool(**serper_kwargs)
+            self.tool._client = client
+
+    def search(self, query: str, search_type: str = "search") -> Any:
+        return self.tool._run(search_query=query, search_type=search_type)
+
+
+def default_backend(client=None):
+    if os.getenv("SEARCH_BACKEND", "serper").lower() == "offline":
+        return OfflineSearchBackend(os.getenv("SEARCH_FIXTURES"))
+    return SerperSearchBackend(client=client)
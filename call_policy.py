@@ -0,0 +1,241 @@
+# Deadlines and hedged requests for slow tool and LLM calls
+#
+# The tail latency of a turn is dominated by a few very slow calls: the gemini-2.5-pro grounded
+# search of script 4 and Tavily searches in scripts 1-3. This module adds a small call policy layer:
+# 1. Turn budget  - `with turn_budget():` around agent.run sets a deadline (TURN_BUDGET_S seconds,
+#                   default 120) in a contextvar; it follows the turn into every workflow step and
+#                   tool call. Each call gets min(its own timeout, time left in the turn); async LLM
+#                   requests of the shared clients (llm_factory.py) get their HTTP timeouts and
+#                   rate-limiter wait capped too.
+# 2. Hedging      - optional, per call: when a call has not finished after the p95 of its recent
+#                   latencies, a second identical request is sent and the first to succeed wins.
+#                   The loser's task is cancelled, but a request already on the wire is not aborted:
+#                   the shared pool (llm_factory.PooledAsyncTransport) lets it finish so its
+#                   connection can be reused. Every hedge therefore costs a full second request and
+#                   is counted as extra load
+# 3. Per call     - timeout, hedging on/off and the hedge delay are configured per call name
+#                   (POLICIES below, configure(), or CALL_POLICIES='{"tavily_search": {"hedge": true}}');
+#                   hedging is off unless a call opts in
+# 4. Metrics      - latency per call and arm, attempts (primary / hedge), hedge wins and abandoned
+#                   requests in metrics.py. A `control` fraction of calls is never hedged, so the p99
+#                   of both arms can be compared at runtime: policy_report() shows the p99 gain and
+#                   the extra load.
+#
+# Usage:
+#   from call_policy import call_with_policy, turn_budget
+#   result = await call_with_policy("tavily_search", client.search, query)
+#   with turn_budget():
+#       response = await agent.run(user_msg=user_msg)
+#
+# Hedging on a synthetic slow tail: python -m benchmarks.hedging
+
+import asyncio
+import contextlib
+import contextvars
+import json
+import math
+import os
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, replace
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterator, List, Optional
+
+from metrics import registry
+
+
+class DeadlineExceeded(TimeoutError):
+    """The call (or the turn it belongs to) ran out of time."""
+
+
+@dataclass
+class CallPolicy:
+    timeout_s: float = 60.0  # per call, capped by the turn budget
+    hedge: bool = False
+    hedge_delay_s: float = 5.0  # until min_samples latencies are known
+    hedge_quantile: float = 0.95
+    min_hedge_delay_s: float = 0.05
+    min_samples: int = 20
+    control: float = 0.05  # fraction of calls that are never hedged (comparison arm)
+
+
+POLICIES: Dict[str, CallPolicy] = {
+    # hedging is opt-in, e.g. CALL_POLICIES='{"tavily_search": {"hedge": true}}'
+    "tavily_search": CallPolicy(timeout_s=20.0, hedge_delay_s=3.0),
+    "grounded_search": CallPolicy(timeout_s=120.0, hedge_delay_s=30.0),
+    "*": CallPolicy(),
+}
+
+CALL_LATENCY = registry.histogram("policy_call_seconds", "Latency of calls under a call policy", ["call", "arm"])
+ATTEMPTS = registry.counter("policy_attempts_total", "Requests sent under a call policy", ["call", "kind"])
+HEDGE_WINS = registry.counter("policy_hedge_wins_total", "Calls won by the hedged request", ["call"])
+DEADLINES = registry.counter("policy_deadline_exceeded_total", "Calls that ran out of time", ["call"])
+ABANDONED = registry.counter("policy_abandoned_total", "Losing requests left to finish in the background", ["call"])
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("call_deadline", default=None)
+_latencies: Dict[str, Deque[float]] = {}
+_arms: Dict[str, Dict[str, Deque[float]]] = {}
+_counts: Dict[str, Dict[str, int]] = {}
+
+
+def policy_for(name: str) -> CallPolicy:
+    overrides = json.loads(os.getenv("CALL_POLICIES", "{}"))
+    policy = POLICIES.get(name, POLICIES["*"])
+    return replace(policy, **overrides.get(name, {})) if name in overrides else policy
+
+
+def configure(name: str, **settings) -> CallPolicy:
+    """Set (part of) the policy of a call, e.g. configure("tavily_search", hedge=True)."""
+    POLICIES[name] = replace(POLICIES.get(name, POLICIES["*"]), **settings)
+    return POLICIES[name]
+
+
+# Deadlines
+
+@contextlib.contextmanager
+def turn_budget(seconds: Optional[float] = None) -> Iterator[None]:
+    """Deadline for everything called inside the block (a nested budget can only shorten it)."""
+    seconds = float(os.getenv("TURN_BUDGET_S", 120)) if seconds is None else seconds
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current turn budget, None without one."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def cap_timeouts(extensions: dict) -> dict:
+    """httpx request extensions with every timeout capped at the time left in the turn."""
+    left = remaining()
+    if left is None:
+        return extensions
+    if left <= 0:
+        raise DeadlineExceeded("Turn budget exhausted before the request was sent")
+    timeouts = dict(extensions.get("timeout") or {})
+    for key in ("connect", "read", "write", "pool"):
+        timeouts[key] = left if timeouts.get(key) is None else min(timeouts[key], left)
+    return {**extensions, "timeout": timeouts}
+
+
+# Hedging
+
+def _quantile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+def hedge_delay(name: str, policy: CallPolicy) -> float:
+    """p95 (hedge_quantile) of the recent latencies of a call, or the configured delay."""
+    recent = _latencies.get(name)
+    if not recent or len(recent) < policy.min_samples:
+        return policy.hedge_delay_s
+    return max(policy.min_hedge_delay_s, _quantile(recent, policy.hedge_quantile))
+
+
+def _record(name: str, arm: str, seconds: float, kind: str) -> None:
+    _latencies.setdefault(name, deque(maxlen=500)).append(seconds)
+    _arms.setdefault(name, {}).setdefault(arm, deque(maxlen=2000)).append(seconds)
+    CALL_LATENCY.observe(seconds, call=name, arm=arm)
+    if kind == "hedge":
+        HEDGE_WINS.inc(call=name)
+        _count(name, "hedge_wins")
+
+
+def _count(name: str, key: str) -> None:
+    counts = _counts.setdefault(name, {})
+    counts[key] = counts.get(key, 0) + 1
+
+
+def _launch(name: str, kind: str, fn: Callable[..., Awaitable[Any]], args, kwargs) -> asyncio.Future:
+    ATTEMPTS.inc(call=name, kind=kind)
+    _count(name, kind)
+    return asyncio.ensure_future(fn(*args, **kwargs))
+
+
+async def call_with_policy(name: str, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+    """
+    Await fn(*args, **kwargs) with the policy of `name`: a deadline and an optional hedged request.
+    Args:
+        name (str): Call name (policy, metrics)
+        fn: Async function; it is called again for the hedged request
+    Returns:
+        The result of the first request that succeeds
+    Raises:
+        DeadlineExceeded: No request finished in time; the last error if all requests failed
+    """
+    policy = policy_for(name)
+    start = time.monotonic()
+    left = remaining()
+    timeout = policy.timeout_s if left is None else min(policy.timeout_s, left)
+    if timeout <= 0:
+        DEADLINES.inc(call=name)
+        raise DeadlineExceeded(f"{name}: turn budget exhausted")
+    end = start + timeout
+    hedged = policy.hedge and random.random() >= policy.control
+    hedge_at = start + hedge_delay(name, policy) if hedged else None
+    arm = "hedged" if hedged else ("control" if policy.hedge else "plain")
+
+    tasks = {_launch(name, "primary", fn, args, kwargs): "primary"}
+    error: Optional[BaseException] = None
+    try:
+        while tasks:
+            wake = end if hedge_at is None else min(end, hedge_at)
+            done, _ = await asyncio.wait(tasks, timeout=max(0.0, wake - time.monotonic()),
+                                         return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                kind = tasks.pop(task)
+                if task.exception() is None:
+                    _record(name, arm, time.monotonic() - start, kind)
+                    return task.result()
+                error = task.exception()
+            if done:
+                continue
+            if hedge_at is not None and time.monotonic() >= hedge_at:
+                tasks[_launch(name, "hedge", fn, args, kwargs)] = "hedge"
+                hedge_at = None
+            elif time.monotonic() >= end:
+                DEADLINES.inc(call=name)
+                raise DeadlineExceeded(f"{name}: no response within {timeout:.1f}s")
+        raise error
+    finally:
+        for task in tasks:  # the loser (or everything, on timeout / cancellation)
+            task.cancel()
+            ABANDONED.inc(call=name)
+            _count(name, "abandoned")
+
+
+def policy_report() -> Dict[str, dict]:
+    """Per call: p99 of the hedged and the never-hedged arm, and the extra requests hedging sent."""
+    report = {}
+    for name, arms in _arms.items():
+        counts = _counts.get(name, {})
+        entry = {
+            "calls": sum(len(values) for values in arms.values()),
+            "hedges": counts.get("hedge", 0),
+            "hedge_wins": counts.get("hedge_wins", 0),
+            "abandoned": counts.get("abandoned", 0),
+            "extra_load": counts.get("hedge", 0) / max(1, counts.get("primary", 0)),
+        }
+        for arm, values in arms.items():
+            entry[f"{arm}_p99_s"] = _quantile(values, 0.99)
+        if "hedged" in arms and "control" in arms:
+            entry["p99_gain"] = 1 - entry["hedged_p99_s"] / entry["control_p99_s"]
+        report[name] = entry
+    return report
+
+
+def format_report(report: Optional[Dict[str, dict]] = None) -> List[str]:
+    lines = []
+    for name, r in (report or policy_report()).items():
+        line = f"{name}: {r['calls']} calls, {r['hedges']} hedges ({r['extra_load']:.0%} extra load), {r['hedge_wins']} won"
+        if "p99_gain" in r:
+            line += f", p99 {r['control_p99_s']:.2f}s -> {r['hedged_p99_s']:.2f}s ({r['p99_gain']:.0%} better)"
+        lines.append(line)
+    return lines
@@ -0,0 +1,475 @@
+# Gemini context caching for the stable prefix of requests (system prompt and tool schemas)
+#
+# Every turn of a FunctionAgent, every agent step of the research workflow and every CrewAI agent
+# call resends the same system prompt / backstory and tool declarations; on short user messages
+# processing that prefix dominates the time to first token. The shared LLM transport
+# (llm_factory.py) sends all Gemini requests of both frameworks - google-genai for LlamaIndex,
+# litellm for CrewAI - through ContextCachingTransport, which:
+# 1. Detects the stable prefix - systemInstruction + tools + toolConfig of generate requests,
+#    hashed per model; a prefix that has been sent CONTEXT_CACHE_AFTER times (default 2) is stable
+# 2. Registers it           - POST {version}/cachedContents with the prefix and a TTL
+#                             (CONTEXT_CACHE_TTL_S, default 3600; recreated when it expires), once
+#                             it reaches the model's minimum cacheable size (MIN_TOKENS, override
+#                             CONTEXT_CACHE_MIN_TOKENS). Smaller prefixes are left to Gemini's
+#                             implicit caching, which is reported as well
+# 3. References it          - later requests send `cachedContent` instead of the prefix; when the
+#                             cache is gone (expired, deleted) the original request is resent
+# 4. Reports savings        - prompt tokens served from explicit / implicit caches (usageMetadata
+#                             cachedContentTokenCount) and the time to first token of cached vs
+#                             uncached requests, in metrics.py and context_cache_report()
+# Caches created by the process are deleted at exit (cached content is billed per hour).
+# CONTEXT_CACHE=0 disables the layer.
+#
+# LocalGeminiBackend is an httpx transport that answers the Gemini REST API locally (generate,
+# cachedContents, models.get) with a prompt-processing delay per uncached token, for testing:
+#   python -m benchmarks.context_cache
+
+import atexit
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from metrics import estimate_tokens, record_cache, registry
+
+GENERATE_PATH = re.compile(
+    r"^/(?P<version>v1\w*)/(?P<parent>projects/[^/]+/locations/[^/]+/)?(?:publishers/google/)?"
+    r"models/(?P<model>[^/:]+):(?:generateContent|streamGenerateContent)$"
+)
+# (REST field, spellings): google-genai sends camelCase, litellm snake_case
+PREFIX_FIELDS = (
+    ("systemInstruction", ("systemInstruction", "system_instruction")),
+    ("tools", ("tools",)),
+    ("toolConfig", ("toolConfig", "tool_config")),
+)
+# Minimum cacheable size of cached content per model family
+MIN_TOKENS = {"flash": 1024, "pro": 4096, "*": 4096}
+USAGE_FIELD = re.compile(rb'"(promptTokenCount|cachedContentTokenCount)"\s*:\s*(\d+)')
+
+PROMPT_TOKENS = registry.counter(
+    "context_cache_prompt_tokens_total", "Prompt tokens by cache source (explicit / implicit / uncached)",
+    ["model", "source"],
+)
+TTFT = registry.histogram("context_cache_ttft_seconds", "Time to first token of generate requests", ["model", "prefix"])
+CREATED = registry.counter("context_cache_created_total", "Cached contents created", ["model", "status"])
+
+
+def enabled() -> bool:
+    return os.getenv("CONTEXT_CACHE", "1").lower() not in ("0", "false", "no")
+
+
+def min_tokens(model: str) -> int:
+    if os.getenv("CONTEXT_CACHE_MIN_TOKENS"):
+        return int(os.getenv("CONTEXT_CACHE_MIN_TOKENS"))
+    return next((n for family, n in MIN_TOKENS.items() if family in model), MIN_TOKENS["*"])
+
+
+class _Prefix:
+    def __init__(self, model: str, cache_model: str, fields: dict):
+        self.model, self.cache_model, self.fields = model, cache_model, fields
+        self.tokens = estimate_tokens(json.dumps(fields))
+        self.uses = 0
+        self.name: Optional[str] = None
+        self.expires_at = 0.0
+        self.creating = False
+        self.retry_at = 0.0  # after a failed creation
+
+    def usable(self) -> bool:
+        return self.name is not None and time.time() < self.expires_at - 30
+
+
+class ContextCache:
+    """Process-wide table of request prefixes and the cached contents registered for them."""
+
+    def __init__(self):
+        self._prefixes: Dict[str, _Prefix] = {}
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._created: List[Tuple[httpx.Request, str]] = []  # (create request, cache name) for cleanup
+
+    # Requests
+
+    def split(self, request: httpx.Request) -> Optional[Tuple[_Prefix, dict]]:
+        """(prefix, request body) of a generate request with a cacheable prefix, else None."""
+        match = GENERATE_PATH.match(request.url.path)
+        if match is None or request.method != "POST":
+            return None
+        try:
+            body = json.loads(request.content or b"{}")
+        except ValueError:
+            return None
+        if body.get("cachedContent") or body.get("cached_content"):
+            return None  # the caller manages its own cache
+        fields = {}
+        for field, spellings in PREFIX_FIELDS:
+            for spelling in spellings:
+                if body.get(spelling):
+                    fields[field] = body[spelling]
+        if "systemInstruction" not in fields and "tools" not in fields:
+            return None
+        model = match.group("model")
+        parent = match.group("parent") or ""
+        cache_model = f"{parent}publishers/google/models/{model}" if parent else f"models/{model}"
+        key = hashlib.sha256(json.dumps([cache_model, fields], sort_keys=True).encode("utf-8")).hexdigest()
+        with self._lock:
+            prefix = self._prefixes.get(key)
+            if prefix is None:
+                prefix = self._prefixes[key] = _Prefix(model, cache_model, fields)
+            prefix.uses += 1
+        return prefix, body
+
+    def should_create(self, prefix: _Prefix) -> bool:
+        """True for the one caller that should register the prefix now."""
+        with self._lock:
+            if (prefix.usable() or prefix.creating or time.time() < prefix.retry_at
+                    or prefix.uses < int(os.getenv("CONTEXT_CACHE_AFTER", 2))
+                    or prefix.tokens < min_tokens(prefix.model)):
+                return False
+            prefix.creating = True
+            return True
+
+    def create_request(self, prefix: _Prefix, request: httpx.Request) -> httpx.Request:
+        match = GENERATE_PATH.match(request.url.path)
+        parent = match.group("parent") or ""
+        body = {"model": prefix.cache_model, **prefix.fields, "ttl": f"{int(float(os.getenv('CONTEXT_CACHE_TTL_S', 3600)))}s"}
+        return httpx.Request(
+            "POST",
+            request.url.copy_with(path=f"/{match.group('version')}/{parent}cachedContents"),
+            headers=_forward_headers(request),
+            json=body,
+        )
+
+    def created(self, prefix: _Prefix, create: httpx.Request, status: int, body: bytes) -> None:
+        ttl_s = float(os.getenv("CONTEXT_CACHE_TTL_S", 3600))
+        with self._lock:
+            prefix.creating = False
+            name = json.loads(body).get("name") if status == 200 else None
+            if name:
+                prefix.name, prefix.expires_at = name, time.time() + ttl_s
+                self._created.append((create, name))
+            else:
+                prefix.retry_at = time.time() + ttl_s  # e.g. below the minimum size: implicit caching only
+        CREATED.inc(model=prefix.model, status="ok" if name else f"http_{status}")
+        if not name:
+            print(f"--- Context cache for {prefix.model} not created (HTTP {status}) ---")
+
+    def invalidate(self, prefix: _Prefix) -> None:
+        with self._lock:
+            prefix.name, prefix.expires_at = None, 0.0
+
+    def cached_request(self, prefix: _Prefix, request: httpx.Request, body: dict) -> Optional[httpx.Request]:
+        """The request with its prefix replaced by a reference to the cached content, if there is one."""
+        name = prefix.name if prefix.usable() else None
+        record_cache("context", name is not None)
+        if name is None:
+            return None
+        spellings = {spelling for _, names in PREFIX_FIELDS for spelling in names}
+        body = {k: v for k, v in body.items() if k not in spellings}
+        body["cachedContent"] = name
+        content = json.dumps(body).encode("utf-8")
+        headers = httpx.Headers(request.headers)
+        headers["content-length"] = str(len(content))
+        return httpx.Request(request.method, request.url, headers=headers, content=content, extensions=request.extensions)
+
+    # Reporting
+
+    def record(self, model: str, cached: bool, ttft_s: float, tail: bytes) -> None:
+        usage = {field.decode(): int(value) for field, value in USAGE_FIELD.findall(tail)}
+        prompt = usage.get("promptTokenCount", 0)
+        from_cache = usage.get("cachedContentTokenCount", 0)
+        source = "explicit" if cached else "implicit"
+        PROMPT_TOKENS.inc(from_cache, model=model, source=source)
+        PROMPT_TOKENS.inc(max(0, prompt - from_cache), model=model, source="uncached")
+        TTFT.observe(ttft_s, model=model, prefix="cached" if cached else "uncached")
+        with self._lock:
+            stats = self._stats.setdefault(model, {
+                "requests": 0, "cached_requests": 0, "prompt_tokens": 0, "explicit_tokens": 0,
+                "implicit_tokens": 0, "cached_ttft_s": 0.0, "uncached_ttft_s": 0.0,
+            })
+            stats["requests"] += 1
+            stats["cached_requests"] += cached
+            stats["prompt_tokens"] += prompt
+            stats[f"{source}_tokens"] += from_cache
+            stats["cached_ttft_s" if cached else "uncached_ttft_s"] += ttft_s
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {model: dict(stats) for model, stats in self._stats.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._prefixes.clear()
+            self._stats.clear()
+
+    def cleanup(self, transport: httpx.BaseTransport) -> None:
+        """Delete the cached contents created by this process (best effort)."""
+        with self._lock:
+            created, self._created = self._created, []
+        for create, name in created:
+            version = create.url.path.split("/")[1]
+            try:
+                transport.handle_request(httpx.Request(
+                    "DELETE", create.url.copy_with(path=f"/{version}/{name}"), headers=_forward_headers(create),
+                )).close()
+            except Exception:
+                pass
+
+
+def _forward_headers(request: httpx.Request) -> dict:
+    # Credentials and client identification only: the api key may also be in the URL (litellm)
+    return {k: v for k, v in request.headers.items()
+            if k.lower() in ("x-goog-api-key", "authorization", "x-goog-api-client", "user-agent", "x-goog-user-project")}
+
+
+cache = ContextCache()
+_cleanup_registered = False
+
+
+def context_cache_report() -> List[str]:
+    lines = []
+    for model, s in cache.stats().items():
+        cached_tokens = s["explicit_tokens"] + s["implicit_tokens"]
+        uncached_requests = s["requests"] - s["cached_requests"]
+        line = (
+            f"Context cache {model}: {s['requests']:.0f} requests ({s['cached_requests']:.0f} with cached content), "
+            f"{cached_tokens:.0f}/{s['prompt_tokens']:.0f} prompt tokens from cache "
+            f"({s['explicit_tokens']:.0f} explicit, {s['implicit_tokens']:.0f} implicit)"
+        )
+        if s["cached_requests"] and uncached_requests:
+            cached_ttft = s["cached_ttft_s"] / s["cached_requests"]
+            uncached_ttft = s["uncached_ttft_s"] / uncached_requests
+            line += f", time to first token {uncached_ttft * 1000:.0f}ms -> {cached_ttft * 1000:.0f}ms"
+        lines.append(line)
+    return lines
+
+
+class _Recorder:
+    """Records usage and TTFT once the response body has been read (usageMetadata comes last)."""
+
+    def __init__(self, model: str, cached: bool, ttft_s: float):
+        self.model, self.cached, self.ttft_s = model, cached, ttft_s
+        self.tail = b""
+        self.done = False
+
+    def feed(self, chunk: bytes) -> None:
+        self.tail = (self.tail + chunk)[-4096:]
+
+    def __call__(self) -> None:
+        if not self.done:
+            self.done = True
+            cache.record(self.model, self.cached, self.ttft_s, self.tail)
+
+
+class _RecordingStream(httpx.SyncByteStream):
+    def __init__(self, stream: httpx.SyncByteStream, recorder: _Recorder):
+        self._stream, self._recorder = stream, recorder
+
+    def __iter__(self):
+        for chunk in self._stream:
+            self._recorder.feed(chunk)
+            yield chunk
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            self._recorder()
+
+
+class _AsyncRecordingStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, recorder: _Recorder):
+        self._stream, self._recorder = stream, recorder
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            self._recorder.feed(chunk)
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._recorder()
+
+
+def _stale_cache(status: int, body: bytes) -> bool:
+    return status in (400, 403, 404) and b"cache" in body.lower()
+
+
+class ContextCachingTransport(httpx.BaseTransport):
+    """Registers stable request prefixes as cached content and references them in later requests."""
+
+    def __init__(self, transport: httpx.BaseTransport):
+        global _cleanup_registered
+        self._transport = transport
+        if not _cleanup_registered:
+            _cleanup_registered = True
+            atexit.register(cache.cleanup, transport)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.read()
+        split = cache.split(request)
+        if split is None:
+            return self._transport.handle_request(request)
+        prefix, body = split
+        if cache.should_create(prefix):
+            create = cache.create_request(prefix, request)
+            try:
+                response = self._transport.handle_request(create)
+                cache.created(prefix, create, response.status_code, response.read())
+                response.close()
+            except Exception:
+                cache.created(prefix, create, 0, b"{}")
+        cached = cache.cached_request(prefix, request, body)
+        start = time.perf_counter()
+        response = self._transport.handle_request(cached or request)
+        if cached is not None and response.status_code != 200:
+            error = response.read()
+            response.close()
+            if not _stale_cache(response.status_code, error):
+                return httpx.Response(response.status_code, headers=response.headers, content=error,
+                                      extensions=response.extensions)
+            cache.invalidate(prefix)
+            cached, start = None, time.perf_counter()
+            response = self._transport.handle_request(request)
+        recorder = _Recorder(prefix.model, cached is not None, time.perf_counter() - start)
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_RecordingStream(response.stream, recorder),
+            extensions=response.extensions,
+        )
+
+
+class AsyncContextCachingTransport(httpx.AsyncBaseTransport):
+    """Async version of ContextCachingTransport."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        split = cache.split(request)
+        if split is None:
+            return await self._transport.handle_async_request(request)
+        prefix, body = split
+        if cache.should_create(prefix):
+            create = cache.create_request(prefix, request)
+            try:
+                response = await self._transport.handle_async_request(create)
+                cache.created(prefix, create, response.status_code, await response.aread())
+                await response.aclose()
+            except Exception:
+                cache.created(prefix, create, 0, b"{}")
+        cached = cache.cached_request(prefix, request, body)
+        start = time.perf_counter()
+        response = await self._transport.handle_async_request(cached or request)
+        if cached is not None and response.status_code != 200:
+            error = await response.aread()
+            await response.aclose()
+            if not _stale_cache(response.status_code, error):
+                return httpx.Response(response.status_code, headers=response.headers, content=error,
+                                      extensions=response.extensions)
+            cache.invalidate(prefix)
+            cached, start = None, time.perf_counter()
+            response = await self._transport.handle_async_request(request)
+        recorder = _Recorder(prefix.model, cached is not None, time.perf_counter() - start)
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_AsyncRecordingStream(response.stream, recorder),
+            extensions=response.extensions,
+        )
+
+
+# Local stand-in backend
+
+class LocalGeminiBackend(httpx.BaseTransport):
+    """
+    Answers the Gemini REST API locally: generateContent / streamGenerateContent, cachedContents
+    (create, delete) and models.get. The time to first token is base_s plus per_token_s for every
+    prompt token that does not come from cached content.
+    Args:
+        base_s (float): Fixed latency of a generate request
+        per_token_s (float): Prompt processing time per uncached token
+        min_tokens (int): Smallest cached content accepted (like the real API's minimum)
+    """
+
+    def __init__(self, base_s: float = 0.02, per_token_s: float = 0.00002, min_tokens: int = 0):
+        self.base_s, self.per_token_s, self.min_tokens = base_s, per_token_s, min_tokens
+        self.caches: Dict[str, dict] = {}
+        self.requests: Dict[str, int] = {}
+        self.totals = {"uncached_tokens": 0, "cached_tokens": 0, "ttft_s": 0.0}
+        self._lock = threading.Lock()
+
+    def _count(self, kind: str) -> None:
+        with self._lock:
+            self.requests[kind] = self.requests.get(kind, 0) + 1
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if request.method == "DELETE" and "/cachedContents/" in path:
+            self._count("delete")
+            with self._lock:
+                self.caches.pop(path.split("/", 2)[2], None)
+            return httpx.Response(200, json={})
+        if request.method == "POST" and path.endswith("/cachedContents"):
+            return self._create(json.loads(request.read()))
+        match = GENERATE_PATH.match(path)
+        if match and request.method == "POST":
+            return self._generate(json.loads(request.read()), path.endswith("streamGenerateContent"))
+        if request.method == "GET" and "/models/" in path:
+            self._count("models_get")
+            return httpx.Response(200, json={
+                "name": path.split("/", 2)[2], "inputTokenLimit": 1048576, "outputTokenLimit": 65536,
+            })
+        return httpx.Response(404, json={"error": {"code": 404, "message": f"Not found: {path}"}})
+
+    def _create(self, body: dict) -> httpx.Response:
+        self._count("cache_create")
+        tokens = estimate_tokens(json.dumps({k: v for k, v in body.items() if k not in ("model", "ttl")}))
+        if tokens < self.min_tokens:
+            return httpx.Response(400, json={"error": {"code": 400, "message": (
+                f"Cached content is too small. total_token_count={tokens}, min_total_token_count={self.min_tokens}")}})
+        with self._lock:
+            name = f"cachedContents/local-{len(self.caches) + 1}"
+            self.caches[name] = {"tokens": tokens, "model": body.get("model")}
+        return httpx.Response(200, json={"name": name, "model": body.get("model"), "usageMetadata": {"totalTokenCount": tokens}})
+
+    def _generate(self, body: dict, stream: bool) -> httpx.Response:
+        self._count("generate")
+        cached_tokens = 0
+        name = body.get("cachedContent")
+        if name:
+            if any(body.get(s) for _, spellings in PREFIX_FIELDS for s in spellings):
+                return httpx.Response(400, json={"error": {"code": 400, "message": (
+                    "CachedContent can not be used with GenerateContent request setting system_instruction, tools or tool_config.")}})
+            with self._lock:
+                entry = self.caches.get(name)
+            if entry is None:
+                return httpx.Response(403, json={"error": {"code": 403, "message": f"CachedContent not found: {name}"}})
+            cached_tokens = entry["tokens"]
+        uncached_tokens = estimate_tokens(json.dumps({k: v for k, v in body.items() if k != "cachedContent"}))
+        ttft_s = self.base_s + uncached_tokens * self.per_token_s
+        time.sleep(ttft_s)
+        with self._lock:
+            self.totals["uncached_tokens"] += uncached_tokens
+            self.totals["cached_tokens"] += cached_tokens
+            self.totals["ttft_s"] += ttft_s
+        prompt_tokens = cached_tokens + uncached_tokens
+        answer = {
+            "candidates": [{"content": {"role": "model", "parts": [{"text": "Stand-in answer."}]}, "finishReason": "STOP"}],
+            "usageMetadata": {
+                "promptTokenCount": prompt_tokens, "candidatesTokenCount": 3, "totalTokenCount": prompt_tokens + 3,
+                **({"cachedContentTokenCount": cached_tokens} if cached_tokens else {}),
+            },
+        }
+        if stream:
+            return httpx.Response(200, headers={"content-type": "text/event-stream"},
+                                  content=f"data: {json.dumps(answer)}\r\n\r\n".encode("utf-8"))
+        return httpx.Response(200, json=answer)
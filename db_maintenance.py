@@ -0,0 +1,355 @@
+# Maintenance and compaction tool for the local Chroma store under db/
+#
+# Every rerun of the crews and of the PDF tools adds embeddings and memory rows to db/
+# (chroma.sqlite3 + one HNSW segment directory per collection) and nothing is ever removed,
+# so query latency and disk use keep rising. This script has one sub-command per job:
+#
+#   python db_maintenance.py report                 # per-collection counts and sizes
+#   python db_maintenance.py prune --stale-days 30  # remove orphaned segment dirs and stale collections
+#   python db_maintenance.py compact                # rebuild HNSW segments full of deleted elements
+#   python db_maintenance.py vacuum                 # VACUUM chroma.sqlite3
+#   python db_maintenance.py bench                  # time a fixed query set (on a temporary copy)
+#   python db_maintenance.py all --stale-days 30    # bench -> prune -> compact -> vacuum -> bench
+#
+# Use --path to point at another Chroma directory (e.g. the CrewAI memory storage) and
+# --dry-run to see what prune would remove without deleting anything. prune and all only
+# delete collections with an explicit --stale-days. Note that a rebuilt (or first queried)
+# HNSW segment is persisted at its preallocated size, so compact can grow a small store.
+
+import argparse
+import os
+import re
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import chromadb
+from chromadb.segment.impl.vector.local_persistent_hnsw import PersistentData
+
+UUID_DIR = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+ADD_BATCH_SIZE = 500
+
+
+def dir_size(path: str) -> int:
+    """Total size in bytes of all files below path."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def human(size: int) -> str:
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024:
+            return f"{size:.0f}{unit}"
+        size /= 1024
+    return f"{size:.1f}TB"
+
+
+def sqlite_path(path: str) -> str:
+    return os.path.join(path, "chroma.sqlite3")
+
+
+# STEP 1: report
+
+def collection_stats(path: str) -> list:
+    """
+    Read per-collection statistics straight from chroma.sqlite3 (no Chroma client needed).
+    Returns:
+        list: One dict per collection with name, id, dimension, count, last_write and hnsw_bytes
+    """
+    conn = sqlite3.connect(sqlite_path(path))
+    try:
+        rows = conn.execute(
+            """SELECT c.id, c.name, c.dimension,
+                      (SELECT s.id FROM segments s WHERE s.collection = c.id AND s.scope = 'VECTOR'),
+                      COUNT(e.id), MAX(e.created_at)
+               FROM collections c
+               LEFT JOIN segments ms ON ms.collection = c.id AND ms.scope = 'METADATA'
+               LEFT JOIN embeddings e ON e.segment_id = ms.id
+               GROUP BY c.id"""
+        ).fetchall()
+    finally:
+        conn.close()
+
+    stats = []
+    for collection_id, name, dimension, vector_segment, count, last_write in rows:
+        segment_dir = os.path.join(path, vector_segment) if vector_segment else None
+        stats.append({
+            "id": collection_id,
+            "name": name,
+            "dimension": dimension,
+            "count": count,
+            "last_write": last_write,
+            "vector_segment": vector_segment,
+            "hnsw_bytes": dir_size(segment_dir) if segment_dir and os.path.isdir(segment_dir) else 0,
+            "hnsw_dead": hnsw_dead_elements(segment_dir) if segment_dir and os.path.isdir(segment_dir) else 0,
+        })
+    return stats
+
+
+def hnsw_dead_elements(segment_dir: str) -> int:
+    """
+    Number of deleted/overwritten elements still held in an HNSW segment.
+    HNSW indexes never shrink: chroma only marks removed vectors as deleted, so the
+    segment keeps growing. Returns 0 when the segment has not been persisted yet.
+    """
+    metadata_file = os.path.join(segment_dir, "index_metadata.pickle")
+    if not os.path.exists(metadata_file):
+        return 0
+    data = PersistentData.load_from_file(metadata_file)
+    return data.total_elements_added - len(data.id_to_label)
+
+
+def orphaned_segment_dirs(path: str) -> list:
+    """HNSW segment directories that no longer belong to any segment in chroma.sqlite3."""
+    conn = sqlite3.connect(sqlite_path(path))
+    try:
+        known = {row[0] for row in conn.execute("SELECT id FROM segments")}
+    finally:
+        conn.close()
+    return [
+        os.path.join(path, name)
+        for name in sorted(os.listdir(path))
+        if UUID_DIR.match(name) and os.path.isdir(os.path.join(path, name)) and name not in known
+    ]
+
+
+def report(path: str) -> None:
+    stats = collection_stats(path)
+    print(f"Chroma store: {path}  (chroma.sqlite3 = {human(os.path.getsize(sqlite_path(path)))}, "
+          f"total = {human(dir_size(path))})")
+    print(f"{'collection':40} {'count':>8} {'dead':>6} {'dim':>6} {'hnsw':>8}  last write")
+    for s in stats:
+        print(f"{s['name'][:40]:40} {s['count']:>8} {s['hnsw_dead']:>6} {s['dimension'] or '-':>6} "
+              f"{human(s['hnsw_bytes']):>8}  {s['last_write'] or '-'}")
+    orphans = orphaned_segment_dirs(path)
+    if orphans:
+        print(f"Orphaned segment dirs: {len(orphans)} ({human(sum(dir_size(o) for o in orphans))})")
+
+
+# STEP 2: prune
+
+def stale_collections(path: str, stale_days: float) -> list:
+    """Empty collections, plus collections without writes in the last stale_days days."""
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=stale_days)).strftime("%Y-%m-%d %H:%M:%S")
+    return [
+        s for s in collection_stats(path)
+        if s["count"] == 0 or (s["last_write"] and s["last_write"] < cutoff)
+    ]
+
+
+def prune(path: str, stale_days: float, dry_run: bool = False) -> None:
+    # Work out what to remove before opening a client, which may touch the segment dirs
+    orphans = orphaned_segment_dirs(path)
+    stale = stale_collections(path, stale_days)
+    for orphan in orphans:
+        print(f"{'[dry-run] ' if dry_run else ''}Removing orphaned segment dir {orphan} ({human(dir_size(orphan))})")
+        if not dry_run:
+            shutil.rmtree(orphan)
+    if stale:
+        client = None if dry_run else chromadb.PersistentClient(path=path)
+        for s in stale:
+            print(f"{'[dry-run] ' if dry_run else ''}Deleting stale collection {s['name']} "
+                  f"({s['count']} rows, last write {s['last_write'] or 'never'})")
+            if client:
+                client.delete_collection(s["name"])
+    if not orphans and not stale:
+        print("Nothing to prune.")
+
+
+# STEP 3: compact
+
+def created_at(path: str, collection_id: str) -> dict:
+    """{embedding_id: created_at} of a collection's rows, as stored in chroma.sqlite3."""
+    conn = sqlite3.connect(sqlite_path(path))
+    try:
+        return dict(conn.execute(
+            """SELECT e.embedding_id, e.created_at FROM embeddings e
+               JOIN segments s ON e.segment_id = s.id
+               WHERE s.collection = ? AND s.scope = 'METADATA'""",
+            (collection_id,),
+        ).fetchall())
+    finally:
+        conn.close()
+
+
+def restore_created_at(path: str, collection_id: str, timestamps: dict) -> None:
+    """Give rebuilt rows their original write times, so --stale-days still sees the real last write."""
+    conn = sqlite3.connect(sqlite_path(path), timeout=30)
+    try:
+        with conn:
+            conn.executemany(
+                """UPDATE embeddings SET created_at = ?
+                   WHERE embedding_id = ? AND segment_id =
+                         (SELECT id FROM segments WHERE collection = ? AND scope = 'METADATA')""",
+                [(timestamp, embedding_id, collection_id) for embedding_id, timestamp in timestamps.items()],
+            )
+    finally:
+        conn.close()
+
+
+def compact(path: str, min_dead_ratio: float = 0.1, force: bool = False) -> None:
+    """
+    Rebuild collections so their HNSW segment only contains live vectors.
+    The live rows are re-added into a temporary collection, which replaces the original only
+    once it is complete: an error while copying leaves the original untouched. Row write times
+    are carried over. Only collections with at least min_dead_ratio dead elements are
+    rebuilt unless force is set (a fresh segment preallocates space, so rebuilding a clean
+    collection gains nothing).
+    """
+    to_rebuild = [
+        s for s in collection_stats(path)
+        if force or (s["count"] and s["hnsw_dead"] / (s["count"] + s["hnsw_dead"]) >= min_dead_ratio)
+    ]
+    if not to_rebuild:
+        print("No collection needs compaction.")
+        return
+    client = chromadb.PersistentClient(path=path)
+    for s in to_rebuild:
+        name, temp_name = s["name"], f"{s['name'][:51]}-compacting"
+        collection = client.get_collection(name, embedding_function=None)
+        metadata = collection.metadata
+        data = collection.get(include=["embeddings", "documents", "metadatas"])
+        timestamps = created_at(path, s["id"])
+        print(f"Rebuilding {name} ({len(data['ids'])} rows)")
+        try:
+            client.delete_collection(temp_name)  # left over from an interrupted run
+        except Exception:
+            pass
+        rebuilt = client.create_collection(temp_name, metadata=metadata, embedding_function=None)
+        try:
+            for start in range(0, len(data["ids"]), ADD_BATCH_SIZE):
+                end = start + ADD_BATCH_SIZE
+                rebuilt.add(
+                    ids=data["ids"][start:end],
+                    embeddings=data["embeddings"][start:end],
+                    documents=data["documents"][start:end],
+                    metadatas=data["metadatas"][start:end],
+                )
+        except Exception:
+            client.delete_collection(temp_name)
+            print(f"Rebuilding {name} failed, the collection is unchanged")
+            raise
+        # Swap: the complete copy takes over the original name
+        client.delete_collection(name)
+        rebuilt.modify(name=name)
+        restore_created_at(path, str(rebuilt.id), timestamps)
+    # The old segment directories are now orphans
+    for orphan in orphaned_segment_dirs(path):
+        shutil.rmtree(orphan)
+
+
+# STEP 4: vacuum
+
+def vacuum(path: str) -> None:
+    before = os.path.getsize(sqlite_path(path))
+    conn = sqlite3.connect(sqlite_path(path))
+    try:
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    after = os.path.getsize(sqlite_path(path))
+    print(f"VACUUM chroma.sqlite3: {human(before)} -> {human(after)}")
+
+
+# STEP 5: benchmark
+
+def fixed_query_set(path: str, queries_per_collection: int = 20) -> dict:
+    """Pick a deterministic set of stored vectors per collection to use as queries."""
+    client = chromadb.PersistentClient(path=path)
+    query_set = {}
+    for collection in client.list_collections():
+        collection = client.get_collection(collection.name, embedding_function=None)
+        data = collection.get(limit=queries_per_collection, include=["embeddings"])
+        if len(data["ids"]):
+            query_set[collection.name] = [list(vector) for vector in data["embeddings"]]
+    return query_set
+
+
+def bench(path: str, query_set: dict, n_results: int = 5, repeats: int = 5) -> dict:
+    """
+    Time every query of the query set and return {collection: (p50_ms, mean_ms)}.
+    The queries run against a temporary copy of the store: the first query of a collection makes
+    Chroma persist its HNSW segment at full preallocated size (about 6 MB for 1000 x 1536 floats),
+    which measuring should not do to the real store.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        copy = os.path.join(tmp, "store")
+        shutil.copytree(path, copy)
+        return _bench(copy, query_set, n_results, repeats)
+
+
+def _bench(path: str, query_set: dict, n_results: int, repeats: int) -> dict:
+    client = chromadb.PersistentClient(path=path)
+    timings = {}
+    for name, vectors in query_set.items():
+        try:
+            collection = client.get_collection(name, embedding_function=None)
+        except Exception:
+            continue  # collection was pruned
+        k = max(1, min(n_results, collection.count()))
+        samples = []
+        for _ in range(repeats):
+            for vector in vectors:
+                start = time.perf_counter()
+                collection.query(query_embeddings=[vector], n_results=k)
+                samples.append((time.perf_counter() - start) * 1000)
+        timings[name] = (statistics.median(samples), statistics.fmean(samples))
+    for name, (p50, mean) in timings.items():
+        print(f"  {name[:40]:40} p50 {p50:7.2f} ms   mean {mean:7.2f} ms")
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the local Chroma store")
+    parser.add_argument("command", choices=["report", "prune", "compact", "vacuum", "bench", "all"])
+    parser.add_argument("--path", default="db", help="Chroma persist directory (default: db)")
+    parser.add_argument("--stale-days", type=float, default=None,
+                        help="Treat collections without writes for this many days as stale")
+    parser.add_argument("--dry-run", action="store_true", help="Only show what prune would remove")
+    parser.add_argument("--min-dead-ratio", type=float, default=0.1,
+                        help="Compact collections whose HNSW segment has at least this share of dead elements")
+    parser.add_argument("--force", action="store_true", help="Compact every collection")
+    args = parser.parse_args()
+
+    if not os.path.exists(sqlite_path(args.path)):
+        parser.error(f"No chroma.sqlite3 found in {args.path}")
+    if args.command in ("prune", "all") and args.stale_days is None:
+        parser.error(f"{args.command} deletes collections and needs --stale-days")
+
+    if args.command == "report":
+        report(args.path)
+    elif args.command == "prune":
+        prune(args.path, args.stale_days, args.dry_run)
+    elif args.command == "compact":
+        compact(args.path, args.min_dead_ratio, args.force)
+    elif args.command == "vacuum":
+        vacuum(args.path)
+    elif args.command == "bench":
+        bench(args.path, fixed_query_set(args.path))
+    else:
+        size_before = dir_size(args.path)
+        report(args.path)
+        query_set = fixed_query_set(args.path)
+        print("Query latency before maintenance:")
+        before = bench(args.path, query_set)
+        prune(args.path, args.stale_days, args.dry_run)
+        if not args.dry_run:
+            compact(args.path, args.min_dead_ratio, args.force)
+            vacuum(args.path)
+        print("Query latency after maintenance:")
+        after = bench(args.path, query_set)
+        for name in after:
+            if name in before:
+                print(f"  {name[:40]:40} p50 {before[name][0]:.2f} -> {after[name][0]:.2f} ms")
+        report(args.path)
+        print(f"Store size: {human(size_before)} -> {human(dir_size(args.path))}")
+
+
+if __name__ == "__main__":
+    main()
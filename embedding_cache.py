@@ -0,0 +1,314 @@
+# Batched, cached embedder for CrewAI memory (scripts 5, 7 and 8)
+#
+# With `Crew(memory=True, embedder={"provider": "google", ...})` every memory save and
+# every memory search embeds its text with a separate remote call, often for text that
+# was already embedded in an earlier step or an earlier run.
+#
+# CachedBatchEmbedder sits in front of the Google embedding API:
+# 1. Local-first   - every text is looked up in a SQLite cache keyed by sha256(model + task_type + text).
+#    Cached texts need no network at all.
+# 2. Batching      - cache misses of concurrent callers are queued; a background worker sends them to
+#    Gemini in ONE request. It waits up to `max_wait_s` for more texts only while other callers
+#    are still embedding; a lone caller is sent at once.
+# 3. Write-behind  - with batch_memory_writes(crew), memory saves return immediately: the texts are
+#    queued and embedded + stored together once `max_batch_size` are pending, `write_delay_s` has
+#    elapsed, a task ends, or the same memory is searched (so searches see every earlier save).
+# 4. Query vectors - memory searches embed with the RETRIEVAL_QUERY task type (query_backend),
+#    saved texts with RETRIEVAL_DOCUMENT.
+# 5. Write-back    - the returned vectors are stored, so the same text is never embedded twice.
+#
+# Usage (in a crew):
+#   from embedding_cache import batch_memory_writes, crew_embedder_config
+#   crew = Crew(..., memory=True, embedder=crew_embedder_config(model="text-embedding-001"))
+#   batch_memory_writes(crew)
+
+import atexit
+import contextlib
+import hashlib
+import itertools
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from typing import Any, Dict, Iterator, List, Optional
+
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+
+from local_store import LocalKVStore, cache_path
+from metrics import record_cache
+
+
+class GoogleEmbeddingBackend:
+    """
+    Remote backend that embeds a whole batch of texts with a single Google API call.
+    Args:
+        model (str): Embedding model name, e.g. "text-embedding-001"
+        api_key (str): Google API key (defaults to GOOGLE_API_KEY)
+        task_type (str): Gemini embedding task type (RETRIEVAL_DOCUMENT, RETRIEVAL_QUERY, ...)
+    """
+
+    def __init__(self, model: str, api_key: Optional[str] = None, task_type: str = "RETRIEVAL_DOCUMENT"):
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key or os.getenv("GOOGLE_API_KEY"))
+        self._genai = genai
+        self.model = model if "/" in model else f"models/{model}"
+        self.task_type = task_type
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        # embed_content accepts a list of texts and returns one vector per text
+        result = self._genai.embed_content(model=self.model, content=texts, task_type=self.task_type)
+        return result["embedding"]
+
+
+class CachedBatchEmbedder(EmbeddingFunction[Documents]):
+    """
+    Chroma-compatible embedding function with a local vector cache and request batching.
+    Args:
+        backend: Object with an `embed(texts) -> vectors` method (e.g. GoogleEmbeddingBackend)
+        query_backend: Backend for search queries (default: backend)
+        cache_file (str): SQLite file for cached vectors
+        max_batch_size (int): Send a request as soon as this many texts are pending
+        max_wait_s (float): Longest wait for the texts of other concurrent callers
+        write_delay_s (float): Longest time a queued memory write waits for its batch
+    """
+
+    def __init__(
+        self,
+        backend,
+        query_backend=None,
+        cache_file: Optional[str] = None,
+        max_batch_size: int = 64,
+        max_wait_s: float = 0.05,
+        write_delay_s: float = 1.0,
+    ):
+        self.backend = backend
+        self.query_backend = query_backend or backend
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_s
+        self.write_delay_s = write_delay_s
+        self._cache = LocalKVStore(cache_file or cache_path("embeddings.sqlite3"), table="embeddings")
+        self._pending: "queue.Queue[tuple]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._callers = itertools.count()
+        self._active = 0  # callers waiting for embeddings
+        self._querying = threading.local()
+        self._writes: List[tuple] = []  # (storage, text, metadata) queued by memory saves
+        self._writes_changed = threading.Condition()
+        self._write_lock = threading.Lock()
+        self.stats = {"cache_hits": 0, "cache_misses": 0, "remote_calls": 0, "texts_embedded": 0, "write_batches": 0}
+        self._worker = threading.Thread(target=self._batch_loop, name="embedding-batcher", daemon=True)
+        self._worker.start()
+        self._writer = threading.Thread(target=self._write_loop, name="memory-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.flush_writes)
+
+    def _key(self, text: str, backend) -> str:
+        model = getattr(backend, "model", "")
+        task_type = getattr(backend, "task_type", "")
+        return hashlib.sha256(f"{model}\x00{task_type}\x00{text}".encode("utf-8")).hexdigest()
+
+    def __call__(self, input: Documents) -> Embeddings:
+        backend = self.query_backend if getattr(self._querying, "active", False) else self.backend
+        keys = [self._key(text, backend) for text in input]
+        # STEP 1: local-first lookup
+        cached = self._cache.get_many(keys)
+
+        # STEP 2: queue the misses (one future per distinct text) for the batch worker
+        caller = next(self._callers)
+        misses = {key: text for key, text in zip(keys, input) if key not in cached}
+        with self._stats_lock:
+            self.stats["cache_hits"] += len(keys) - len(misses)
+            self.stats["cache_misses"] += len(misses)
+            self._active += bool(misses)
+        record_cache("embeddings", True, len(keys) - len(misses))
+        record_cache("embeddings", False, len(misses))
+        if not misses:
+            return [cached[key] for key in keys]
+
+        # STEP 3: wait for the batched results
+        try:
+            futures = {key: Future() for key in misses}
+            for key, future in futures.items():
+                self._pending.put((key, misses[key], future, backend, caller))
+            for key, future in futures.items():
+                cached[key] = future.result()
+        finally:
+            with self._stats_lock:
+                self._active -= 1
+        return [cached[key] for key in keys]
+
+    def _waiting_callers(self) -> int:
+        with self._stats_lock:
+            return self._active
+
+    def _batch_loop(self) -> None:
+        """Collect pending texts into batches bounded by size and time window."""
+        while True:
+            batch = [self._pending.get()]
+            deadline = time.monotonic() + self.max_wait_s
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self._pending.get_nowait())
+                    continue
+                except queue.Empty:
+                    pass
+                # Wait only for callers that are embedding but not in this batch yet
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or len({item[4] for item in batch}) >= self._waiting_callers():
+                    break
+                try:
+                    batch.append(self._pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            for backend in {id(item[3]): item[3] for item in batch}.values():
+                self._flush([item for item in batch if item[3] is backend], backend)
+
+    def _flush(self, batch: List[tuple], backend) -> None:
+        # Different callers may have queued the same text before it reached the cache
+        texts_by_key: Dict[str, str] = {}
+        for key, text, *_ in batch:
+            texts_by_key.setdefault(key, text)
+        try:
+            # Another batch may have stored some of these keys in the meantime
+            vectors = self._cache.get_many(texts_by_key)
+            missing = [key for key in texts_by_key if key not in vectors]
+            if missing:
+                embedded = backend.embed([texts_by_key[key] for key in missing])
+                fresh = dict(zip(missing, [list(map(float, vector)) for vector in embedded]))
+                self._cache.set_many(fresh.items())
+                vectors.update(fresh)
+                with self._stats_lock:
+                    self.stats["remote_calls"] += 1
+                    self.stats["texts_embedded"] += len(missing)
+        except Exception as e:
+            for _, _, future, *_ in batch:
+                future.set_exception(e)
+            return
+        for key, _, future, *_ in batch:
+            future.set_result(vectors[key])
+
+    # Write-behind memory saves
+
+    def queue_write(self, storage, text: str, metadata: Optional[Dict[str, Any]]) -> None:
+        """Queue a memory save; it is embedded and stored with the next write batch."""
+        with self._writes_changed:
+            # chroma rejects empty metadata dicts (one would fail the whole batch), None is accepted
+            self._writes.append((storage, text, metadata or None, time.monotonic()))
+            self._writes_changed.notify()
+
+    def flush_writes(self) -> int:
+        """Embed and store every queued memory write now. Returns the number of entries written."""
+        with self._write_lock:
+            with self._writes_changed:
+                writes, self._writes = self._writes, []
+            if not writes:
+                return 0
+            try:
+                vectors = self([text for _, text, _, _ in writes])
+            except Exception as e:
+                print(f"--- Memory write batch of {len(writes)} entries failed: {e} ---")
+                return 0
+            by_storage: Dict[int, list] = {}
+            for (storage, text, metadata, _), vector in zip(writes, vectors):
+                by_storage.setdefault(id(storage), []).append((storage, text, metadata, vector))
+            for entries in by_storage.values():
+                storage = entries[0][0]
+                try:
+                    storage.collection.add(
+                        ids=[str(uuid.uuid4()) for _ in entries],
+                        documents=[text for _, text, _, _ in entries],
+                        metadatas=[metadata for _, _, metadata, _ in entries],
+                        embeddings=[vector for _, _, _, vector in entries],
+                    )
+                except Exception as e:
+                    print(f"--- Memory write to {getattr(storage, 'type', 'memory')} failed: {e} ---")
+            with self._stats_lock:
+                self.stats["write_batches"] += 1
+            return len(writes)
+
+    def _write_loop(self) -> None:
+        """Flush queued writes when the batch is full or its oldest write has waited write_delay_s."""
+        while True:
+            with self._writes_changed:
+                while not self._writes:
+                    self._writes_changed.wait()
+                wait = self._writes[0][3] + self.write_delay_s - time.monotonic()
+                if len(self._writes) < self.max_batch_size and wait > 0:
+                    self._writes_changed.wait(wait)
+                    continue
+            self.flush_writes()
+
+    @contextlib.contextmanager
+    def searching(self) -> Iterator[None]:
+        """Embeddings requested inside the block are search queries (query_backend)."""
+        previous = getattr(self._querying, "active", False)
+        self._querying.active = True
+        try:
+            yield
+        finally:
+            self._querying.active = previous
+
+
+def batch_memory_writes(crew) -> Optional[CachedBatchEmbedder]:
+    """
+    Route the memory saves and searches of a crew through its CachedBatchEmbedder: saves are
+    queued (write-behind), searches flush the queue first and embed as queries, and the queue
+    is flushed at the end of every task.
+    Args:
+        crew: A Crew created with memory=True and embedder=crew_embedder_config(...)
+    Returns:
+        CachedBatchEmbedder, or None if the crew does not use one
+    """
+    embedder = ((getattr(crew, "embedder", None) or {}).get("config") or {}).get("embedder")
+    if not isinstance(embedder, CachedBatchEmbedder):
+        return None
+    for attr in ("_short_term_memory", "_entity_memory"):
+        storage = getattr(getattr(crew, attr, None), "storage", None)
+        if not hasattr(storage, "collection"):
+            continue
+
+        def save(value, metadata, _storage=storage):
+            embedder.queue_write(_storage, value, metadata)
+
+        def search(*args, _search=storage.search, **kwargs):
+            embedder.flush_writes()
+            with embedder.searching():
+                return _search(*args, **kwargs)
+
+        storage.save, storage.search = save, search
+
+    task_callback = crew.task_callback
+
+    def flush_on_task_end(output):
+        embedder.flush_writes()
+        if task_callback is not None:
+            return task_callback(output)
+
+    crew.task_callback = flush_on_task_end
+    return embedder
+
+
+def crew_embedder_config(
+    model: str = "text-embedding-001",
+    api_key: Optional[str] = None,
+    max_batch_size: int = 64,
+    max_wait_s: float = 0.05,
+) -> dict:
+    """
+    Build a CrewAI `embedder=` config that uses the cached, batched Google embedder.
+    Args:
+        model (str): Google embedding model name
+        api_key (str): Google API key (defaults to GOOGLE_API_KEY)
+    Returns:
+        dict: Config for the "custom" embedder provider
+    """
+    embedder = CachedBatchEmbedder(
+        GoogleEmbeddingBackend(model=model, api_key=api_key),
+        query_backend=GoogleEmbeddingBackend(model=model, api_key=api_key, task_type="RETRIEVAL_QUERY"),
+        max_batch_size=max_batch_size,
+        max_wait_s=max_wait_s,
+    )
+    return {"provider": "custom", "config": {"embedder": embedder}}
@@ -0,0 +1,225 @@
+# Deterministic fast path in front of agent.run (script 2)
+#
+# "What is 3 + 4?" costs a Gemini planning call, the add_two_numbers tool call and a second Gemini
+# call to phrase the answer. FastPath.run() replaces `agent.run(user_msg=..., ctx=ctx)` and first
+# tries a cheap local intent matcher:
+# 1. Arithmetic    - the whole message is an arithmetic question ("what is 12.5 + 30?", "sum of 3
+#                    and 4", "3 plus 4 times 2"): the sum of two numbers goes through the agent's own
+#                    add tool, other expressions through a safe evaluator (numbers, + - * / and
+#                    parentheses only). Dates and similar ("2025-10-19", "10/19/2025") are not
+#                    arithmetic: numbers chained by the same operator without spaces go to the agent
+# 2. Cached search - the same self-contained question (normalized like the search cache) was
+#                    answered before by a turn that only used web search, and every search of that
+#                    turn is still fresh in the search tool's cache (tool_registry.py): the earlier
+#                    answer is reused, so it is never older than the search results it came from
+# Matched turns are answered locally and recorded in the Context memory (user message and
+# answer), so the conversation stays consistent for later LLM turns and saved state. Everything
+# else - and every message that refers to earlier turns ("and tomorrow?") - goes to the agent.
+# report() shows the hit rate and the latency saved (the mean LLM turn, or the original turn for
+# reused answers); the turns are also counted in metrics.py. FAST_PATH=0 disables matching.
+#
+# Usage:
+#   fast_path = FastPath(agent, add=add_two_numbers, search=get_tool("tavily_search"))
+#   response = await fast_path.run(user_msg, ctx=ctx)
+#   print(fast_path.report())
+
+import ast
+import inspect
+import operator
+import os
+import re
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from metrics import registry
+
+TURNS = registry.counter("fast_path_turns_total", "Turns by route (arithmetic / cached_search / agent)", ["route"])
+TURN_LATENCY = registry.histogram("fast_path_turn_seconds", "Turn latency by route", ["route"])
+
+LEAD = re.compile(
+    r"^(?:please\s+)?(?:what(?:'s|\s+is)|whats|calculate|compute|how\s+much\s+is|tell\s+me|"
+    r"(?P<sum>(?:what(?:'s|\s+is)\s+)?(?:the\s+)?sum\s+of|add))\s+"
+)
+WORD_OPERATORS = [
+    (r"\bmultiplied\s+by\b", "*"), (r"\bdivided\s+by\b", "/"), (r"\bplus\b", "+"), (r"\bminus\b", "-"),
+    (r"\btimes\b", "*"), (r"\bover\b", "/"),
+]
+EXPRESSION = re.compile(r"^[\d\s.+\-*/()]+$")
+NUMBER = r"\s*(-?\d+(?:\.\d+)?)\s*"
+TWO_NUMBER_SUM = re.compile(rf"^{NUMBER}\+{NUMBER}$")
+# Dates and phone numbers: "2025-10-19", "10/19/2025", "555-123-4567"
+DATE_LIKE = re.compile(r"(?<![\d.])\d+([-/])\d+\1\d+(?![\d.])")
+OPERATORS = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv}
+# Messages that refer to earlier turns are never answered from earlier answers
+CONTEXT_DEPENDENT = re.compile(r"^(?:and|also|so|then|what\s+about|how\s+about)\b|\b(?:it|that|this|there|they|them|those|these|same)\b")
+
+
+def _evaluate(node: ast.AST) -> float:
+    if isinstance(node, ast.Expression):
+        return _evaluate(node.body)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        return node.value
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        value = _evaluate(node.operand)
+        return -value if isinstance(node.op, ast.USub) else value
+    if isinstance(node, ast.BinOp) and type(node.op) in OPERATORS:
+        return OPERATORS[type(node.op)](_evaluate(node.left), _evaluate(node.right))
+    raise ValueError("not arithmetic")
+
+
+def parse_arithmetic(message: str) -> Optional[str]:
+    """The arithmetic expression a message asks for, or None if the message is anything else."""
+    text = message.strip().lower().rstrip("?.! ")
+    lead = LEAD.match(text)
+    if lead:
+        text = text[lead.end():]
+        if lead.group("sum"):
+            text = re.sub(r"\band\b", "+", text)
+    for pattern, symbol in WORD_OPERATORS:
+        text = re.sub(pattern, symbol, text)
+    text = text.strip()
+    if not EXPRESSION.match(text) or not re.search(r"\d\s*[+\-*/]\s*[\d(-]", text) or DATE_LIKE.search(text):
+        return None
+    return re.sub(r"\s+", " ", text)
+
+
+def _format_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else f"{value:.10g}"
+
+
+def _normalize(message: str) -> str:
+    from cached_search import normalize_query
+
+    return normalize_query(message)
+
+
+class FastPath:
+    """
+    Pre-dispatch stage for a FunctionAgent: answers simple deterministic intents locally.
+    Args:
+        agent: The agent that gets every other message
+        add: The agent's add tool (async or sync function of a and b), used for sums of two numbers
+        search: The SharedTool behind the agent's web search (tool_registry.py), for cached answers
+        search_tool_name (str): Name of the search tool in the agent
+    """
+
+    def __init__(self, agent, add: Optional[Callable] = None, search=None, search_tool_name: str = "search_web"):
+        self.agent = agent
+        self.add = add
+        self.search = search
+        self.search_tool_name = search_tool_name
+        self._answers: Dict[str, dict] = {}
+        self._llm_turns: List[float] = []
+        self._stats: Dict[str, float] = {"arithmetic": 0, "cached_search": 0, "agent": 0, "latency_saved_s": 0.0}
+
+    # Matching
+
+    def _enabled(self) -> bool:
+        return os.getenv("FAST_PATH", "1").lower() not in ("0", "false", "no")
+
+    async def _arithmetic(self, user_msg: str) -> Optional[str]:
+        expression = parse_arithmetic(user_msg)
+        if expression is None:
+            return None
+        two_numbers = TWO_NUMBER_SUM.match(expression)
+        try:
+            if two_numbers and self.add is not None:
+                result = self.add(float(two_numbers.group(1)), float(two_numbers.group(2)))
+                result = await result if inspect.isawaitable(result) else result
+            else:
+                result = _evaluate(ast.parse(expression, mode="eval"))
+        except (ValueError, SyntaxError, ZeroDivisionError, TypeError):
+            return None
+        return f"{expression} = {_format_number(result)}"
+
+    def _cacheable(self, user_msg: str) -> bool:
+        return self.search is not None and not CONTEXT_DEPENDENT.search(user_msg.strip().lower())
+
+    def _cached_answer(self, user_msg: str) -> Optional[dict]:
+        if not self._cacheable(user_msg):
+            return None
+        entry = self._answers.get(_normalize(user_msg))
+        if entry is None or not all(self.search.peek(query=query) for query in entry["queries"]):
+            return None
+        return entry
+
+    # Turns
+
+    async def run(self, user_msg: str, ctx=None) -> Any:
+        """Answer locally when possible, otherwise run the agent (same arguments as agent.run)."""
+        start = time.perf_counter()
+        if self._enabled():
+            answer = await self._arithmetic(user_msg)
+            if answer is not None:
+                await self._record(ctx, user_msg, answer)
+                return self._answered("arithmetic", answer, start, self._mean_llm_turn())
+            entry = self._cached_answer(user_msg)
+            if entry is not None:
+                await self._record(ctx, user_msg, entry["answer"])
+                return self._answered("cached_search", entry["answer"], start, entry["latency_s"])
+        return await self._run_agent(user_msg, ctx, start)
+
+    async def _run_agent(self, user_msg: str, ctx, start: float) -> Any:
+        from llama_index.core.agent.workflow import ToolCallResult
+
+        handler = self.agent.run(user_msg=user_msg, ctx=ctx)
+        tool_calls = []
+        async for event in handler.stream_events():
+            if isinstance(event, ToolCallResult):
+                tool_calls.append(event)
+        response = await handler
+        elapsed = time.perf_counter() - start
+        self._llm_turns = (self._llm_turns + [elapsed])[-50:]
+        self._stats["agent"] += 1
+        TURNS.inc(route="agent")
+        TURN_LATENCY.observe(elapsed, route="agent")
+        # A turn that only searched can be replayed while its search results are cached
+        if (tool_calls and self._cacheable(user_msg)
+                and all(call.tool_name == self.search_tool_name and not call.tool_output.is_error for call in tool_calls)):
+            self._answers[_normalize(user_msg)] = {
+                "answer": str(response),
+                "queries": [call.tool_kwargs.get("query", "") for call in tool_calls],
+                "latency_s": elapsed,
+            }
+        return response
+
+    async def _record(self, ctx, user_msg: str, answer: str) -> None:
+        """Add the locally answered turn to the Context memory, as the agent would have."""
+        if ctx is None:
+            return
+        from llama_index.core.llms import ChatMessage
+        from llama_index.core.memory import ChatMemoryBuffer
+
+        memory = await ctx.store.get("memory", default=None)
+        if memory is None:
+            memory = ChatMemoryBuffer.from_defaults(llm=self.agent.llm)
+            await ctx.store.set("memory", memory)
+        await memory.aput_messages([ChatMessage(role="user", content=user_msg), ChatMessage(role="assistant", content=answer)])
+
+    def _answered(self, route: str, answer: str, start: float, saved_s: float) -> str:
+        elapsed = time.perf_counter() - start
+        self._stats[route] += 1
+        self._stats["latency_saved_s"] += max(0.0, saved_s - elapsed)
+        TURNS.inc(route=route)
+        TURN_LATENCY.observe(elapsed, route=route)
+        return answer
+
+    def _mean_llm_turn(self) -> float:
+        return sum(self._llm_turns) / len(self._llm_turns) if self._llm_turns else 0.0
+
+    # Reporting
+
+    def stats(self) -> Dict[str, float]:
+        stats = dict(self._stats)
+        local = stats["arithmetic"] + stats["cached_search"]
+        total = local + stats["agent"]
+        stats["hit_rate"] = local / total if total else 0.0
+        return stats
+
+    def report(self) -> str:
+        s = self.stats()
+        local = s["arithmetic"] + s["cached_search"]
+        return (
+            f"Fast path: {local:.0f}/{local + s['agent']:.0f} turns answered locally ({s['hit_rate']:.0%}; "
+            f"{s['arithmetic']:.0f} arithmetic, {s['cached_search']:.0f} cached search), ~{s['latency_saved_s']:.1f}s latency saved"
+        )
@@ -0,0 +1,280 @@
+# Shared LLM clients for the scripts (LlamaIndex GoogleGenAI and crewai.LLM)
+#
+# Every script built its own GoogleGenAI(...) / LLM(...) with the same GenerateContentConfig,
+# script 4 built two, and no two clients shared a connection:
+#   - each GoogleGenAI creates its own google.genai.Client (own httpx pools) and fetches the
+#     model metadata on construction
+#   - google-genai sends async requests (agent.run) through aiohttp with a new session per
+#     request, so every LLM call of an agent paid DNS + TCP + TLS again
+#
+# This module returns process-wide clients instead:
+# 1. Cached clients   - one client per (framework, model, temperature, generation config, ...);
+#                       asking again for the same configuration returns the same object
+# 2. One socket pool  - all Gemini clients send through one keep-alive httpx transport
+#                       (LLM_MAX_CONNECTIONS, idle connections kept LLM_KEEPALIVE_S seconds).
+#                       Async requests go through the same pool (PooledAsyncTransport), so
+#                       sockets are reused across agents, clients and event loops.
+#                       crewai.LLM gets a litellm HTTPHandler on top of the same pool.
+#                       Generate requests pass the process-wide Gemini rate limiter (rate_limiter.py)
+#                       and the context cache for stable system prompts / tools (context_cache.py);
+#                       tool outputs of restored agent state are expanded on the way (state_store.py).
+# 3. Warmup           - with LLM_WARMUP=1 (or warm=True) the first client of each model fetches
+#                       the model metadata (no tokens), so the first real request finds an open,
+#                       TLS-established connection; warmups are counted per model and status
+#                       (llm_warmups_total in metrics.py)
+#
+# Usage:
+#   from llm_factory import google_genai_llm, crewai_llm
+#   llm = google_genai_llm(model="gemini-2.5-flash", temperature=0.5)   # LlamaIndex
+#   llm = crewai_llm(model="gemini-2.5-flash", temperature=0.0)         # CrewAI
+
+import asyncio
+import os
+import threading
+from typing import Any, Dict, Optional
+
+import httpx
+from google.genai import types
+
+import context_cache
+import rate_limiter
+import state_store
+from call_policy import cap_timeouts
+from metrics import record_cache, registry
+
+# Thinking disabled: the default generation config of the scripts
+NO_THINKING = types.GenerateContentConfig(thinking_config=types.ThinkingConfig(thinking_budget=0))
+
+WARMUPS = registry.counter("llm_warmups_total", "Connection warmups (model metadata fetches)", ["model", "status"])
+
+_clients: Dict[tuple, Any] = {}
+_warmed = set()
+_lock = threading.RLock()
+_transport: Optional[httpx.HTTPTransport] = None
+_genai_client = None
+
+
+def _truthy(value: Optional[str]) -> bool:
+    return (value or "").lower() in ("1", "true", "yes")
+
+
+def http_transport() -> httpx.HTTPTransport:
+    """The process-wide keep-alive transport (thread-safe connection pool)."""
+    global _transport
+    with _lock:
+        if _transport is None:
+            max_connections = int(os.getenv("LLM_MAX_CONNECTIONS", 20))
+            _transport = httpx.HTTPTransport(
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_connections,
+                    keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_S", 90)),
+                ),
+                retries=1,  # connection errors only (e.g. a pooled socket the server closed)
+            )
+        return _transport
+
+
+class _ThreadedByteStream(httpx.AsyncByteStream):
+    """Async view of a sync response stream; each chunk is read on a worker thread."""
+
+    def __init__(self, stream: httpx.SyncByteStream):
+        self._stream = stream
+
+    async def __aiter__(self):
+        chunks = iter(self._stream)
+        while True:
+            chunk = await asyncio.to_thread(next, chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+
+    async def aclose(self) -> None:
+        await asyncio.to_thread(self._stream.close)
+
+
+class PooledAsyncTransport(httpx.AsyncBaseTransport):
+    """
+    Async transport that sends through the shared sync connection pool.
+    An httpx async pool belongs to the event loop it was created in; the scripts (and the
+    benchmarks) run several loops, so async requests are handed to the thread-safe sync pool
+    instead and every client and loop shares the same sockets.
+    """
+
+    def __init__(self, transport: Optional[httpx.HTTPTransport] = None):
+        self._transport = transport or http_transport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        sync_request = httpx.Request(
+            request.method, request.url, headers=request.headers, content=body,
+            extensions=cap_timeouts(request.extensions),  # no longer than the turn budget allows
+        )
+        # Cancelled (e.g. the losing hedged request): the thread still finishes the request, then
+        # closes the response so its connection goes back to the pool, even after the loop is gone
+        lock, state = threading.Lock(), {"abandoned": False, "response": None}
+
+        def send() -> httpx.Response:
+            response = self._transport.handle_request(sync_request)
+            with lock:
+                state["response"] = response
+                abandoned = state["abandoned"]
+            if abandoned:
+                response.close()
+            return response
+
+        try:
+            response = await asyncio.shield(asyncio.ensure_future(asyncio.to_thread(send)))
+        except asyncio.CancelledError:
+            with lock:
+                state["abandoned"] = True
+                response = state["response"]
+            if response is not None:  # finished just as the caller gave up
+                response.close()
+            raise
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_ThreadedByteStream(response.stream),
+            extensions=response.extensions,
+        )
+
+
+def client_transport() -> httpx.BaseTransport:
+    """Sync transport for the LLM clients: the shared pool behind the Gemini rate limiter and context cache."""
+    transport = http_transport()
+    if rate_limiter.enabled():
+        transport = rate_limiter.RateLimitedTransport(transport)
+    if context_cache.enabled():
+        transport = context_cache.ContextCachingTransport(transport)
+    return state_store.BlobResolvingTransport(transport)
+
+
+def async_client_transport() -> httpx.AsyncBaseTransport:
+    """Async transport for the LLM clients: the shared pool behind the Gemini rate limiter and context cache."""
+    transport = PooledAsyncTransport()
+    if rate_limiter.enabled():
+        transport = rate_limiter.AsyncRateLimitedTransport(transport)
+    if context_cache.enabled():
+        transport = context_cache.AsyncContextCachingTransport(transport)
+    return state_store.AsyncBlobResolvingTransport(transport)
+
+
+def http_options(**kwargs) -> types.HttpOptions:
+    """google-genai HttpOptions that use the shared pool for sync and async requests."""
+    return types.HttpOptions(
+        client_args={"transport": client_transport()},
+        async_client_args={"transport": async_client_transport()},
+        **kwargs,
+    )
+
+
+def genai_client():
+    """A shared google.genai.Client on the shared pool (GOOGLE_API_KEY)."""
+    global _genai_client
+    from google import genai
+
+    with _lock:
+        if _genai_client is None:
+            _genai_client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"), http_options=http_options())
+        return _genai_client
+
+
+def warmup(model: str) -> None:
+    """Open the pooled connection by fetching the model's metadata (no tokens are used)."""
+    model = model.split("/", 1)[-1]  # litellm provider prefix, e.g. gemini/gemini-2.5-flash
+    if model in _warmed:
+        return
+    _warmed.add(model)
+    try:
+        genai_client().models.get(model=model)
+    except Exception:  # warmup is best effort, the real request reports real errors
+        WARMUPS.inc(model=model, status="error")
+    else:
+        WARMUPS.inc(model=model, status="ok")
+
+
+def _config_key(generation_config: Optional[types.GenerateContentConfig]) -> Optional[str]:
+    if generation_config is None:
+        return None
+    return generation_config.model_dump_json(exclude_none=True)
+
+
+def _cached(key: tuple, build, model: str, warm: Optional[bool]):
+    with _lock:
+        client = _clients.get(key)
+    record_cache("llm_clients", client is not None)
+    if client is not None:
+        return client
+    if warm if warm is not None else _truthy(os.getenv("LLM_WARMUP")):
+        warmup(model)
+    client = build()
+    with _lock:
+        return _clients.setdefault(key, client)
+
+
+def google_genai_llm(
+    model: str = "gemini-2.5-flash",
+    temperature: Optional[float] = None,
+    generation_config: Optional[types.GenerateContentConfig] = NO_THINKING,
+    warm: Optional[bool] = None,
+    **kwargs,
+):
+    """
+    Shared LlamaIndex GoogleGenAI client for a model and configuration.
+    Args:
+        model (str): Gemini model name
+        temperature (float): Sampling temperature (None = the library default)
+        generation_config: GenerateContentConfig (default: thinking disabled)
+        warm (bool): Warm the connection up first (default: LLM_WARMUP)
+        **kwargs: Any other GoogleGenAI argument (part of the cache key)
+    Returns:
+        GoogleGenAI
+    """
+    # Looked up on each call, so a patched class (benchmarks/standins.py) is picked up
+    from llama_index.llms import google_genai
+
+    cls = google_genai.GoogleGenAI
+    key = ("llama_index", cls, model, temperature, _config_key(generation_config), repr(sorted(kwargs.items())))
+
+    def build():
+        options = dict(kwargs)
+        if temperature is not None:
+            options["temperature"] = temperature
+        if generation_config is not None:
+            options["generation_config"] = generation_config
+        options.setdefault("http_options", http_options())
+        return cls(model=model, **options)
+
+    return _cached(key, build, model, warm)
+
+
+def crewai_llm(
+    model: str = "gemini-2.5-flash",
+    temperature: Optional[float] = None,
+    generation_config: Optional[types.GenerateContentConfig] = NO_THINKING,
+    warm: Optional[bool] = None,
+    **kwargs,
+):
+    """
+    Shared crewai.LLM for a model and configuration (see google_genai_llm for the arguments).
+    Returns:
+        crewai.LLM
+    """
+    import crewai
+    from litellm.llms.custom_httpx.http_handler import HTTPHandler
+
+    cls = crewai.LLM
+    key = ("crewai", cls, model, temperature, _config_key(generation_config), repr(sorted(kwargs.items())))
+
+    def build():
+        options = dict(kwargs)
+        if temperature is not None:
+            options["temperature"] = temperature
+        if generation_config is not None:
+            options["generation_config"] = generation_config
+        # litellm sends through this handler, i.e. through the shared pool
+        options.setdefault("client", HTTPHandler(client=httpx.Client(transport=client_transport())))
+        return cls(model=model, **options)
+
+    return _cached(key, build, model, warm)
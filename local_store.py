@@ -0,0 +1,107 @@
+# Small SQLite key/value store shared by the local caches in this project
+# (embedding vectors, search results, ...).
+#
+# - One SQLite file per cache under CACHE_DIR (default ./.cache, override with AGENT_CACHE_DIR)
+# - Values are stored as JSON text
+# - Optional TTL per entry; expired entries are ignored on read and removed by purge_expired()
+# - Safe to share between threads (one connection guarded by a lock, WAL journal)
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+CACHE_DIR = os.getenv("AGENT_CACHE_DIR", ".cache")
+
+
+def cache_path(filename: str) -> str:
+    """Return the path of a cache file inside CACHE_DIR, creating the directory if needed."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    return os.path.join(CACHE_DIR, filename)
+
+
+class LocalKVStore:
+    """
+    Persistent key/value store backed by a single SQLite table.
+    Args:
+        path (str): SQLite file to use (created if missing)
+        table (str): Table name, so several caches can share one file
+    """
+
+    def __init__(self, path: str, table: str = "kv"):
+        self.path = path
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"""CREATE TABLE IF NOT EXISTS {table} (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL
+            )"""
+        )
+        self._conn.commit()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Return the value stored under key, or default if it is missing or expired."""
+        return self.get_many([key]).get(key, default)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Return {key: value} for every key that is present and not expired."""
+        keys = list(dict.fromkeys(keys))
+        found: Dict[str, Any] = {}
+        now = time.time()
+        # SQLite limits the number of bound parameters, so look keys up in chunks
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, value, expires_at FROM {self.table} WHERE key IN ({placeholders})",
+                    chunk,
+                ).fetchall()
+                for key, value, expires_at in rows:
+                    if expires_at is None or expires_at > now:
+                        found[key] = json.loads(value)
+        return found
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Store value under key; ttl is in seconds (None = never expires)."""
+        self.set_many([(key, value)], ttl=ttl)
+
+    def set_many(self, items: Iterable[Tuple[str, Any]], ttl: Optional[float] = None) -> None:
+        """Store several (key, value) pairs in one transaction."""
+        expires_at = time.time() + ttl if ttl else None
+        rows = [(key, json.dumps(value), expires_at) for key, value in items]
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def purge_expired(self) -> int:
+        """Delete expired entries and return how many were removed."""
+        with self._lock:
+            cursor = self._conn.execute(
+                f"DELETE FROM {self.table} WHERE expires_at IS NOT NULL AND expires_at <= ?",
+                (time.time(),),
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
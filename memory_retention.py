@@ -0,0 +1,376 @@
+# Memory retention policy for CrewAI crews with memory=True (scripts 5, 7 and 8)
+#
+# CrewAI writes short-term, entity and long-term memory on every kickoff and never removes
+# anything, so memory retrieval gets slower and noisier run after run. MemoryRetention adds:
+# 1. Per-store caps             - max entries for short_term / entities / long_term
+# 2. Age + frequency eviction   - entries older than max_age_days are dropped unless they are
+#                                 retrieved often; over the cap, the least useful entries go first
+#                                 (score = access count, ties broken by age)
+# 3. Duplicate merging          - identical memory texts / identical long-term rows are merged
+#                                 into the newest copy (access counts are added up)
+# 4. Background compaction      - start() compacts once, then every `interval_s` seconds in a daemon
+#                                 thread, but never while a crew kickoff is running in the process
+#                                 (CrewAI kickoff events): a kickoff reads and writes the same stores,
+#                                 so it waits for a running compaction and compaction waits for it
+# and tracks retrieval latency and store sizes (metrics() / report()).
+#
+# Usage:
+#   retention = MemoryRetention(crew)
+#   retention.start()
+#   crew.kickoff(...)
+#   print(retention.report())
+
+import contextlib
+import os
+import sqlite3
+import statistics
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+
+from local_store import cache_path
+
+RAG_STORES = {"short_term": "_short_term_memory", "entities": "_entity_memory"}
+
+
+class KickoffGuard:
+    """Keeps compaction and crew kickoffs of one process apart (fed by CrewAI kickoff events)."""
+
+    def __init__(self):
+        self._changed = threading.Condition()
+        self._running: Dict[int, int] = {}  # id(crew) -> kickoffs in progress
+        self._compacting = 0
+        self._listening = False
+
+    def listen(self) -> None:
+        """Register the kickoff event handlers (once per process)."""
+        with self._changed:
+            if self._listening:
+                return
+            self._listening = True
+        from crewai.utilities.events import (
+            CrewKickoffCompletedEvent, CrewKickoffFailedEvent, CrewKickoffStartedEvent, crewai_event_bus,
+        )
+
+        crewai_event_bus.register_handler(CrewKickoffStartedEvent, lambda source, event: self.started(source))
+        crewai_event_bus.register_handler(CrewKickoffCompletedEvent, lambda source, event: self.finished(source))
+        crewai_event_bus.register_handler(CrewKickoffFailedEvent, lambda source, event: self.finished(source))
+
+    def started(self, crew) -> None:
+        with self._changed:
+            self._changed.wait_for(lambda: not self._compacting)
+            self._running[id(crew)] = self._running.get(id(crew), 0) + 1
+
+    def finished(self, crew) -> None:
+        with self._changed:
+            # a kickoff can report both completed and failed (after_kickoff callback errors)
+            if self._running.get(id(crew), 0) <= 1:
+                self._running.pop(id(crew), None)
+            else:
+                self._running[id(crew)] -= 1
+            self._changed.notify_all()
+
+    @contextlib.contextmanager
+    def compacting(self) -> Iterator[None]:
+        """Wait until no kickoff runs, then keep new kickoffs waiting until the block ends."""
+        with self._changed:
+            self._changed.wait_for(lambda: not self._running)
+            self._compacting += 1
+        try:
+            yield
+        finally:
+            with self._changed:
+                self._compacting -= 1
+                self._changed.notify_all()
+
+
+kickoffs = KickoffGuard()
+
+
+@dataclass
+class RetentionPolicy:
+    """Caps and eviction rules per memory store."""
+    max_entries: Dict[str, int] = field(
+        default_factory=lambda: {"short_term": 500, "entities": 1000, "long_term": 2000}
+    )
+    max_age_days: Dict[str, float] = field(
+        default_factory=lambda: {"short_term": 7, "entities": 90, "long_term": 180}
+    )
+    # Entries retrieved at least this often survive the age limit
+    keep_if_accessed: int = 3
+    interval_s: float = 300
+
+
+def _timestamp(value, tz=None) -> float:
+    """Entry time as epoch seconds (chroma created_at, LTM datetime strings or floats)."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        return time.time()
+    if tz is not None and parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=tz)
+    return parsed.timestamp()
+
+
+class MemoryRetention:
+    """
+    Retention policy layer for the memory stores of one crew.
+    Args:
+        crew: A Crew created with memory=True
+        policy (RetentionPolicy): Caps and eviction rules
+        access_db (str): SQLite file that records how often each entry is retrieved
+    """
+
+    def __init__(self, crew, policy: Optional[RetentionPolicy] = None, access_db: Optional[str] = None):
+        self.policy = policy or RetentionPolicy()
+        self.stores = {}
+        for name, attr in RAG_STORES.items():
+            memory = getattr(crew, attr, None)
+            if memory is not None and hasattr(getattr(memory, "storage", None), "collection"):
+                self.stores[name] = memory.storage
+        long_term = getattr(crew, "_long_term_memory", None)
+        self.ltm_storage = getattr(long_term, "storage", None)
+        self.ltm_path = getattr(self.ltm_storage, "db_path", None)
+
+        self._access = sqlite3.connect(access_db or cache_path("memory_access.sqlite3"), check_same_thread=False)
+        self._access.execute(
+            """CREATE TABLE IF NOT EXISTS memory_access (
+                store TEXT NOT NULL, entry_id TEXT NOT NULL,
+                hits INTEGER NOT NULL, last_access REAL NOT NULL,
+                PRIMARY KEY (store, entry_id))"""
+        )
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, List[float]] = {}
+        self._evicted: Dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._instrument()
+
+    # Access tracking and latency metrics
+
+    def _record_access(self, store: str, entry_ids: List[str], latency_s: float) -> None:
+        now = time.time()
+        with self._lock:
+            self._latencies.setdefault(store, []).append(latency_s)
+            self._access.executemany(
+                """INSERT INTO memory_access (store, entry_id, hits, last_access) VALUES (?, ?, 1, ?)
+                   ON CONFLICT(store, entry_id) DO UPDATE SET hits = hits + 1, last_access = excluded.last_access""",
+                [(store, str(entry_id), now) for entry_id in entry_ids],
+            )
+            self._access.commit()
+
+    def _instrument(self) -> None:
+        """Wrap the storage search/load calls to record accesses and retrieval latency."""
+        for name, storage in self.stores.items():
+            search = storage.search
+
+            def timed_search(*args, _name=name, _search=search, **kwargs):
+                start = time.perf_counter()
+                results = _search(*args, **kwargs)
+                self._record_access(_name, [r["id"] for r in results], time.perf_counter() - start)
+                return results
+
+            storage.search = timed_search
+
+        if self.ltm_path:
+            # LongTermMemory looks rows up by task description
+            load = self.ltm_storage.load
+
+            def timed_load(task_description, latest_n):
+                start = time.perf_counter()
+                results = load(task_description, latest_n)
+                self._record_access("long_term", [task_description] if results else [], time.perf_counter() - start)
+                return results
+
+            self.ltm_storage.load = timed_load
+
+    def _access_counts(self, store: str) -> Dict[str, int]:
+        with self._lock:
+            rows = self._access.execute("SELECT entry_id, hits FROM memory_access WHERE store = ?", (store,))
+            return dict(rows.fetchall())
+
+    def _forget_access(self, store: str, entry_ids: List[str]) -> None:
+        with self._lock:
+            self._access.executemany(
+                "DELETE FROM memory_access WHERE store = ? AND entry_id = ?", [(store, i) for i in entry_ids]
+            )
+            self._access.commit()
+
+    # Compaction
+
+    def _rag_created_at(self, storage) -> Dict[str, float]:
+        """Read embedding creation times straight from the store's chroma.sqlite3."""
+        path = os.path.join(storage.path or storage.storage_file_name, "chroma.sqlite3")
+        conn = sqlite3.connect(path)
+        try:
+            rows = conn.execute(
+                """SELECT e.embedding_id, e.created_at FROM embeddings e
+                   JOIN segments s ON s.id = e.segment_id AND s.scope = 'METADATA'
+                   JOIN collections c ON c.id = s.collection WHERE c.name = ?""",
+                (storage.collection.name,),
+            ).fetchall()
+        finally:
+            conn.close()
+        # chroma stores CURRENT_TIMESTAMP, i.e. UTC
+        return {entry_id: _timestamp(created_at, timezone.utc) for entry_id, created_at in rows}
+
+    def _select_evictions(self, store: str, entries: Dict[str, float], hits: Dict[str, int]) -> List[str]:
+        """entries: {id: created_at}. Returns ids to evict by age, then by cap."""
+        now = time.time()
+        max_age_s = self.policy.max_age_days.get(store, float("inf")) * 86400
+        evict = [
+            entry_id for entry_id, created in entries.items()
+            if now - created > max_age_s and hits.get(entry_id, 0) < self.policy.keep_if_accessed
+        ]
+        evicted = set(evict)
+        remaining = [entry_id for entry_id in entries if entry_id not in evicted]
+        cap = self.policy.max_entries.get(store)
+        if cap is not None and len(remaining) > cap:
+            # Least accessed first, oldest first among equals
+            remaining.sort(key=lambda entry_id: (hits.get(entry_id, 0), entries[entry_id]))
+            evict += remaining[: len(remaining) - cap]
+        return evict
+
+    def _compact_rag(self, name: str, storage) -> int:
+        created = self._rag_created_at(storage)
+        data = storage.collection.get(include=["documents"])
+        hits = self._access_counts(name)
+
+        # Merge duplicates: keep the newest copy of each text and carry the access counts over
+        newest: Dict[str, str] = {}
+        duplicates = []
+        for entry_id, document in zip(data["ids"], data["documents"]):
+            keep = newest.get(document)
+            if keep is None:
+                newest[document] = entry_id
+                continue
+            if created.get(entry_id, 0) > created.get(keep, 0):
+                keep, entry_id = entry_id, keep
+                newest[document] = keep
+            hits[keep] = hits.get(keep, 0) + hits.pop(entry_id, 0)
+            duplicates.append(entry_id)
+        if duplicates:
+            with self._lock:
+                self._access.executemany(
+                    """INSERT INTO memory_access (store, entry_id, hits, last_access) VALUES (?, ?, ?, ?)
+                       ON CONFLICT(store, entry_id) DO UPDATE SET hits = excluded.hits""",
+                    [(name, newest[doc], hits.get(newest[doc], 0), time.time()) for doc in newest],
+                )
+                self._access.commit()
+
+        live = {entry_id: created.get(entry_id, time.time()) for entry_id in newest.values()}
+        evict = duplicates + self._select_evictions(name, live, hits)
+        if evict:
+            storage.collection.delete(ids=evict)
+            self._forget_access(name, evict)
+        return len(evict)
+
+    def _compact_long_term(self) -> int:
+        conn = sqlite3.connect(self.ltm_path)
+        try:
+            rows = conn.execute(
+                "SELECT id, task_description, metadata, datetime FROM long_term_memories"
+            ).fetchall()
+            # Merge duplicates: same task and same stored metadata -> keep the newest row
+            newest: Dict[tuple, tuple] = {}
+            evict = []
+            for row_id, task, metadata, created in rows:
+                key = (task, metadata)
+                if key in newest and _timestamp(newest[key][1]) >= _timestamp(created):
+                    evict.append(row_id)
+                    continue
+                if key in newest:
+                    evict.append(newest[key][0])
+                newest[key] = (row_id, created)
+
+            # Access is tracked per task description, so every row of a task shares its count
+            task_hits = self._access_counts("long_term")
+            entries = {str(row_id): _timestamp(created) for row_id, created in newest.values()}
+            row_task = {str(row_id): task for (task, _), (row_id, _) in newest.items()}
+            hits = {row_id: task_hits.get(task, 0) for row_id, task in row_task.items()}
+            evict += [int(row_id) for row_id in self._select_evictions("long_term", entries, hits)]
+            if evict:
+                conn.executemany("DELETE FROM long_term_memories WHERE id = ?", [(i,) for i in evict])
+                conn.commit()
+        finally:
+            conn.close()
+        return len(evict)
+
+    def compact(self) -> Dict[str, int]:
+        """
+        Merge duplicates and evict entries in every store. Waits for running kickoffs, and new
+        kickoffs wait until it is done. Returns evicted counts per store.
+        """
+        evicted = {}
+        with kickoffs.compacting():
+            for name, storage in self.stores.items():
+                try:
+                    evicted[name] = self._compact_rag(name, storage)
+                except Exception as e:
+                    print(f"Memory compaction failed for {name}: {e}")
+            if self.ltm_path and os.path.exists(self.ltm_path):
+                try:
+                    evicted["long_term"] = self._compact_long_term()
+                except sqlite3.Error as e:
+                    print(f"Memory compaction failed for long_term: {e}")
+        for name, count in evicted.items():
+            self._evicted[name] = self._evicted.get(name, 0) + count
+        return evicted
+
+    def start(self) -> "MemoryRetention":
+        """Compact now, then every policy.interval_s seconds in a background thread (between kickoffs)."""
+        kickoffs.listen()
+        self.compact()
+
+        def loop():
+            while not self._stop.wait(self.policy.interval_s):
+                self.compact()
+
+        self._thread = threading.Thread(target=loop, name="memory-compaction", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    # Metrics
+
+    def store_sizes(self) -> Dict[str, int]:
+        sizes = {name: storage.collection.count() for name, storage in self.stores.items()}
+        if self.ltm_path and os.path.exists(self.ltm_path):
+            conn = sqlite3.connect(self.ltm_path)
+            try:
+                sizes["long_term"] = conn.execute("SELECT COUNT(*) FROM long_term_memories").fetchone()[0]
+            finally:
+                conn.close()
+        return sizes
+
+    def metrics(self) -> dict:
+        with self._lock:
+            latencies = {name: list(samples) for name, samples in self._latencies.items()}
+        retrieval = {}
+        for name, samples in latencies.items():
+            samples.sort()
+            retrieval[name] = {
+                "count": len(samples),
+                "p50_ms": statistics.median(samples) * 1000,
+                "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+            }
+        return {"store_sizes": self.store_sizes(), "evicted": dict(self._evicted), "retrieval": retrieval}
+
+    def report(self) -> str:
+        m = self.metrics()
+        lines = ["Memory: " + ", ".join(f"{name} {size} entries" for name, size in m["store_sizes"].items())]
+        if m["evicted"]:
+            lines.append("Evicted: " + ", ".join(f"{name} {count}" for name, count in m["evicted"].items()))
+        for name, r in m["retrieval"].items():
+            lines.append(f"Retrieval {name}: {r['count']} searches, p50 {r['p50_ms']:.1f} ms, p95 {r['p95_ms']:.1f} ms")
+        return "\n".join(lines)
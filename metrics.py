@@ -0,0 +1,419 @@
+# In-process metrics for agents and crews (tokens, calls, latency, cache hit rates)
+#
+# Without remote traces we could not tell how many tokens, LLM calls or seconds an
+# `agent.run`, an AgentWorkflow step or a `crew.kickoff` costs. This module keeps a small
+# metrics registry in the process, fed by both frameworks:
+#   - LlamaIndex: an instrumentation event handler (LLM start/end events -> calls, latency,
+#     tokens) and span handler (agent / workflow runs, workflow steps, tool calls)
+#   - CrewAI: handlers on crewai_event_bus (LLM calls, tool usage, crew kickoffs)
+#   - Local caches (embeddings, search, artifacts) report hits and misses via record_cache()
+# Tokens come from the provider's usage report when the response carries one, otherwise they
+# are estimated from the text (~4 characters per token).
+#
+# enable_metrics() installs the handlers and writes a snapshot at exit to METRICS_FILE
+# (default metrics.json; a .prom file gets the Prometheus text format instead).
+#
+# Usage:
+#   from metrics import enable_metrics
+#   metrics = enable_metrics()
+#   ...
+#   print(metrics.summary())
+
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+PREFIX = "agents_"
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str]):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[Tuple[Dict[str, str], float]]:
+        with self._lock:
+            return [(dict(zip(self.labelnames, key)), value) for key, value in self._values.items()]
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str], buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            entry = self._values.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0, 0])
+            entry[0][bisect.bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def quantile(self, q: float, counts: List[int], total: int) -> float:
+        """Upper bound of the bucket holding the q-quantile."""
+        seen = 0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            seen += n
+            if seen >= q * total:
+                return bound
+        return float("inf")
+
+    def samples(self) -> List[Tuple[Dict[str, str], list]]:
+        with self._lock:
+            return [(dict(zip(self.labelnames, key)), [list(v[0]), v[1], v[2]]) for key, v in self._values.items()]
+
+
+def _label_text(labels: Dict[str, str], extra: Optional[Dict[str, str]] = None) -> str:
+    items = {**labels, **(extra or {})}
+    if not items:
+        return ""
+    # label values escape backslash, double quote and line feed (Prometheus text format)
+    escaped = (
+        f'{k}="' + str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for k, v in items.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+class MetricsRegistry:
+    """Named counters and histograms with Prometheus text and JSON export."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        with self._lock:
+            return self._metrics.setdefault(name, Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        with self._lock:
+            return self._metrics.setdefault(name, Histogram(name, help, labelnames, buckets))
+
+    def to_prometheus(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            name = PREFIX + metric.name
+            if isinstance(metric, Counter):
+                lines += [f"# HELP {name} {metric.help}", f"# TYPE {name} counter"]
+                for labels, value in metric.samples():
+                    lines.append(f"{name}{_label_text(labels)} {value:g}")
+            else:
+                lines += [f"# HELP {name} {metric.help}", f"# TYPE {name} histogram"]
+                for labels, (counts, total, count) in metric.samples():
+                    cumulative = 0
+                    for bound, n in zip(metric.buckets + (float("inf"),), counts):
+                        cumulative += n
+                        le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                        lines.append(f"{name}_bucket{_label_text(labels, {'le': le})} {cumulative}")
+                    lines.append(f"{name}_sum{_label_text(labels)} {total:g}")
+                    lines.append(f"{name}_count{_label_text(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        data = {"time": time.time(), "metrics": {}}
+        for metric in self._metrics.values():
+            if isinstance(metric, Counter):
+                data["metrics"][metric.name] = [{"labels": labels, "value": value} for labels, value in metric.samples()]
+            else:
+                data["metrics"][metric.name] = [
+                    {
+                        "labels": labels,
+                        "count": count,
+                        "sum": total,
+                        "mean": total / count if count else 0.0,
+                        "p50_le": metric.quantile(0.5, counts, count),
+                        "p95_le": metric.quantile(0.95, counts, count),
+                    }
+                    for labels, (counts, total, count) in metric.samples()
+                ]
+        return data
+
+    def write(self, path: str) -> None:
+        """Write the Prometheus text format (.prom / .txt) or a JSON snapshot."""
+        if path.endswith((".prom", ".txt")):
+            content = self.to_prometheus()
+        else:
+            content = json.dumps(self.snapshot(), indent=2, default=str)
+        with open(path, "w") as f:
+            f.write(content)
+
+    def summary(self) -> str:
+        """Short human-readable summary: LLM calls/tokens per model, cache hit rates."""
+        lines = []
+        tokens: Dict[str, Dict[str, float]] = {}
+        for labels, value in LLM_TOKENS.samples():
+            tokens.setdefault(labels["model"], {}).setdefault(labels["kind"], 0)
+            tokens[labels["model"]][labels["kind"]] += value
+        for labels, (counts, total, count) in LLM_LATENCY.samples():
+            t = tokens.get(labels["model"], {})
+            lines.append(
+                f"LLM {labels['model']} ({labels['framework']}): {count} calls, mean {total / count:.2f}s, "
+                f"{t.get('prompt', 0):.0f} prompt / {t.get('completion', 0):.0f} completion tokens"
+            )
+        caches: Dict[str, Dict[str, float]] = {}
+        for labels, value in CACHE_REQUESTS.samples():
+            caches.setdefault(labels["cache"], {})[labels["result"]] = value
+        for cache, results in sorted(caches.items()):
+            total = sum(results.values())
+            lines.append(f"Cache {cache}: {results.get('hit', 0):.0f}/{total:.0f} hits ({results.get('hit', 0) / total:.0%})")
+        return "\n".join(lines) or "No metrics recorded"
+
+
+registry = MetricsRegistry()
+
+LLM_CALLS = registry.counter("llm_calls_total", "LLM calls", ["framework", "model", "status"])
+LLM_TOKENS = registry.counter(
+    "llm_tokens_total", "LLM tokens (provider usage, or estimated from text)", ["framework", "model", "kind"]
+)
+LLM_LATENCY = registry.histogram("llm_call_seconds", "LLM call latency", ["framework", "model"])
+TOOL_CALLS = registry.counter("tool_calls_total", "Tool calls", ["framework", "tool", "status"])
+TOOL_LATENCY = registry.histogram("tool_call_seconds", "Tool call latency", ["framework", "tool"])
+RUN_LATENCY = registry.histogram(
+    "run_seconds", "agent.run / AgentWorkflow.run / crew.kickoff latency", ["kind", "name"],
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0),
+)
+STEP_LATENCY = registry.histogram("workflow_step_seconds", "LlamaIndex workflow step latency", ["workflow", "step"])
+CREW_TOKENS = registry.counter("crew_tokens_total", "Tokens reported by CrewAI per kickoff", ["crew"])
+CACHE_REQUESTS = registry.counter("cache_requests_total", "Local cache lookups", ["cache", "result"])
+
+
+def record_cache(cache: str, hit: bool, n: int = 1) -> None:
+    """Count n lookups in a local cache (used by embedding_cache, cached_search, run_artifacts)."""
+    if n:
+        CACHE_REQUESTS.inc(n, cache=cache, result="hit" if hit else "miss")
+
+
+def _record_llm(framework: str, model: str, seconds: float, prompt_tokens: int, completion_tokens: int,
+                status: str = "ok") -> None:
+    LLM_CALLS.inc(framework=framework, model=model, status=status)
+    LLM_LATENCY.observe(seconds, framework=framework, model=model)
+    LLM_TOKENS.inc(prompt_tokens, framework=framework, model=model, kind="prompt")
+    LLM_TOKENS.inc(completion_tokens, framework=framework, model=model, kind="completion")
+
+
+# LlamaIndex
+
+def _llama_index_usage(response, prompt_text: str, completion_text: str) -> Tuple[int, int]:
+    raw = getattr(response, "raw", None)
+    raw = raw if isinstance(raw, dict) else getattr(raw, "__dict__", {}) or {}
+    usage = raw.get("usage_metadata") or {}  # Gemini
+    if usage.get("prompt_token_count") is not None:
+        return usage["prompt_token_count"], usage.get("candidates_token_count") or 0
+    usage = raw.get("usage") or {}  # OpenAI-style
+    if not isinstance(usage, dict):
+        usage = getattr(usage, "__dict__", {})
+    if usage.get("prompt_tokens") is not None:
+        return usage["prompt_tokens"], usage.get("completion_tokens") or 0
+    return estimate_tokens(prompt_text), estimate_tokens(completion_text)
+
+
+def _llama_index_handlers():
+    from llama_index.core.instrumentation.event_handlers import BaseEventHandler
+    from llama_index.core.instrumentation.events.llm import (
+        LLMChatEndEvent,
+        LLMChatStartEvent,
+        LLMCompletionEndEvent,
+        LLMCompletionStartEvent,
+    )
+    from llama_index.core.instrumentation.span_handlers import BaseSpanHandler
+    from llama_index.core.tools.types import BaseTool
+    from llama_index.core.workflow import Workflow
+    from pydantic import PrivateAttr
+
+    class LLMEventMetrics(BaseEventHandler):
+        """LLM calls, latency and tokens from LLM start/end events (matched by span id)."""
+
+        _started: Dict[str, Tuple[float, str]] = PrivateAttr(default_factory=dict)
+
+        @classmethod
+        def class_name(cls) -> str:
+            return "LLMEventMetrics"
+
+        def handle(self, event, **kwargs) -> None:
+            if isinstance(event, (LLMChatStartEvent, LLMCompletionStartEvent)):
+                model = event.model_dict.get("model") or event.model_dict.get("model_name") or "unknown"
+                self._started[event.span_id] = (time.perf_counter(), str(model))
+            elif isinstance(event, (LLMChatEndEvent, LLMCompletionEndEvent)):
+                started = self._started.pop(event.span_id, None)
+                if started is None:
+                    return
+                if isinstance(event, LLMChatEndEvent):
+                    prompt = "\n".join(str(m.content or "") for m in event.messages)
+                    completion = str(event.response.message.content or "") if event.response else ""
+                else:
+                    prompt, completion = event.prompt, event.response.text
+                prompt_tokens, completion_tokens = _llama_index_usage(event.response, prompt, completion)
+                _record_llm("llama_index", started[1], time.perf_counter() - started[0], prompt_tokens, completion_tokens)
+
+    class SpanMetrics(BaseSpanHandler[Any]):
+        """Durations of agent / workflow runs, workflow steps and tool calls."""
+
+        @classmethod
+        def class_name(cls) -> str:
+            return "SpanMetrics"
+
+        def new_span(self, id_, bound_args, instance=None, parent_span_id=None, tags=None, **kwargs):
+            method = id_.split("-", 1)[0].rsplit(".", 1)[-1]
+            if isinstance(instance, Workflow):
+                if method == "run":
+                    kind = "agent_run" if hasattr(instance, "llm") else "workflow_run"
+                    labels = ("run", {"kind": kind, "name": getattr(instance, "name", type(instance).__name__)})
+                else:
+                    labels = ("step", {"workflow": type(instance).__name__, "step": method})
+            elif isinstance(instance, BaseTool) and method in ("call", "acall"):
+                labels = ("tool", {"framework": "llama_index", "tool": instance.metadata.name})
+            else:
+                return None
+            return (time.perf_counter(), labels)
+
+        def _finish(self, id_, status: str):
+            span = self.open_spans.get(id_)
+            if span is None:
+                return None
+            start, (kind, labels) = span
+            seconds = time.perf_counter() - start
+            if kind == "run":
+                RUN_LATENCY.observe(seconds, **labels)
+            elif kind == "step":
+                STEP_LATENCY.observe(seconds, **labels)
+            else:
+                TOOL_LATENCY.observe(seconds, **labels)
+                TOOL_CALLS.inc(status=status, **labels)
+            return span
+
+        def prepare_to_exit_span(self, id_, bound_args, instance=None, result=None, **kwargs):
+            return self._finish(id_, "ok")
+
+        def prepare_to_drop_span(self, id_, bound_args, instance=None, err=None, **kwargs):
+            return self._finish(id_, "error")
+
+    return LLMEventMetrics(), SpanMetrics()
+
+
+# CrewAI
+
+def _crewai_handlers() -> None:
+    from crewai.utilities.events import (
+        CrewKickoffCompletedEvent,
+        CrewKickoffFailedEvent,
+        CrewKickoffStartedEvent,
+        LLMCallCompletedEvent,
+        LLMCallFailedEvent,
+        LLMCallStartedEvent,
+        ToolUsageErrorEvent,
+        ToolUsageFinishedEvent,
+        crewai_event_bus,
+    )
+
+    local = threading.local()
+    kickoffs: Dict[int, float] = {}
+
+    def text_of(messages) -> str:
+        if isinstance(messages, str):
+            return messages
+        return "\n".join(str(m.get("content", "")) for m in messages or [])
+
+    def on_llm_started(source, event):
+        if not hasattr(local, "calls"):
+            local.calls = []
+        local.calls.append((time.perf_counter(), text_of(event.messages)))
+
+    def on_llm_finished(source, event):
+        calls = getattr(local, "calls", None)
+        if not calls:
+            return
+        start, prompt = calls.pop()
+        model = getattr(event, "model", None) or getattr(source, "model", None) or "unknown"
+        failed = isinstance(event, LLMCallFailedEvent)
+        completion = "" if failed else str(event.response)
+        _record_llm("crewai", str(model), time.perf_counter() - start, estimate_tokens(prompt),
+                    estimate_tokens(completion), "error" if failed else "ok")
+
+    def on_tool_finished(source, event):
+        status = "error" if isinstance(event, ToolUsageErrorEvent) else "cached" if event.from_cache else "ok"
+        TOOL_CALLS.inc(framework="crewai", tool=event.tool_name, status=status)
+        if status != "error":
+            seconds = (event.finished_at - event.started_at).total_seconds()
+            TOOL_LATENCY.observe(seconds, framework="crewai", tool=event.tool_name)
+
+    def on_kickoff_started(source, event):
+        kickoffs[id(source)] = time.perf_counter()
+
+    def on_kickoff_finished(source, event):
+        start = kickoffs.pop(id(source), None)
+        name = event.crew_name or "crew"
+        if start is not None:
+            RUN_LATENCY.observe(time.perf_counter() - start, kind="crew_kickoff", name=name)
+        if isinstance(event, CrewKickoffCompletedEvent) and event.total_tokens:
+            CREW_TOKENS.inc(event.total_tokens, crew=name)
+
+    crewai_event_bus.register_handler(LLMCallStartedEvent, on_llm_started)
+    crewai_event_bus.register_handler(LLMCallCompletedEvent, on_llm_finished)
+    crewai_event_bus.register_handler(LLMCallFailedEvent, on_llm_finished)
+    crewai_event_bus.register_handler(ToolUsageFinishedEvent, on_tool_finished)
+    crewai_event_bus.register_handler(ToolUsageErrorEvent, on_tool_finished)
+    crewai_event_bus.register_handler(CrewKickoffStartedEvent, on_kickoff_started)
+    crewai_event_bus.register_handler(CrewKickoffCompletedEvent, on_kickoff_finished)
+    crewai_event_bus.register_handler(CrewKickoffFailedEvent, on_kickoff_finished)
+
+
+_enabled = set()
+
+
+def enable_metrics(path: Optional[str] = None, frameworks: Sequence[str] = ("llama_index", "crewai")) -> MetricsRegistry:
+    """
+    Feed the registry from LlamaIndex and/or CrewAI and write a snapshot at exit.
+    Args:
+        path (str): Output file (defaults to METRICS_FILE or metrics.json); .prom for Prometheus text
+        frameworks: Frameworks to instrument; ones that are not installed are skipped
+    Returns:
+        MetricsRegistry
+    """
+    if "llama_index" in frameworks and "llama_index" not in _enabled:
+        try:
+            from llama_index.core.instrumentation import get_dispatcher
+        except ImportError:
+            pass
+        else:
+            event_handler, span_handler = _llama_index_handlers()
+            dispatcher = get_dispatcher()
+            dispatcher.add_event_handler(event_handler)
+            dispatcher.add_span_handler(span_handler)
+            _enabled.add("llama_index")
+    if "crewai" in frameworks and "crewai" not in _enabled:
+        try:
+            _crewai_handlers()
+            _enabled.add("crewai")
+        except ImportError:
+            pass
+    if "exit" not in _enabled:
+        path = os.path.abspath(path or os.getenv("METRICS_FILE", "metrics.json"))
+        atexit.register(_write_at_exit, path)
+        _enabled.add("exit")
+    return registry
+
+
+def _write_at_exit(path: str) -> None:
+    registry.write(path)
+    if path != os.devnull:
+        print(f"--- Metrics written to {path} ---")
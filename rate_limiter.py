@@ -0,0 +1,436 @@
+# Process-wide adaptive rate limiter for Gemini calls
+#
+# Agents, crews and concurrent sessions of one process share one API key. Without coordination
+# they all run into the quota at the same time, every framework retries on its own schedule
+# (thundering herd) and the tail latency explodes.
+#
+# Every Gemini request of the scripts goes through the shared connection pool of llm_factory.py
+# (LlamaIndex GoogleGenAI and crewai.LLM, sync and async), so the limiter sits in that transport:
+# 1. Buckets      - per model, one bucket for requests (RPM) and one for tokens (TPM). Prompt tokens
+#                   are estimated from the request body up front and corrected with the response's
+#                   usage metadata (totalTokenCount) when it arrives.
+# 2. AIMD         - per model concurrency limit: +1/limit after each success, halved on a 429. A 429
+#                   also pauses the model for its Retry-After / retryDelay (or RATE_LIMIT_BACKOFF_S).
+# 3. Retries      - a 429 is retried here (RATE_LIMIT_RETRIES times) after the pause, instead of
+#                   by every framework separately, so queued callers are not overtaken by retries
+# 4. Priorities   - waiting requests are served by priority, then arrival: "interactive" (chat
+#                   turns) before "default" before "batch" (research crews). set_priority() sets it
+#                   for the current context / process, priority() for a block.
+# 5. Metrics      - queue wait per model and priority (rate_limit_wait_seconds) and 429s
+#                   (rate_limit_throttled_total) in metrics.py; limiter_stats() for the live state
+#
+# Limits default to the Gemini API paid tier 1 values below; override per model with
+#   RATE_LIMITS='{"gemini-2.5-flash": {"rpm": 10, "tpm": 250000, "concurrency": 4}}'
+# RATE_LIMIT=0 disables the limiter. The limits apply to one process only.
+
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+import httpx
+
+from call_policy import DeadlineExceeded, remaining
+from metrics import registry
+
+DEFAULT_LIMITS = {
+    "gemini-2.5-flash": {"rpm": 1000, "tpm": 1_000_000},
+    "gemini-2.5-pro": {"rpm": 150, "tpm": 2_000_000},
+    "*": {"rpm": 1000, "tpm": 1_000_000},
+}
+PRIORITIES = {"interactive": 0, "default": 1, "batch": 2}
+# generateContent / streamGenerateContent for Gemini API and Vertex AI URLs
+GENERATE_PATH = re.compile(r"/models/([^/:]+):(generateContent|streamGenerateContent)")
+
+WAIT_SECONDS = registry.histogram(
+    "rate_limit_wait_seconds", "Time a Gemini request waited for the rate limiter", ["model", "priority"]
+)
+THROTTLED = registry.counter("rate_limit_throttled_total", "Gemini 429 responses", ["model"])
+
+_priority: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("rate_limit_priority", default=None)
+_default_priority = "default"
+
+
+def set_priority(name: str) -> None:
+    """Priority of the Gemini calls made from now on (current context, and the process default)."""
+    global _default_priority
+    if name not in PRIORITIES:
+        raise ValueError(f"Unknown priority {name!r} (expected one of {', '.join(PRIORITIES)})")
+    _default_priority = name
+    _priority.set(name)
+
+
+@contextlib.contextmanager
+def priority(name: str) -> Iterator[None]:
+    """Priority of the Gemini calls made inside the block."""
+    if name not in PRIORITIES:
+        raise ValueError(f"Unknown priority {name!r} (expected one of {', '.join(PRIORITIES)})")
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> str:
+    return _priority.get() or _default_priority
+
+
+class TokenBucket:
+    """Refills at `rate` per second up to `capacity`; may go into debt when a cost is corrected."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate, self.capacity = rate, capacity
+        self.level = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` can be taken (requests larger than the bucket need a full bucket)."""
+        self._refill()
+        need = min(amount, self.capacity)
+        return 0.0 if self.level >= need else (need - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self.level -= amount
+
+
+class _Waiter:
+    def __init__(self, tokens: int, priority: str, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.tokens, self.priority = tokens, priority
+        self.enqueued = time.monotonic()
+        self.granted = self.cancelled = False
+        self._loop = loop
+        if loop is None:
+            self._event = threading.Event()
+        else:
+            self._future = loop.create_future()
+
+    def grant(self) -> None:
+        self.granted = True
+        if self._loop is None:
+            self._event.set()
+        else:
+            self._loop.call_soon_threadsafe(lambda: self._future.done() or self._future.set_result(None))
+
+
+class ModelLimiter:
+    """
+    Request / token buckets, AIMD concurrency limit and a priority queue for one model.
+    Args:
+        model (str): Model name (metric label)
+        rpm (float): Requests per minute
+        tpm (float): Tokens per minute
+        concurrency (int): Upper bound of the concurrency limit
+        burst_s (float): The buckets hold this many seconds of their rate
+    """
+
+    def __init__(self, model: str, rpm: float, tpm: float, concurrency: int = 8, burst_s: float = 10.0):
+        self.model = model
+        self.requests = TokenBucket(rpm / 60, max(1.0, rpm / 60 * burst_s))
+        self.tokens = TokenBucket(tpm / 60, max(1.0, tpm / 60 * burst_s))
+        self.max_concurrency = concurrency
+        self.limit = float(concurrency)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.throttled = 0
+        self._queue: List[tuple] = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._timer_at: Optional[float] = None
+
+    # Queue
+
+    def _enqueue(self, waiter: _Waiter, seq: Optional[int] = None) -> int:
+        seq = next(self._seq) if seq is None else seq
+        with self._lock:
+            heapq.heappush(self._queue, (PRIORITIES[waiter.priority], seq, waiter))
+            self._dispatch()
+        return seq
+
+    def _dispatch(self) -> None:
+        """Grant waiting requests while the limits allow (called with the lock held)."""
+        while self._queue:
+            waiter = self._queue[0][2]
+            if waiter.cancelled:
+                heapq.heappop(self._queue)
+                continue
+            if self.in_flight >= max(1, int(self.limit)):
+                return  # release() dispatches again
+            wait = max(
+                self.paused_until - time.monotonic(),
+                self.requests.wait_time(1),
+                self.tokens.wait_time(waiter.tokens),
+            )
+            if wait > 0:
+                self._wake_in(wait)
+                return
+            heapq.heappop(self._queue)
+            self.requests.take(1)
+            self.tokens.take(waiter.tokens)
+            self.in_flight += 1
+            WAIT_SECONDS.observe(time.monotonic() - waiter.enqueued, model=self.model, priority=waiter.priority)
+            waiter.grant()
+
+    def _wake_in(self, delay: float) -> None:
+        due = time.monotonic() + delay
+        if self._timer_at is not None and self._timer_at <= due:
+            return
+        self._timer_at = due
+        timer = threading.Timer(delay, self._on_timer)
+        timer.daemon = True
+        timer.start()
+
+    def _on_timer(self) -> None:
+        with self._lock:
+            self._timer_at = None
+            self._dispatch()
+
+    # Acquire / release
+
+    def acquire(self, tokens: int, priority: str = "default", seq: Optional[int] = None) -> int:
+        """Block until the request may be sent. Returns its queue position (reused for retries)."""
+        waiter = _Waiter(tokens, priority)
+        seq = self._enqueue(waiter, seq)
+        waiter._event.wait()
+        return seq
+
+    async def acquire_async(self, tokens: int, priority: str = "default", seq: Optional[int] = None) -> int:
+        waiter = _Waiter(tokens, priority, asyncio.get_running_loop())
+        seq = self._enqueue(waiter, seq)
+        try:
+            await waiter._future
+        except asyncio.CancelledError:
+            with self._lock:
+                waiter.cancelled = True
+                granted = waiter.granted
+            if granted:
+                self.release()
+            raise
+        return seq
+
+    def release(self, token_correction: int = 0, throttled: bool = False,
+                retry_after: Optional[float] = None) -> None:
+        """
+        Return a concurrency slot.
+        Args:
+            token_correction (int): Actual minus estimated tokens of the request
+            throttled (bool): The request got a 429 (multiplicative decrease and pause)
+            retry_after (float): Pause requested by the server, in seconds
+        """
+        with self._lock:
+            self.in_flight -= 1
+            if throttled:
+                self.throttled += 1
+                self.limit = max(1.0, self.limit / 2)
+                pause = retry_after if retry_after is not None else float(os.getenv("RATE_LIMIT_BACKOFF_S", 2))
+                self.paused_until = max(self.paused_until, time.monotonic() + pause)
+            else:
+                self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+            if token_correction:
+                self.tokens.take(token_correction)
+            self._dispatch()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "queued": sum(1 for entry in self._queue if not entry[2].cancelled),
+                "throttled": self.throttled,
+                "paused_s": max(0.0, round(self.paused_until - time.monotonic(), 2)),
+            }
+
+
+_limiters: Dict[str, ModelLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(model: str) -> ModelLimiter:
+    """The process-wide limiter of a model (limits from DEFAULT_LIMITS and RATE_LIMITS)."""
+    with _limiters_lock:
+        if model not in _limiters:
+            overrides = json.loads(os.getenv("RATE_LIMITS", "{}"))
+            limits = {
+                "concurrency": int(os.getenv("RATE_LIMIT_CONCURRENCY", 8)),
+                **DEFAULT_LIMITS.get(model, DEFAULT_LIMITS["*"]),
+                **overrides.get("*", {}),
+                **overrides.get(model, {}),
+            }
+            _limiters[model] = ModelLimiter(model, **limits)
+        return _limiters[model]
+
+
+def limiter_stats() -> Dict[str, dict]:
+    return {model: limiter.stats() for model, limiter in list(_limiters.items())}
+
+
+def enabled() -> bool:
+    return os.getenv("RATE_LIMIT", "1").lower() not in ("0", "false", "no")
+
+
+# HTTP transports (installed by llm_factory.py)
+
+TOTAL_TOKENS = re.compile(rb'"totalTokenCount"\s*:\s*(\d+)')
+RETRY_DELAY = re.compile(rb'"retryDelay"\s*:\s*"(\d+(?:\.\d+)?)s"')
+
+
+def _limited_request(request: httpx.Request) -> Optional[tuple]:
+    """(model, estimated prompt tokens) for generate requests, None for anything else."""
+    match = GENERATE_PATH.search(request.url.path)
+    if match is None:
+        return None
+    return match.group(1), max(1, len(request.content) // 4)
+
+
+def _retry_after(response: httpx.Response, body: bytes) -> Optional[float]:
+    header = response.headers.get("retry-after")
+    if header and header.replace(".", "", 1).isdigit():
+        return float(header)
+    match = RETRY_DELAY.search(body)
+    return float(match.group(1)) if match else None
+
+
+class _Release:
+    """Releases the slot once, with the token count found at the end of the response body."""
+
+    def __init__(self, limiter: ModelLimiter, estimated: int, throttled: bool):
+        self.limiter, self.estimated, self.throttled = limiter, estimated, throttled
+        self.tail = b""
+        self.done = False
+
+    def feed(self, chunk: bytes) -> None:
+        self.tail = (self.tail + chunk)[-4096:]
+
+    def __call__(self) -> None:
+        if self.done:
+            return
+        self.done = True
+        counts = TOTAL_TOKENS.findall(self.tail)
+        correction = int(counts[-1]) - self.estimated if counts else 0
+        self.limiter.release(token_correction=correction, throttled=self.throttled)
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    def __init__(self, stream: httpx.SyncByteStream, release: _Release):
+        self._stream, self._release = stream, release
+
+    def __iter__(self):
+        for chunk in self._stream:
+            self._release.feed(chunk)
+            yield chunk
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, release: _Release):
+        self._stream, self._release = stream, release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            self._release.feed(chunk)
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+def _retries() -> int:
+    return int(os.getenv("RATE_LIMIT_RETRIES", 3))
+
+
+class RateLimitedTransport(httpx.BaseTransport):
+    """Sends generate requests through the model's limiter; other requests pass straight through."""
+
+    def __init__(self, transport: httpx.BaseTransport):
+        self._transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        limited = _limited_request(request)
+        if limited is None:
+            return self._transport.handle_request(request)
+        model, tokens = limited
+        limiter, seq = limiter_for(model), None
+        for attempt in range(_retries() + 1):
+            seq = limiter.acquire(tokens, current_priority(), seq)
+            try:
+                response = self._transport.handle_request(request)
+            except BaseException:
+                limiter.release()
+                raise
+            throttled = response.status_code == 429
+            if throttled:
+                THROTTLED.inc(model=model)
+                if attempt < _retries():
+                    body = b"".join(response.stream)
+                    response.close()
+                    limiter.release(throttled=True, retry_after=_retry_after(response, body))
+                    continue
+            release = _Release(limiter, tokens, throttled)
+            return httpx.Response(
+                status_code=response.status_code,
+                headers=response.headers,
+                stream=_ReleasingStream(response.stream, release),
+                extensions=response.extensions,
+            )
+
+
+class AsyncRateLimitedTransport(httpx.AsyncBaseTransport):
+    """Async version of RateLimitedTransport: waiting requests do not block the event loop."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        limited = _limited_request(request)
+        if limited is None:
+            return await self._transport.handle_async_request(request)
+        model, tokens = limited
+        limiter, seq = limiter_for(model), None
+        for attempt in range(_retries() + 1):
+            # waiting in the queue counts against the turn budget (call_policy.py)
+            try:
+                seq = await asyncio.wait_for(limiter.acquire_async(tokens, current_priority(), seq), remaining())
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded(f"Turn budget exhausted waiting for the {model} rate limiter") from None
+            try:
+                response = await self._transport.handle_async_request(request)
+            except BaseException:
+                limiter.release()
+                raise
+            throttled = response.status_code == 429
+            if throttled:
+                THROTTLED.inc(model=model)
+                if attempt < _retries():
+                    body = b"".join([chunk async for chunk in response.stream])
+                    await response.aclose()
+                    limiter.release(throttled=True, retry_after=_retry_after(response, body))
+                    continue
+            release = _Release(limiter, tokens, throttled)
+            return httpx.Response(
+                status_code=response.status_code,
+                headers=response.headers,
+                stream=_AsyncReleasingStream(response.stream, release),
+                extensions=response.extensions,
+            )
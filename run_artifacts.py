@@ -0,0 +1,306 @@
+# Input-hash memoized crew runs with a content-addressed artifact store
+#
+# Scripts 5, 6 and 8 rerun the whole crew and overwrite final_output.txt,
+# customer_support_report.txt or invoice_contract_reconciliation.json even when nothing changed.
+# ArtifactStore.kickoff(crew, inputs, extra) instead:
+# 1. hashes everything that determines the result - inputs, task prompts, agents, tools,
+#    model config and `extra` (e.g. digests of the PDFs / ticket data the tools read)
+# 2. if an artifact for that hash exists, restores the output files and returns the stored
+#    result without calling kickoff at all
+# 3. otherwise runs the crew with a per-task cache: each task's output is keyed by its own
+#    prompt, agent, tools, model, the context it receives and `extra`, so when only report_task
+#    changes, only report_task is sent to the model (and new data files rerun every task)
+# 4. writes output files atomically (temp file + rename) and keeps every previous version
+#    in the content-addressed object store (.artifacts/objects, history in .artifacts/history.jsonl)
+#
+# Set ARTIFACTS_DISABLE=1 to always run the crew without any caching; force=True runs every
+# task again and stores the fresh results.
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, Optional
+
+from metrics import record_cache
+
+ARTIFACTS_DIR = os.getenv("ARTIFACTS_DIR", ".artifacts")
+
+
+def _disabled() -> bool:
+    return os.getenv("ARTIFACTS_DISABLE", "").lower() in ("1", "true", "yes")
+
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def stable_hash(value: Any) -> str:
+    """Hash of any JSON-serializable value (keys sorted, non-JSON values via str)."""
+    return sha256_bytes(json.dumps(value, sort_keys=True, default=str).encode("utf-8"))
+
+
+def file_digest(path: str) -> Optional[str]:
+    """Content hash of a data file the tools read (None if the file does not exist)."""
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def atomic_write(path: str, data: bytes) -> None:
+    """Write a file so readers never see a partially written version."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _stable_params(params: Optional[dict]) -> dict:
+    """
+    The JSON-serializable part of an LLM's additional_params. Clients, callbacks and similar
+    objects (e.g. the shared HTTPHandler from llm_factory.py) are left out: their str() contains
+    a memory address, which would give every process a different key.
+    """
+    stable = {}
+    for name, value in (params or {}).items():
+        if hasattr(value, "model_dump"):  # pydantic config, e.g. GenerateContentConfig
+            value = value.model_dump(mode="json", exclude_none=True)
+        try:
+            json.dumps(value, sort_keys=True)
+        except (TypeError, ValueError):
+            continue
+        stable[name] = value
+    return stable
+
+
+def llm_fingerprint(llm) -> dict:
+    """Model name and sampling config of a crewai LLM."""
+    if llm is None:
+        return {}
+    if isinstance(llm, str):
+        return {"model": llm}
+    return {
+        "model": getattr(llm, "model", None),
+        "temperature": getattr(llm, "temperature", None),
+        "additional_params": _stable_params(getattr(llm, "additional_params", None)),
+    }
+
+
+def _field(obj, name: str, template: bool):
+    """Field value, or its un-interpolated template (crewai keeps it in _original_<name>)."""
+    if template:
+        original = getattr(obj, f"_original_{name}", None)
+        if original is not None:
+            return original
+    return getattr(obj, name)
+
+
+def agent_fingerprint(agent, template: bool = False) -> dict:
+    return {
+        "role": _field(agent, "role", template),
+        "goal": _field(agent, "goal", template),
+        "backstory": _field(agent, "backstory", template),
+        "llm": llm_fingerprint(agent.llm),
+        "tools": sorted(f"{tool.name}: {tool.description}" for tool in (agent.tools or [])),
+    }
+
+
+def task_fingerprint(task, template: bool = False) -> dict:
+    """
+    Everything about a task that changes its output. With template=True the prompt templates
+    are used (before {placeholders} are filled in), which is what the run key needs because
+    the inputs are hashed separately.
+    """
+    return {
+        "description": _field(task, "description", template),
+        "expected_output": _field(task, "expected_output", template),
+        "agent": agent_fingerprint(task.agent, template) if task.agent else None,
+        "tools": sorted(f"{tool.name}: {tool.description}" for tool in (task.tools or [])),
+        "context": [_field(t, "description", template) for t in task.context] if isinstance(task.context, list) else None,
+    }
+
+
+class CachedCrewOutput:
+    """Result returned when a run is served from the artifact store (mirrors CrewOutput.raw / tasks_output)."""
+
+    def __init__(self, artifact: dict):
+        self.raw = artifact["raw"]
+        self.tasks_output = [SimpleNamespace(**task) for task in artifact["tasks"]]
+        self.artifact_key = artifact["key"]
+
+    def __str__(self) -> str:
+        return self.raw
+
+
+class ArtifactStore:
+    """
+    Content-addressed store of crew run artifacts.
+    Args:
+        root (str): Directory for objects/, runs/, tasks/ and history.jsonl
+    """
+
+    def __init__(self, root: str = ARTIFACTS_DIR):
+        self.root = root
+        for sub in ("objects", "runs", "tasks"):
+            os.makedirs(os.path.join(root, sub), exist_ok=True)
+        self.stats = {"run_hits": 0, "task_hits": 0, "task_misses": 0}
+        self._stats_lock = threading.Lock()  # fan-out crews run concurrently (script 6)
+
+    def _count(self, stat: str) -> None:
+        with self._stats_lock:
+            self.stats[stat] += 1
+
+    # Objects and records
+
+    def put_object(self, data: bytes) -> str:
+        key = sha256_bytes(data)
+        path = os.path.join(self.root, "objects", key)
+        if not os.path.exists(path):
+            atomic_write(path, data)
+        return key
+
+    def get_object(self, key: str) -> bytes:
+        with open(os.path.join(self.root, "objects", key), "rb") as f:
+            return f.read()
+
+    def _read_record(self, kind: str, key: str) -> Optional[dict]:
+        path = os.path.join(self.root, kind, f"{key}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_record(self, kind: str, key: str, record: dict) -> None:
+        atomic_write(os.path.join(self.root, kind, f"{key}.json"), json.dumps(record, indent=2).encode("utf-8"))
+
+    def write_output_file(self, path: str, data: bytes, run_key: str) -> str:
+        """Atomically replace an output file, keeping the previous content as a version."""
+        key = self.put_object(data)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                previous = f.read()
+            if previous == data:
+                return key
+            self.put_object(previous)
+        atomic_write(path, data)
+        with open(os.path.join(self.root, "history.jsonl"), "a") as f:
+            f.write(json.dumps({"path": path, "object": key, "run": run_key, "time": time.time()}) + "\n")
+        return key
+
+    # Per-task cache
+
+    def _install_task_cache(self, crew, extra: Optional[Dict[str, Any]] = None, reuse: bool = True) -> list:
+        """
+        Wrap agent.execute_task so each task's output is reused when its key is unchanged.
+        Args:
+            crew: The crew about to run
+            extra (dict): The run's extra dependencies (data file digests etc.), part of every task key
+            reuse (bool): Read stored outputs (False: only store the fresh ones)
+        """
+        wrapped = []
+        for agent in crew.agents:
+            execute_task = agent.execute_task
+
+            def cached_execute_task(task, context=None, tools=None, _execute=execute_task):
+                key = stable_hash({"task": task_fingerprint(task), "context": context, "extra": extra or {}})
+                record = self._read_record("tasks", key) if reuse else None
+                if record is not None:
+                    self._count("task_hits")
+                    record_cache("crew_tasks", True)
+                    print(f"--- Reusing cached output for task: {task.description[:60]!r} ---")
+                    return record["raw"]
+                self._count("task_misses")
+                record_cache("crew_tasks", False)
+                result = _execute(task=task, context=context, tools=tools)
+                self._write_record("tasks", key, {"raw": result, "time": time.time()})
+                return result
+
+            # Agents are pydantic models; bypass field validation to shadow the method
+            object.__setattr__(agent, "execute_task", cached_execute_task)
+            wrapped.append(agent)
+        return wrapped
+
+    @staticmethod
+    def _remove_task_cache(agents: list) -> None:
+        for agent in agents:
+            agent.__dict__.pop("execute_task", None)
+
+    # Memoized kickoff
+
+    def run_key(self, crew, inputs: Optional[Dict[str, Any]], extra: Optional[Dict[str, Any]]) -> str:
+        return stable_hash({
+            "inputs": inputs or {},
+            "tasks": [task_fingerprint(task, template=True) for task in crew.tasks],
+            "process": str(crew.process),
+            "extra": extra or {},
+        })
+
+    def kickoff(self, crew, inputs: Optional[Dict[str, Any]] = None, extra: Optional[Dict[str, Any]] = None,
+                force: bool = False):
+        """
+        Run crew.kickoff(inputs) unless an artifact for the same inputs/prompts/tools/model exists.
+        Args:
+            crew: The crew to run
+            inputs (dict): kickoff inputs
+            extra (dict): Anything else the result depends on, e.g. {"invoice": file_digest("invoice.pdf")}
+            force (bool): Always run the crew and every task (fresh results are stored)
+        """
+        disabled = _disabled()
+        key = self.run_key(crew, inputs, extra)
+        artifact = None if force or disabled else self._read_record("runs", key)
+        if artifact is not None:
+            self._count("run_hits")
+            record_cache("crew_runs", True)
+            print(f"--- Inputs unchanged, reusing artifact {key[:12]} ---")
+            for path, object_key in artifact["files"].items():
+                self.write_output_file(path, self.get_object(object_key), key)
+            return CachedCrewOutput(artifact)
+
+        record_cache("crew_runs", False)
+        # Let the store write the output files (atomically, versioned) instead of the tasks
+        output_files = {task: task.output_file for task in crew.tasks if task.output_file}
+        for task in output_files:
+            task.output_file = None
+        agents = [] if disabled else self._install_task_cache(crew, extra, reuse=not force)
+        try:
+            result = crew.kickoff(inputs=inputs) if inputs is not None else crew.kickoff()
+        finally:
+            self._remove_task_cache(agents)
+            for task, path in output_files.items():
+                task.output_file = path
+
+        files = {}
+        for task, path in output_files.items():
+            if task.output is None:
+                continue
+            if task.output.json_dict:
+                content = json.dumps(task.output.json_dict, ensure_ascii=False, indent=2)
+            else:
+                content = task.output.raw
+            files[path] = self.write_output_file(path, content.encode("utf-8"), key)
+
+        self._write_record("runs", key, {
+            "key": key,
+            "time": time.time(),
+            "inputs": inputs or {},
+            "raw": result.raw,
+            "tasks": [{"description": t.description, "agent": t.agent, "raw": t.raw} for t in result.tasks_output],
+            "files": files,
+        })
+        return result
@@ -0,0 +1,380 @@
+# Content-addressed storage of large tool outputs in saved agent state (scripts 2 and 3)
+#
+# agent_state.json stores the same Tavily payload many times: in the chat memory, in the
+# streaming queue and in every logged agent input that carries the history - and again in every
+# saved session (compare agent_state_old.json). write_state() / read_state() replace
+# json.dump / json.load of the Context dict:
+# 1. Blob store      - every text of at least STATE_BLOB_MIN_CHARS characters (also inside the
+#                      nested JSON strings of the serialized memory and events) is written once to
+#                      .agent_state_blobs/<sha256[:2]>/<sha256> next to the state file; the state
+#                      holds a reference [[blob:<sha256>]] instead. Identical payloads, in one state
+#                      or across sessions sharing the directory, are stored once
+# 2. GC              - the store keeps an index of the state files that use it; blobs no state
+#                      file references any more are deleted after each write (or `gc`). Blobs
+#                      younger than STATE_BLOB_GC_GRACE_S are kept: another process may have written
+#                      them for a state it has not saved yet. Index updates and GC hold a file lock
+# 3. Lazy resolution - a restored Context keeps the references; blobs are read only when a message
+#                      is sent to the model: the shared LLM transport (llm_factory.py) expands
+#                      references in the request body (BlobResolvingTransport). resolve() does the
+#                      same for any other consumer. A missing blob raises MissingBlobError (on
+#                      read_state already) - the model never gets a bare reference
+#
+# The blob directory belongs to the state files: commit .agent_state_blobs/ together with
+# agent_state*.json (or neither), or a fresh clone cannot restore the state.
+# Note: a restored memory counts each reference as ~12 tokens towards its token limit, not the
+# stored text; use read_state(path, lazy=False) when the history must fit the limit exactly.
+#
+# Usage:
+#   from state_store import read_state, write_state
+#   write_state("agent_state.json", ctx.to_dict(serializer=JsonSerializer()))
+#   ctx = Context.from_dict(agent, read_state("agent_state.json"), serializer=JsonSerializer())
+#
+#   python state_store.py migrate agent_state.json agent_state_old.json   # move existing states to blobs
+#   python state_store.py report agent_state.json                         # sizes and references
+#   python state_store.py gc agent_state.json
+
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+import httpx
+
+from metrics import record_cache
+
+BLOB_DIR = ".agent_state_blobs"
+REFERENCE = re.compile(r"\[\[blob:([0-9a-f]{64})\]\]")
+REFERENCE_BYTES = re.compile(rb"\[\[blob:([0-9a-f]{64})\]\]")
+
+_stores: Dict[str, "BlobStore"] = {}
+_stores_lock = threading.Lock()
+
+
+class MissingBlobError(LookupError):
+    """A state file references a blob that is not in any blob store."""
+
+
+def reference(digest: str) -> str:
+    return f"[[blob:{digest}]]"
+
+
+@contextlib.contextmanager
+def _file_lock(path: str) -> Iterator[None]:
+    """Exclusive lock across processes (POSIX; a no-op where fcntl is unavailable)."""
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class BlobStore:
+    """
+    Content-addressed text store: one file per distinct text, named by its sha256.
+    Args:
+        path (str): Store directory (created if missing)
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        os.makedirs(self.path, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _file(self, digest: str) -> str:
+        return os.path.join(self.path, digest[:2], digest)
+
+    def put(self, text: str) -> str:
+        """Store text (once) and return its digest."""
+        data = text.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._file(digest)
+        exists = os.path.exists(path)
+        record_cache("state_blobs", exists)
+        if exists:
+            os.utime(path)  # reused by a state being written: restart its GC grace period
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return digest
+
+    def get(self, digest: str) -> Optional[str]:
+        try:
+            with open(self._file(digest), "rb") as f:
+                return f.read().decode("utf-8")
+        except FileNotFoundError:
+            return None
+
+    def digests(self) -> Set[str]:
+        found = set()
+        for root, _, files in os.walk(self.path):
+            found.update(name for name in files if len(name) == 64)
+        return found
+
+    # Index of the state files using the store (for GC)
+
+    def _index_path(self) -> str:
+        return os.path.join(self.path, "index.json")
+
+    def states(self) -> List[str]:
+        try:
+            with open(self._index_path()) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+
+    def _lock_path(self) -> str:
+        return os.path.join(self.path, ".lock")
+
+    def register(self, state_path: str) -> None:
+        with self._lock, _file_lock(self._lock_path()):
+            states = [p for p in self.states() if os.path.exists(p)]
+            state_path = os.path.abspath(state_path)
+            if state_path not in states:
+                states.append(state_path)
+            tmp = f"{self._index_path()}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(states, f, indent=2)
+            os.replace(tmp, self._index_path())
+
+    def gc(self, grace_s: Optional[float] = None) -> Dict[str, int]:
+        """
+        Delete blobs that no registered state file references.
+        Args:
+            grace_s (float): Keep unreferenced blobs modified this recently (default STATE_BLOB_GC_GRACE_S)
+        """
+        grace_s = float(os.getenv("STATE_BLOB_GC_GRACE_S", 3600)) if grace_s is None else grace_s
+        cutoff = time.time() - grace_s
+        with self._lock, _file_lock(self._lock_path()):
+            referenced: Set[str] = set()
+            for state_path in self.states():
+                if os.path.exists(state_path):
+                    with open(state_path, "rb") as f:
+                        referenced.update(m.decode() for m in REFERENCE_BYTES.findall(f.read()))
+            removed = freed = 0
+            for digest in self.digests() - referenced:
+                path = self._file(digest)
+                if os.path.getmtime(path) > cutoff:
+                    continue
+                freed += os.path.getsize(path)
+                os.remove(path)
+                removed += 1
+            return {"referenced": len(referenced), "removed": removed, "freed_bytes": freed}
+
+
+def store_for(state_path: str) -> BlobStore:
+    """The blob store next to a state file (STATE_BLOB_DIR overrides the directory name)."""
+    directory = os.path.join(os.path.dirname(os.path.abspath(state_path)), os.getenv("STATE_BLOB_DIR", BLOB_DIR))
+    with _stores_lock:
+        if directory not in _stores:
+            _stores[directory] = BlobStore(directory)
+        return _stores[directory]
+
+
+# Writing and reading state
+
+def _min_chars() -> int:
+    return int(os.getenv("STATE_BLOB_MIN_CHARS", 1024))
+
+
+def _nested_json(text: str) -> Any:
+    if text[:1] in ("{", "[") and len(text) > 1:
+        try:
+            return json.loads(text)
+        except ValueError:
+            return None
+    return None
+
+
+def _externalize(value: Any, store: BlobStore, min_chars: int, stats: Dict[str, int]) -> Any:
+    """Copy of value with large texts replaced by blob references (serialized JSON strings are searched too)."""
+    if isinstance(value, dict):
+        return {k: _externalize(v, store, min_chars, stats) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_externalize(v, store, min_chars, stats) for v in value]
+    if not isinstance(value, str) or len(value) < min_chars or REFERENCE.fullmatch(value):
+        return value
+    nested = _nested_json(value)
+    if isinstance(nested, (dict, list)):
+        # a serialized component / event: keep it a JSON string, with its large texts replaced
+        converted = _externalize(nested, store, min_chars, stats)
+        return value if converted == nested else json.dumps(converted)
+    stats["texts"] += 1
+    stats["chars"] += len(value)
+    return reference(store.put(value))
+
+
+def write_state(path: str, ctx_dict: dict, min_chars: Optional[int] = None) -> Dict[str, int]:
+    """
+    Save a Context dict with its large texts moved to the blob store, then collect unused blobs.
+    Args:
+        path (str): State file (e.g. agent_state.json)
+        ctx_dict (dict): ctx.to_dict(serializer=JsonSerializer())
+        min_chars (int): Smallest text moved to the store (default STATE_BLOB_MIN_CHARS)
+    Returns:
+        dict: texts moved, their characters, bytes written, blobs removed by GC
+    """
+    store = store_for(path)
+    stats = {"texts": 0, "chars": 0}
+    converted = _externalize(ctx_dict, store, _min_chars() if min_chars is None else min_chars, stats)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(converted, f, indent=2)
+    os.replace(tmp, path)
+    store.register(path)
+    collected = store.gc()
+    return {**stats, "state_bytes": os.path.getsize(path), "blobs_removed": collected["removed"]}
+
+
+def _resolve_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _resolve_value(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_resolve_value(v) for v in value]
+    if isinstance(value, str) and "[[blob:" in value:
+        nested = _nested_json(value)
+        if isinstance(nested, (dict, list)):
+            return json.dumps(_resolve_value(nested))
+        return resolve(value)
+    return value
+
+
+def read_state(path: str, lazy: bool = True) -> dict:
+    """
+    Load a Context dict. Every referenced blob must exist (MissingBlobError otherwise).
+    Args:
+        path (str): State file
+        lazy (bool): Keep the references until the messages are sent to the model (False: expand
+            them now, e.g. so the memory's token limit counts the real texts)
+    """
+    with open(path) as f:
+        ctx_dict = json.load(f)
+    store = store_for(path)  # known to the resolver
+    with open(path, "rb") as f:
+        missing = sorted({d.decode() for d in REFERENCE_BYTES.findall(f.read())} - store.digests())
+    if missing:
+        raise MissingBlobError(
+            f"{path} references {len(missing)} blobs missing from {store.path} (e.g. {missing[0][:12]}); "
+            f"the blob directory must be kept (and committed) together with the state file"
+        )
+    return ctx_dict if lazy else _resolve_value(ctx_dict)
+
+
+def _lookup(digest: str) -> Optional[str]:
+    with _stores_lock:
+        stores = list(_stores.values())
+    for store in stores:
+        text = store.get(digest)
+        if text is not None:
+            return text
+    return None
+
+
+def resolve(text: str) -> str:
+    """Text with every blob reference replaced by the stored content."""
+    if "[[blob:" not in text:
+        return text
+
+    def expand(match):
+        found = _lookup(match.group(1))
+        if found is None:
+            raise MissingBlobError(f"State blob {match.group(1)} not found in any blob store")
+        return found
+
+    return REFERENCE.sub(expand, text)
+
+
+# Resolution at the LLM boundary
+
+def resolve_request(request: httpx.Request) -> httpx.Request:
+    """The request with blob references in its JSON body expanded (the request itself if it has none)."""
+    if b"[[blob:" not in request.content:
+        return request
+
+    def expand(match):
+        found = _lookup(match.group(1).decode())
+        if found is None:
+            raise MissingBlobError(f"State blob {match.group(1).decode()} not found in any blob store")
+        # the reference sits inside a JSON string of the body: insert the text JSON-escaped
+        return json.dumps(found)[1:-1].encode("utf-8")
+
+    content = REFERENCE_BYTES.sub(expand, request.content)
+    headers = httpx.Headers(request.headers)
+    headers["content-length"] = str(len(content))
+    return httpx.Request(request.method, request.url, headers=headers, content=content, extensions=request.extensions)
+
+
+class BlobResolvingTransport(httpx.BaseTransport):
+    """Expands blob references of restored agent state in outgoing LLM requests."""
+
+    def __init__(self, transport: httpx.BaseTransport):
+        self._transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.read()
+        return self._transport.handle_request(resolve_request(request))
+
+
+class AsyncBlobResolvingTransport(httpx.AsyncBaseTransport):
+    """Async version of BlobResolvingTransport."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        return await self._transport.handle_async_request(resolve_request(request))
+
+
+# Command line
+
+def report(paths: List[str]) -> None:
+    for path in paths:
+        store = store_for(path)
+        with open(path, "rb") as f:
+            data = f.read()
+        references = REFERENCE_BYTES.findall(data)
+        distinct = set(references)
+        blob_bytes = sum(os.path.getsize(store._file(d.decode())) for d in distinct if os.path.exists(store._file(d.decode())))
+        print(f"{path}: {len(data) / 1024:.1f} KB, {len(references)} references to {len(distinct)} blobs "
+              f"({blob_bytes / 1024:.1f} KB in {store.path})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Blob storage of saved agent state")
+    parser.add_argument("command", choices=["migrate", "report", "gc"])
+    parser.add_argument("paths", nargs="+", help="State files (e.g. agent_state.json)")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        for path in args.paths:
+            before = os.path.getsize(path)
+            with open(path) as f:
+                stats = write_state(path, json.load(f))
+            print(f"{path}: {before / 1024:.1f} KB -> {stats['state_bytes'] / 1024:.1f} KB, "
+                  f"{stats['texts']} texts ({stats['chars'] / 1024:.1f} KB) moved to blobs")
+        report(args.paths)
+    elif args.command == "report":
+        report(args.paths)
+    else:
+        for path in args.paths:
+            store = store_for(path)
+            store.register(path)
+            print(f"{store.path}: {store.gc()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+# Local validation and repair of structured (JSON) task outputs
+#
+# The reconciliation task in script 8 must return a JSON object with a fixed set of keys.
+# A single malformed or incomplete model answer used to mean rerunning the whole LLM task.
+# json_schema_guardrail(Model, llm) returns a CrewAI task guardrail that, driven by a
+# pydantic model declaring the expected output:
+# 1. repairs common problems locally - ``` fences, text before/after the object, trailing
+#    commas, Python-style quotes/literals, answers cut off mid-object, wrong types (a string
+#    where a list is expected: one item, or one per line / bullet / ";" - never split on commas,
+#    "Acme, Inc." is one value; "none" for an empty list, ...) and missing keys inside list items
+# 2. asks the model again ONLY for the top-level keys that are still missing, with the
+#    partial answer as context, instead of regenerating the whole document
+# 3. fills anything still missing with empty defaults, so the task never needs a full retry
+#    unless the answer contains no JSON object at all, or a value the repairs cannot fix
+#    (e.g. a Literal / enum field with another value): then the guardrail asks for a retry
+# `repair_stats` counts local repairs, partial re-asks (and the failed ones) and full retries.
+
+import ast
+import json
+import re
+from typing import Any, List, Optional, Tuple, Type, Union, get_args, get_origin
+
+from pydantic import BaseModel, ValidationError
+
+repair_stats = {"valid": 0, "repaired_locally": 0, "partial_reasks": 0, "failed_reasks": 0, "full_retries": 0}
+CLOSING = {"{": "}", "[": "]"}
+# Strings a model writes instead of an empty list ("discrepancies": "none")
+NULL_STRINGS = {"", "none", "n/a", "na", "null", "nil", "-", "no", "[]"}
+LIST_ITEM = re.compile(r"^\s*(?:[-*\u2022]|\d+[.)])\s+")
+
+
+def extract_json_object(text: str) -> Optional[str]:
+    """
+    Return the first balanced {...} block in text, ignoring fences and surrounding prose.
+    A block cut off mid-answer is completed: an open string is closed, a dangling key or comma
+    dropped and the open brackets closed in order (e.g. {"a": ["x"], "b": [ -> {"a": ["x"], "b": []}).
+    """
+    text = re.sub(r"```(?:json)?", "", text)
+    start = text.find("{")
+    if start == -1:
+        return None
+    stack, in_string, escape, quote = [], False, False, ""
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == quote:
+                in_string = False
+        elif ch in "\"'":
+            in_string, quote = True, ch
+        elif ch in "{[":
+            stack.append(ch)
+        elif ch in "}]" and stack and CLOSING[stack[-1]] == ch:
+            stack.pop()
+            if not stack:
+                return text[start:i + 1]
+    # Unterminated object (answer was cut off): close the string and the open brackets
+    block = text[start:-1] if in_string and escape else text[start:]
+    block += quote if in_string else ""
+    block = re.sub(r"\s*(?:\"(?:[^\"\\]|\\.)*\"|'(?:[^'\\]|\\.)*')\s*:\s*$", "", block)
+    block = re.sub(r",\s*$", "", block)
+    return block + "".join(CLOSING[bracket] for bracket in reversed(stack))
+
+
+def parse_lenient(text: str) -> Optional[dict]:
+    """Parse JSON, tolerating trailing commas and Python-style literals."""
+    block = extract_json_object(text)
+    if block is None:
+        return None
+    for candidate in (block, re.sub(r",\s*([}\]])", r"\1", block)):
+        try:
+            value = json.loads(candidate)
+            return value if isinstance(value, dict) else None
+        except json.JSONDecodeError:
+            pass
+        try:
+            value = ast.literal_eval(candidate)
+            return value if isinstance(value, dict) else None
+        except (ValueError, SyntaxError):
+            pass
+    return None
+
+
+def _empty(annotation) -> Any:
+    origin = get_origin(annotation)
+    if origin in (list, List):
+        return []
+    if origin is Union:
+        return None
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return {name: _empty(field.annotation) for name, field in annotation.model_fields.items()}
+    if annotation in (int, float):
+        return 0
+    if annotation is bool:
+        return False
+    return ""
+
+
+def _split_list(text: str) -> List[str]:
+    """Items of a string that is written as a list (JSON list, lines, bullets, ";"), else [text]."""
+    if text.strip().startswith("["):
+        items = parse_lenient("{\"items\": " + text.strip() + "}")
+        if items and isinstance(items.get("items"), list):
+            return [str(item) for item in items["items"]]
+    for separator in ("\n", ";"):
+        if separator in text.strip():
+            return [LIST_ITEM.sub("", item).strip() for item in text.split(separator) if LIST_ITEM.sub("", item).strip()]
+    return [LIST_ITEM.sub("", text).strip()]
+
+
+def coerce(value: Any, annotation) -> Any:
+    """Best-effort conversion of value to the declared type."""
+    origin = get_origin(annotation)
+    if origin is Union:
+        options = [a for a in get_args(annotation) if a is not type(None)]
+        return None if value is None else coerce(value, options[0])
+    if origin in (list, List):
+        (item_type,) = get_args(annotation) or (Any,)
+        if value is None or (isinstance(value, str) and value.strip().strip(".").lower() in NULL_STRINGS):
+            return []
+        if isinstance(value, str):
+            value = _split_list(value) if item_type is str else [value]
+        elif not isinstance(value, list):
+            value = [value]
+        return [coerce(item, item_type) for item in value]
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        if not isinstance(value, dict):
+            value = {}
+        return {
+            name: coerce(value[name], field.annotation) if name in value else _empty(field.annotation)
+            for name, field in annotation.model_fields.items()
+        }
+    if annotation is str:
+        if value is None:
+            return ""
+        if isinstance(value, list):
+            return ", ".join(str(v) for v in value)
+        return value if isinstance(value, str) else json.dumps(value) if isinstance(value, dict) else str(value)
+    if annotation in (int, float):
+        try:
+            return annotation(re.sub(r"[^0-9.\-]", "", str(value)) or 0)
+        except ValueError:
+            return 0
+    return value
+
+
+def repair(data: dict, model: Type[BaseModel]) -> Tuple[dict, List[str]]:
+    """
+    Coerce every present key to its declared type.
+    Returns:
+        (repaired data, list of top-level keys that are missing)
+    """
+    repaired, missing = {}, []
+    for name, field in model.model_fields.items():
+        if name in data:
+            repaired[name] = coerce(data[name], field.annotation)
+        else:
+            missing.append(name)
+    return repaired, missing
+
+
+def ask_for_missing(llm, model: Type[BaseModel], missing: List[str], partial: dict, task_description: str) -> dict:
+    """Ask the model for the missing top-level keys only."""
+    schema = model.model_json_schema()
+    wanted = {name: schema["properties"][name] for name in missing}
+    prompt = (
+        f"You are completing a partially generated JSON answer for this task:\n{task_description}\n\n"
+        f"Partial answer (do not repeat it):\n{json.dumps(partial, indent=2)}\n\n"
+        f"Return ONLY a JSON object with these keys: {', '.join(missing)}.\n"
+        f"JSON schema of the keys:\n{json.dumps(wanted, indent=2)}\n"
+        f"Definitions:\n{json.dumps(schema.get('$defs', {}), indent=2)}"
+    )
+    answer = llm.call(prompt)
+    return parse_lenient(str(answer)) or {}
+
+
+def validate_and_repair(text: str, model: Type[BaseModel], llm=None, task_description: str = "") -> Optional[BaseModel]:
+    """
+    Turn a raw model answer into an instance of model, repairing it locally where possible.
+    Returns None when the answer has no JSON object at all.
+    Raises:
+        ValidationError: The repaired answer still does not match model (e.g. a Literal field)
+    """
+    try:
+        result = model.model_validate_json(text)
+        repair_stats["valid"] += 1
+        return result
+    except ValidationError:
+        pass
+
+    data = parse_lenient(text)
+    if data is None:
+        return None
+    repaired, missing = repair(data, model)
+
+    if missing and llm is not None:
+        repair_stats["partial_reasks"] += 1
+        try:
+            extra, _ = repair(ask_for_missing(llm, model, missing, repaired, task_description), model)
+        except Exception:
+            repair_stats["failed_reasks"] += 1
+            extra = {}
+        repaired.update({key: value for key, value in extra.items() if key in missing})
+        missing = [key for key in missing if key not in repaired]
+
+    for name in missing:
+        repaired[name] = _empty(model.model_fields[name].annotation)
+    result = model.model_validate(repaired)  # ValidationError: a value the repairs cannot fix
+    repair_stats["repaired_locally"] += 1
+    return result
+
+
+def json_schema_guardrail(model: Type[BaseModel], llm=None):
+    """
+    Build a CrewAI task guardrail that validates/repairs the task output against model.
+    Args:
+        model: pydantic model declaring the expected JSON object
+        llm: LLM used to ask for missing keys (optional)
+    Returns:
+        Callable[[TaskOutput], Tuple[bool, Any]]
+    """
+
+    def guardrail(output) -> Tuple[bool, Any]:
+        try:
+            result = validate_and_repair(output.raw, model, llm, output.description)
+        except ValidationError as e:
+            repair_stats["full_retries"] += 1
+            problems = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            return False, f"The JSON answer does not match the required schema ({problems})"
+        if result is None:
+            repair_stats["full_retries"] += 1
+            return False, f"The answer must be a single JSON object with keys: {', '.join(model.model_fields)}"
+        return True, result.model_dump_json(indent=2)
+
+    return guardrail
@@ -0,0 +1,7 @@
+import os
+
+# No telemetry or metrics files from the libraries the tests construct (as in benchmarks/run.py)
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+os.environ.setdefault("METRICS_FILE", os.devnull)
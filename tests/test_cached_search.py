@@ -0,0 +1,16 @@
+from cached_search import OfflineSearchBackend, is_cacheable
+
+
+def test_real_results_are_cacheable():
+    assert is_cacheable(OfflineSearchBackend().search("ev sector outlook"))
+    assert is_cacheable({"searchParameters": {"q": "x"}, "news": [{"title": "t"}]})
+    assert is_cacheable("Some search result text")
+
+
+def test_errors_and_empty_results_are_not_cacheable():
+    assert not is_cacheable(None)
+    assert not is_cacheable({})
+    assert not is_cacheable({"searchParameters": {"q": "x"}, "organic": [], "credits": 1})
+    assert not is_cacheable({"message": "Unauthorized.", "statusCode": 403})
+    assert not is_cacheable("Search failed: Error occurred during web search: timeout")
+    assert not is_cacheable("Error: rate limited")
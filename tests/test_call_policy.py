@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+import pytest
+
+import call_policy
+from call_policy import DeadlineExceeded, call_with_policy, cap_timeouts, configure, policy_report, remaining, turn_budget
+
+
+class FakeCall:
+    """Async call whose n-th request takes delays[n] seconds; records cancelled requests."""
+
+    def __init__(self, *delays):
+        self.delays = list(delays)
+        self.started = 0
+        self.cancelled = []
+
+    async def __call__(self, query):
+        attempt = self.started
+        self.started += 1
+        try:
+            await asyncio.sleep(self.delays[min(attempt, len(self.delays) - 1)])
+        except asyncio.CancelledError:
+            self.cancelled.append(attempt)
+            raise
+        return f"{query} #{attempt}"
+
+
+def test_tools_are_not_hedged_by_default():
+    assert not call_policy.policy_for("tavily_search").hedge
+    assert not call_policy.policy_for("grounded_search").hedge
+
+
+def test_turn_budget_follows_the_turn_into_tasks_and_requests():
+    async def step():
+        await asyncio.sleep(0)
+        return remaining()
+
+    async def turn():
+        with turn_budget(5):
+            # a task created inside the turn (e.g. a workflow step) sees the same deadline
+            left = await asyncio.ensure_future(step())
+            with turn_budget(60):  # a nested budget cannot extend the turn
+                nested = remaining()
+            return left, nested, cap_timeouts({"timeout": {"connect": 30.0, "read": None}})
+
+    left, nested, extensions = asyncio.run(turn())
+    assert 4 < left <= 5 and nested <= 5
+    assert extensions["timeout"]["connect"] <= 5 and extensions["timeout"]["read"] <= 5
+    assert remaining() is None
+
+
+def test_calls_are_cut_at_the_end_of_the_turn():
+    configure("test_deadline", timeout_s=30.0)
+    slow = FakeCall(5.0)
+
+    async def turn():
+        with turn_budget(0.1):
+            await call_with_policy("test_deadline", slow, "q")
+
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(turn())
+    assert time.monotonic() - start < 1.0 and slow.cancelled == [0]
+
+
+def test_hedged_request_wins_and_the_loser_is_abandoned():
+    configure("test_hedge", hedge=True, control=0.0, hedge_delay_s=0.05, timeout_s=5.0)
+    call = FakeCall(2.0, 0.01)
+
+    start = time.monotonic()
+    assert asyncio.run(call_with_policy("test_hedge", call, "q")) == "q #1"
+    assert time.monotonic() - start < 1.0
+    assert call.started == 2 and call.cancelled == [0]
+    report = policy_report()["test_hedge"]
+    assert report["hedges"] == report["hedge_wins"] == report["abandoned"] == 1
+    assert report["extra_load"] == 1.0
+
+
+def test_control_arm_is_never_hedged():
+    configure("test_control", hedge=True, control=1.0, hedge_delay_s=0.01, timeout_s=5.0)
+    call = FakeCall(0.1)
+
+    assert asyncio.run(call_with_policy("test_control", call, "q")) == "q #0"
+    assert call.started == 1
+    report = policy_report()["test_control"]
+    assert report["hedges"] == 0 and "control_p99_s" in report
+
+
+def test_failed_primary_falls_back_to_the_hedge():
+    configure("test_failure", hedge=True, control=0.0, hedge_delay_s=0.01, timeout_s=5.0)
+    attempts = []
+
+    async def flaky(query):
+        attempts.append(query)
+        await asyncio.sleep(0.05)
+        if len(attempts) == 1:
+            raise ConnectionError("reset")
+        return "ok"
+
+    assert asyncio.run(call_with_policy("test_failure", flaky, "q")) == "ok"
+    assert len(attempts) == 2
@@ -0,0 +1,93 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import context_cache
+from context_cache import AsyncContextCachingTransport, ContextCachingTransport, LocalGeminiBackend
+
+URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent"
+SYSTEM = {"parts": [{"text": "You are a helpful assistant. " * 200}]}
+
+
+def _generate(message: str) -> httpx.Request:
+    return httpx.Request("POST", URL, headers={"x-goog-api-key": "test"}, json={
+        "systemInstruction": SYSTEM,
+        "contents": [{"role": "user", "parts": [{"text": message}]}],
+    })
+
+
+def _send(transport: httpx.BaseTransport, message: str) -> dict:
+    response = transport.handle_request(_generate(message))
+    body = json.loads(response.read())
+    response.close()
+    return body
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setenv("CONTEXT_CACHE_MIN_TOKENS", "0")
+    context_cache.cache.reset()
+    yield
+    context_cache.cache.reset()
+
+
+def test_stable_prefix_is_cached_after_two_uses():
+    backend = LocalGeminiBackend(base_s=0, per_token_s=0)
+    transport = ContextCachingTransport(backend)
+
+    first = _send(transport, "hello")
+    _send(transport, "what is 3 + 4?")
+    third = _send(transport, "and the weather?")
+
+    assert backend.requests == {"generate": 3, "cache_create": 1}
+    assert "cachedContentTokenCount" not in first["usageMetadata"]
+    assert third["usageMetadata"]["cachedContentTokenCount"] > 0
+    stats = context_cache.cache.stats()["gemini-2.5-flash"]
+    assert stats["requests"] == 3 and stats["cached_requests"] == 2
+    assert stats["explicit_tokens"] == backend.totals["cached_tokens"]
+
+
+def test_prefix_below_the_minimum_is_not_retried_per_request():
+    backend = LocalGeminiBackend(base_s=0, per_token_s=0, min_tokens=10**6)
+    transport = ContextCachingTransport(backend)
+
+    for message in ("one", "two", "three", "four"):
+        assert _send(transport, message)["candidates"]
+
+    assert backend.requests == {"generate": 4, "cache_create": 1}
+    assert backend.totals["cached_tokens"] == 0
+
+
+def test_expired_cache_falls_back_to_the_full_request():
+    backend = LocalGeminiBackend(base_s=0, per_token_s=0)
+    transport = ContextCachingTransport(backend)
+    _send(transport, "one")
+    _send(transport, "two")
+    backend.caches.clear()  # deleted / expired on the server
+
+    answer = _send(transport, "three")
+
+    assert answer["candidates"] and "cachedContentTokenCount" not in answer["usageMetadata"]
+    assert backend.requests["generate"] == 4  # the rejected cached request + the original one
+
+
+def test_async_requests_share_the_cache():
+    from llm_factory import PooledAsyncTransport
+
+    backend = LocalGeminiBackend(base_s=0, per_token_s=0)
+    transport = AsyncContextCachingTransport(PooledAsyncTransport(backend))
+
+    async def send(message):
+        response = await transport.handle_async_request(_generate(message))
+        body = json.loads(await response.aread())
+        await response.aclose()
+        return body
+
+    async def turns():
+        return [await send(message) for message in ("one", "two", "three")]
+
+    answers = asyncio.run(turns())
+    assert answers[-1]["usageMetadata"]["cachedContentTokenCount"] > 0
+    assert backend.requests["cache_create"] == 1
@@ -0,0 +1,54 @@
+import os
+import sqlite3
+
+import chromadb
+import pytest
+
+import db_maintenance
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = str(tmp_path / "db")
+    collection = chromadb.PersistentClient(path=path).create_collection("docs", embedding_function=None)
+    collection.add(
+        ids=[f"id{i}" for i in range(300)],
+        embeddings=[[float(i), 1.0, 2.0] for i in range(300)],
+        documents=[f"doc {i}" for i in range(300)],
+    )
+    conn = sqlite3.connect(os.path.join(path, "chroma.sqlite3"))
+    with conn:
+        conn.execute("UPDATE embeddings SET created_at = '2020-01-01 00:00:00'")
+    conn.close()
+    collection.delete(ids=[f"id{i}" for i in range(150)])
+    return path
+
+
+def test_compact_keeps_rows_and_write_times(store):
+    db_maintenance.compact(store, force=True)
+
+    [stats] = db_maintenance.collection_stats(store)
+    assert stats["name"] == "docs"
+    assert stats["count"] == 150
+    assert stats["last_write"] == "2020-01-01 00:00:00"
+    collection = chromadb.PersistentClient(path=store).get_collection("docs", embedding_function=None)
+    assert collection.get(ids=["id200"])["documents"] == ["doc 200"]
+
+
+def test_compact_failure_leaves_collection_untouched(store, monkeypatch):
+    def fail(self, *args, **kwargs):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(chromadb.api.models.Collection.Collection, "add", fail)
+    with pytest.raises(RuntimeError):
+        db_maintenance.compact(store, force=True)
+
+    names = [c.name for c in chromadb.PersistentClient(path=store).list_collections()]
+    assert names == ["docs"]
+    assert db_maintenance.collection_stats(store)[0]["count"] == 150
+
+
+def test_bench_does_not_change_the_store(store):
+    size = db_maintenance.dir_size(store)
+    db_maintenance.bench(store, db_maintenance.fixed_query_set(store), repeats=1)
+    assert db_maintenance.dir_size(store) == size
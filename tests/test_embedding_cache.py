@@ -0,0 +1,147 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from embedding_cache import CachedBatchEmbedder, batch_memory_writes
+
+
+class FakeBackend:
+    def __init__(self, task_type="RETRIEVAL_DOCUMENT", fail=False, gate=None):
+        self.model, self.task_type = "models/test-embedding", task_type
+        self.fail, self.gate = fail, gate
+        self.calls = []
+
+    def embed(self, texts):
+        self.calls.append(list(texts))
+        if self.gate is not None and len(self.calls) == 1:
+            self.gate.wait(5)
+        if self.fail:
+            raise RuntimeError("quota exceeded")
+        return [[float(len(text)), 1.0 if self.task_type == "RETRIEVAL_QUERY" else 0.0] for text in texts]
+
+
+class FakeStorage:
+    def __init__(self):
+        self.type = "short_term"
+        self.added = []
+        self.collection = SimpleNamespace(add=lambda **kwargs: self.added.append(kwargs))
+        self.searched = []
+
+    def save(self, value, metadata):
+        raise AssertionError("saves must be queued")
+
+    def search(self, query, limit=3, score_threshold=0.35):
+        self.searched.append(query)
+        return []
+
+
+def lists(vectors):
+    return [[float(v) for v in vector] for vector in vectors]
+
+
+@pytest.fixture
+def make_embedder(tmp_path):
+    def make(backend, **kwargs):
+        return CachedBatchEmbedder(backend, cache_file=str(tmp_path / "embeddings.sqlite3"), **kwargs)
+    return make
+
+
+def test_lone_caller_is_sent_without_waiting(make_embedder):
+    backend = FakeBackend()
+    embedder = make_embedder(backend, max_wait_s=2.0)
+
+    start = time.perf_counter()
+    assert lists(embedder(["abc", "de"])) == [[3.0, 0.0], [2.0, 0.0]]
+    assert time.perf_counter() - start < 1.0
+    assert backend.calls == [["abc", "de"]]
+
+
+def test_concurrent_callers_share_a_batch(make_embedder):
+    gate = threading.Event()
+    backend = FakeBackend(gate=gate)
+    embedder = make_embedder(backend, max_wait_s=0.5)
+    results = {}
+    threads = [threading.Thread(target=lambda i=i: results.update({i: lists(embedder([f"text {i}" * (i + 1)]))}))
+               for i in range(10)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while (not backend.calls or embedder._pending.qsize() + len(backend.calls[0]) < 10) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    gate.set()
+    for thread in threads:
+        thread.join(5)
+
+    # the first batch blocks; everything queued meanwhile goes out in one more request
+    assert len(backend.calls) == 2 and sum(map(len, backend.calls)) == 10
+    assert all(results[i] == [[float(len(f"text {i}" * (i + 1))), 0.0]] for i in range(10))
+
+
+def test_cached_vectors_need_no_network(make_embedder):
+    make_embedder(FakeBackend())(["hello", "world"])
+    offline = FakeBackend(fail=True)
+
+    embedder = make_embedder(offline)
+    assert lists(embedder(["world", "hello", "world"])) == [[5.0, 0.0]] * 3
+    assert offline.calls == [] and embedder.stats["cache_hits"] == 3
+
+
+def test_backend_errors_reach_every_caller(make_embedder):
+    backend = FakeBackend(fail=True)
+    embedder = make_embedder(backend)
+
+    with pytest.raises(RuntimeError, match="quota"):
+        embedder(["a", "b"])
+    backend.fail = False  # the worker survives the failed batch
+    assert lists(embedder(["a"])) == [[1.0, 0.0]]
+
+
+def test_memory_writes_are_batched_and_searched_as_queries(make_embedder):
+    documents, queries = FakeBackend(), FakeBackend(task_type="RETRIEVAL_QUERY")
+    embedder = make_embedder(documents, query_backend=queries, write_delay_s=60)
+    storage = FakeStorage()
+    callbacks = []
+    crew = SimpleNamespace(
+        embedder={"provider": "custom", "config": {"embedder": embedder}},
+        _short_term_memory=SimpleNamespace(storage=storage),
+        task_callback=callbacks.append,
+    )
+    assert batch_memory_writes(crew) is embedder
+
+    for i in range(10):
+        storage.save(f"memory {i}", {"agent": "researcher"})
+    assert storage.added == [] and documents.calls == []
+
+    crew.task_callback("task output")  # end of a task
+    assert callbacks == ["task output"]
+    assert len(documents.calls) == 1 and len(storage.added[0]["documents"]) == 10
+    assert lists(storage.added[0]["embeddings"])[0] == [8.0, 0.0]
+
+    storage.save("late memory", {})
+    storage.search("what is the revenue outlook?")
+    assert len(storage.added) == 2  # flushed before the search
+    assert storage.added[1]["metadatas"] == [None]
+    assert storage.searched == ["what is the revenue outlook?"]
+
+
+def test_query_embeddings_use_the_query_task_type(make_embedder):
+    documents, queries = FakeBackend(), FakeBackend(task_type="RETRIEVAL_QUERY")
+    embedder = make_embedder(documents, query_backend=queries)
+
+    with embedder.searching():
+        assert lists(embedder(["revenue"])) == [[7.0, 1.0]]
+    assert lists(embedder(["revenue"])) == [[7.0, 0.0]]
+    assert queries.calls == [["revenue"]] and documents.calls == [["revenue"]]
+
+
+def test_writes_are_flushed_after_the_delay(make_embedder):
+    embedder = make_embedder(FakeBackend(), write_delay_s=0.05)
+    storage = FakeStorage()
+    embedder.queue_write(storage, "remember this", None)
+
+    deadline = time.monotonic() + 5
+    while not storage.added and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert storage.added[0]["documents"] == ["remember this"]
@@ -0,0 +1,162 @@
+import asyncio
+
+import pytest
+
+from cached_search import normalize_query
+from fast_path import FastPath, parse_arithmetic
+
+
+@pytest.mark.parametrize("message, expression", [
+    ("What is 3 + 4?", "3 + 4"),
+    ("what's 12.5+30", "12.5+30"),
+    ("sum of 3 and 4", "3 + 4"),
+    ("3 plus 4 times 2", "3 + 4 * 2"),
+    ("calculate (2 + 3) / 5", "(2 + 3) / 5"),
+    ("what is 10 - 3", "10 - 3"),
+    ("what is 10-3", "10-3"),
+    ("what is 2025 - 10 - 19", "2025 - 10 - 19"),
+])
+def test_arithmetic_is_recognized(message, expression):
+    assert parse_arithmetic(message) == expression
+
+
+@pytest.mark.parametrize("message", [
+    "what is 2025-10-19",
+    "what is 10/19/2025",
+    "call 555-123-4567",
+    "what is 42",
+    "what is the weather in Paris",
+    "what is 3 + x",
+])
+def test_other_messages_are_not_arithmetic(message):
+    assert parse_arithmetic(message) is None
+
+
+def test_sums_use_the_agent_add_tool():
+    calls = []
+
+    def add(a, b):
+        calls.append((a, b))
+        return a + b
+
+    fast_path = FastPath(agent=None, add=add)
+    assert asyncio.run(fast_path.run("What is 3 + 4?")) == "3 + 4 = 7"
+    assert asyncio.run(fast_path.run("what is 2 * 3 + 1")) == "2 * 3 + 1 = 7"
+    assert calls == [(3.0, 4.0)]
+    assert fast_path.stats()["arithmetic"] == 2
+
+
+def test_normalization_keeps_word_order():
+    assert normalize_query("Flights from Paris to London?") == normalize_query("flights  from paris, to london")
+    assert normalize_query("flights from Paris to London") != normalize_query("flights from London to Paris")
+    assert normalize_query("Gemini 2.5 pricing") == "gemini 2.5 pricing"
+
+
+class FakeHandler:
+    """What agent.run returns: streams the turn's events and awaits to the response."""
+
+    def __init__(self, events, response):
+        self.events, self.response = events, response
+
+    async def stream_events(self):
+        for event in self.events:
+            yield event
+
+    def __await__(self):
+        async def response():
+            return self.response
+        return response().__await__()
+
+
+class FakeAgent:
+    def __init__(self, *tool_calls):
+        from llama_index.core.llms import MockLLM
+
+        self.llm = MockLLM()
+        self.tool_calls = tool_calls
+        self.messages = []
+
+    def run(self, user_msg, ctx=None):
+        from llama_index.core.agent.workflow import ToolCallResult
+        from llama_index.core.tools import ToolOutput
+
+        self.messages.append(user_msg)
+        events = [
+            ToolCallResult(tool_name=name, tool_kwargs={"query": query}, tool_id=str(i), return_direct=False,
+                           tool_output=ToolOutput(content="results", tool_name=name, raw_input={}, raw_output=None))
+            for i, (name, query) in enumerate(self.tool_calls)
+        ]
+        return FakeHandler(events, f"answer {len(self.messages)}")
+
+
+class FakeSearch:
+    def __init__(self):
+        self.cached = set()
+
+    def peek(self, query):
+        return query in self.cached
+
+
+class FakeStore:
+    def __init__(self):
+        self.values = {}
+
+    async def get(self, key, default=None):
+        return self.values.get(key, default)
+
+    async def set(self, key, value):
+        self.values[key] = value
+
+
+def search_turns(*tool_calls):
+    search = FakeSearch()
+    agent = FakeAgent(*tool_calls)
+    return FastPath(agent, search=search), agent, search
+
+
+def test_search_only_turn_is_replayed_while_its_searches_are_cached():
+    fast_path, agent, search = search_turns(("search_web", "weather paris"))
+    search.cached.add("weather paris")
+
+    assert asyncio.run(fast_path.run("What is the weather in Paris?")) == "answer 1"
+    assert asyncio.run(fast_path.run("what is the weather in paris")) == "answer 1"
+    assert agent.messages == ["What is the weather in Paris?"]
+
+    search.cached.clear()  # the search results expired: so does the answer
+    assert asyncio.run(fast_path.run("What is the weather in Paris?")) == "answer 2"
+    assert fast_path.stats()["cached_search"] == 1 and fast_path.stats()["agent"] == 2
+
+
+def test_turns_with_other_tools_are_not_replayed():
+    fast_path, agent, search = search_turns(("search_web", "ev sales"), ("add_two_numbers", ""))
+    search.cached.add("ev sales")
+
+    asyncio.run(fast_path.run("How many EVs were sold in 2024?"))
+    asyncio.run(fast_path.run("How many EVs were sold in 2024?"))
+    assert len(agent.messages) == 2
+
+
+@pytest.mark.parametrize("message", ["And tomorrow?", "What about that one?", "Is it raining there?"])
+def test_context_dependent_messages_are_never_replayed(message):
+    fast_path, agent, search = search_turns(("search_web", "weather"))
+    search.cached.add("weather")
+
+    asyncio.run(fast_path.run(message))
+    asyncio.run(fast_path.run(message))
+    assert agent.messages == [message, message] and fast_path._answers == {}
+
+
+def test_local_answers_are_added_to_the_context_memory():
+    fast_path, agent, search = search_turns(("search_web", "weather paris"))
+    search.cached.add("weather paris")
+    ctx = type("Ctx", (), {"store": FakeStore()})()
+
+    asyncio.run(fast_path.run("What is the weather in Paris?", ctx=ctx))
+    asyncio.run(fast_path.run("What is the weather in Paris?", ctx=ctx))
+    asyncio.run(fast_path.run("What is 3 + 4?", ctx=ctx))
+
+    messages = asyncio.run(ctx.store.values["memory"].aget_all())
+    assert [(m.role.value, m.content) for m in messages] == [
+        ("user", "What is the weather in Paris?"), ("assistant", "answer 1"),
+        ("user", "What is 3 + 4?"), ("assistant", "3 + 4 = 7"),
+    ]
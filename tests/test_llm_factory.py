@@ -0,0 +1,115 @@
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+import llm_factory
+from call_policy import turn_budget
+from llm_factory import PooledAsyncTransport
+
+URL = "https://generativelanguage.googleapis.com/v1beta/models/test-model:generateContent"
+
+
+class Chunks(httpx.SyncByteStream):
+    """Sync response body that records the threads reading it and whether it was closed."""
+
+    def __init__(self, *chunks):
+        self.chunks = chunks
+        self.threads = set()
+        self.closed = threading.Event()
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.threads.add(threading.get_ident())
+            yield chunk
+
+    def close(self) -> None:
+        self.closed.set()
+
+
+def test_one_pool_serves_several_event_loops():
+    threads = []
+
+    def handle(request):
+        threads.append(threading.get_ident())
+        return httpx.Response(200, json={"echo": request.content.decode()})
+
+    transport = PooledAsyncTransport(httpx.MockTransport(handle))
+
+    async def send(text):
+        async with httpx.AsyncClient(transport=transport) as client:
+            return (await client.post(URL, content=text)).json()
+
+    assert [asyncio.run(send(f"loop {i}")) for i in range(3)] == [{"echo": f"loop {i}"} for i in range(3)]
+    # sent from worker threads, never on the event loop's thread
+    assert len(threads) == 3 and threading.get_ident() not in threads
+
+
+def test_response_is_streamed_chunk_by_chunk():
+    body = Chunks(b"data: 1\n\n", b"data: 2\n\n", b"data: 3\n\n")
+    transport = PooledAsyncTransport(httpx.MockTransport(lambda request: httpx.Response(200, stream=body)))
+
+    async def stream():
+        async with httpx.AsyncClient(transport=transport) as client:
+            async with client.stream("POST", URL, content=b"{}") as response:
+                return [chunk async for chunk in response.aiter_raw()]
+
+    assert asyncio.run(stream()) == [b"data: 1\n\n", b"data: 2\n\n", b"data: 3\n\n"]
+    assert body.closed.is_set() and threading.get_ident() not in body.threads
+
+
+def test_cancelled_request_finishes_and_is_closed():
+    release, started = threading.Event(), threading.Event()
+    body = Chunks(b"late")
+
+    def handle(request):
+        started.set()
+        release.wait(5)
+        return httpx.Response(200, stream=body)
+
+    transport = PooledAsyncTransport(httpx.MockTransport(handle))
+
+    async def cancel():
+        async with httpx.AsyncClient(transport=transport) as client:
+            request = asyncio.ensure_future(client.post(URL, content=b"{}"))
+            await asyncio.to_thread(started.wait, 5)
+            request.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await request
+            release.set()  # the request on the wire completes after the caller gave up
+
+    asyncio.run(cancel())
+    assert body.closed.wait(5)  # its response is closed, so the connection goes back to the pool
+
+
+def test_request_timeouts_are_capped_by_the_turn_budget():
+    timeouts = []
+
+    def handle(request):
+        timeouts.append(request.extensions["timeout"])
+        return httpx.Response(200)
+
+    transport = PooledAsyncTransport(httpx.MockTransport(handle))
+
+    async def send():
+        async with httpx.AsyncClient(transport=transport, timeout=60.0) as client:
+            with turn_budget(5):
+                await client.post(URL, content=b"{}")
+
+    asyncio.run(send())
+    assert all(0 < value <= 5 for value in timeouts[0].values())
+
+
+def test_failed_warmup_is_counted(monkeypatch):
+    def unreachable():
+        raise httpx.ConnectError("no route to host")
+
+    monkeypatch.setattr(llm_factory, "_warmed", set())
+    monkeypatch.setattr(llm_factory, "genai_client", unreachable)
+    llm_factory.warmup("gemini/test-warmup-model")
+    llm_factory.warmup("test-warmup-model")  # once per model
+
+    samples = {labels["status"]: value for labels, value in llm_factory.WARMUPS.samples()
+               if labels["model"] == "test-warmup-model"}
+    assert samples == {"error": 1}
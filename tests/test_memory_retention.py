@@ -0,0 +1,146 @@
+import sqlite3
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from chromadb.api.types import Documents, EmbeddingFunction
+
+import memory_retention
+from memory_retention import KickoffGuard, MemoryRetention, RetentionPolicy
+
+
+class LengthEmbedding(EmbeddingFunction[Documents]):
+    def __call__(self, input: Documents):
+        return [[float(len(text)), 1.0] for text in input]
+
+
+@pytest.fixture
+def stores(tmp_path):
+    from crewai.memory.storage.ltm_sqlite_storage import LTMSQLiteStorage
+    from crewai.memory.storage.rag_storage import RAGStorage
+
+    short_term = RAGStorage(
+        type="short_term", path=str(tmp_path / "short_term"),
+        embedder_config={"provider": "custom", "config": {"embedder": LengthEmbedding()}},
+    )
+    long_term = LTMSQLiteStorage(db_path=str(tmp_path / "long_term.db"))
+    crew = SimpleNamespace(_short_term_memory=SimpleNamespace(storage=short_term),
+                           _long_term_memory=SimpleNamespace(storage=long_term))
+    return crew, short_term, long_term, str(tmp_path / "access.sqlite3")
+
+
+def _age(storage, entry_ids, created_at="2000-01-01 00:00:00"):
+    conn = sqlite3.connect(f"{storage.path}/chroma.sqlite3")
+    conn.executemany("UPDATE embeddings SET created_at = ? WHERE embedding_id = ?", [(created_at, i) for i in entry_ids])
+    conn.commit()
+    conn.close()
+
+
+def _ids(storage):
+    data = storage.collection.get()
+    return dict(zip(data["documents"], data["ids"]))
+
+
+def test_cap_evicts_the_least_accessed_entries(stores):
+    crew, short_term, _, access_db = stores
+    for text in ("alpha", "beta", "gamma", "delta", "epsilon"):
+        short_term.save(text, {"agent": "researcher"})
+    policy = RetentionPolicy(max_entries={"short_term": 3})
+    retention = MemoryRetention(crew, policy=policy, access_db=access_db)
+    ids = _ids(short_term)
+    retention._record_access("short_term", [ids["alpha"], ids["beta"], ids["gamma"]], 0.001)
+
+    assert retention.compact()["short_term"] == 2
+    assert sorted(_ids(short_term)) == ["alpha", "beta", "gamma"]
+
+
+def test_old_entries_are_evicted_unless_retrieved_often(stores):
+    crew, short_term, _, access_db = stores
+    for text in ("old and unused", "old but popular", "fresh"):
+        short_term.save(text, {"agent": "researcher"})
+    ids = _ids(short_term)
+    _age(short_term, [ids["old and unused"], ids["old but popular"]])
+    retention = MemoryRetention(crew, policy=RetentionPolicy(keep_if_accessed=2), access_db=access_db)
+    for _ in range(2):
+        retention._record_access("short_term", [ids["old but popular"]], 0.001)
+
+    retention.compact()
+    assert sorted(_ids(short_term)) == ["fresh", "old but popular"]
+
+
+def test_duplicates_merge_into_the_newest_copy(stores):
+    crew, short_term, _, access_db = stores
+    short_term.save("the same fact", {"agent": "researcher"})
+    short_term.save("the same fact", {"agent": "researcher"})
+    older, newer = short_term.collection.get()["ids"]
+    _age(short_term, [older], "2025-01-01 00:00:00")
+    retention = MemoryRetention(crew, access_db=access_db)
+    retention._record_access("short_term", [older, older], 0.001)
+    retention._record_access("short_term", [newer], 0.001)
+
+    retention.compact()
+    assert short_term.collection.get()["ids"] == [newer]
+    assert retention._access_counts("short_term") == {newer: 3}
+
+
+def test_searches_are_counted(stores):
+    crew, short_term, _, access_db = stores
+    short_term.save("revenue outlook", {"agent": "researcher"})
+    retention = MemoryRetention(crew, access_db=access_db)
+
+    results = short_term.search("revenue outlook", score_threshold=0)
+    assert retention._access_counts("short_term") == {results[0]["id"]: 1}
+    assert retention.metrics()["retrieval"]["short_term"]["count"] == 1
+
+
+def test_long_term_duplicates_and_old_rows_are_compacted(stores):
+    crew, _, long_term, access_db = stores
+    now = time.time()
+    long_term.save("write a summary", {"quality": 8}, str(now - 60), 8)
+    long_term.save("write a summary", {"quality": 8}, str(now), 8)
+    long_term.save("write a summary", {"quality": 5}, str(now), 5)
+    long_term.save("an old task", {"quality": 7}, "2000-01-01 00:00:00", 7)
+    retention = MemoryRetention(crew, access_db=access_db)
+
+    assert retention.compact()["long_term"] == 2
+    assert retention.store_sizes()["long_term"] == 2
+    assert sorted(row["metadata"]["quality"] for row in long_term.load("write a summary", 5)) == [5, 8]
+
+
+def test_compaction_waits_for_running_kickoffs():
+    guard, crew = KickoffGuard(), object()
+    compacted = threading.Event()
+    guard.started(crew)
+
+    def compact():
+        with guard.compacting():
+            compacted.set()
+
+    thread = threading.Thread(target=compact)
+    thread.start()
+    assert not compacted.wait(0.2)
+    guard.finished(crew)
+    thread.join(2)
+    assert compacted.is_set()
+
+
+def test_kickoffs_wait_for_a_running_compaction():
+    guard, kicked_off = KickoffGuard(), threading.Event()
+    with guard.compacting():
+        thread = threading.Thread(target=lambda: (guard.started(object()), kicked_off.set()))
+        thread.start()
+        assert not kicked_off.wait(0.2)
+    thread.join(2)
+    assert kicked_off.is_set()
+
+
+def test_kickoff_events_feed_the_guard():
+    from crewai.utilities.events import CrewKickoffCompletedEvent, CrewKickoffStartedEvent, crewai_event_bus
+
+    memory_retention.kickoffs.listen()
+    crew = object()
+    crewai_event_bus.emit(crew, CrewKickoffStartedEvent(crew_name="test", inputs={}))
+    assert memory_retention.kickoffs._running == {id(crew): 1}
+    crewai_event_bus.emit(crew, CrewKickoffCompletedEvent(crew_name="test", output="done", total_tokens=0))
+    assert memory_retention.kickoffs._running == {}
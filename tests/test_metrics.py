@@ -0,0 +1,20 @@
+from metrics import MetricsRegistry
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    calls = registry.counter("test_calls_total", "Calls", ["tool", "error"])
+    calls.inc(tool='search "ev"', error="C:\\cache\nmissing")
+
+    assert 'tool="search \\"ev\\"",error="C:\\\\cache\\nmissing"} 1' in registry.to_prometheus()
+
+
+def test_histogram_buckets_keep_their_labels():
+    registry = MetricsRegistry()
+    latency = registry.histogram("test_seconds", "Latency", ["model"], buckets=(0.1, 1.0))
+    latency.observe(0.5, model="gemini-2.5-flash")
+
+    text = registry.to_prometheus()
+    assert 'test_seconds_bucket{model="gemini-2.5-flash",le="0.1"} 0' in text
+    assert 'test_seconds_bucket{model="gemini-2.5-flash",le="+Inf"} 1' in text
+    assert 'test_seconds_count{model="gemini-2.5-flash"} 1' in text
@@ -0,0 +1,168 @@
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+
+import rate_limiter
+from rate_limiter import AsyncRateLimitedTransport, ModelLimiter, RateLimitedTransport
+
+URL = "https://generativelanguage.googleapis.com/v1beta/models/test-model:generateContent"
+BODY = {"contents": [{"parts": [{"text": "hello"}]}]}
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    def install(**limits):
+        limits = {"rpm": 6000, "tpm": 6_000_000, "concurrency": 4, **limits}
+        model_limiter = ModelLimiter("test-model", **limits)
+        monkeypatch.setitem(rate_limiter._limiters, "test-model", model_limiter)
+        return model_limiter
+    return install
+
+
+def gemini(*statuses, total_tokens=80, calls=None):
+    """Handler answering with the given statuses in turn (the last one repeats)."""
+    calls = [] if calls is None else calls
+
+    def handle(request):
+        status = statuses[min(len(calls), len(statuses) - 1)]
+        calls.append(request)
+        if status == 429:
+            return httpx.Response(429, json={"error": {"details": [{"retryDelay": "0.05s"}]}})
+        return httpx.Response(200, json={"usageMetadata": {"totalTokenCount": total_tokens}})
+    return handle, calls
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert condition()
+
+
+def test_requests_queue_behind_the_concurrency_limit(limiter):
+    model = limiter(concurrency=1)
+    model.acquire(1)
+    granted = threading.Event()
+    waiter = threading.Thread(target=lambda: (model.acquire(1), granted.set()))
+    waiter.start()
+
+    wait_until(lambda: model.stats()["queued"] == 1)
+    assert not granted.is_set() and model.stats()["in_flight"] == 1
+    model.release()
+    waiter.join(5)
+    assert granted.is_set() and model.stats()["in_flight"] == 1 and model.stats()["queued"] == 0
+
+
+def test_waiting_requests_are_served_by_priority(limiter):
+    model = limiter(concurrency=1)
+    model.acquire(1)
+    order = []
+
+    def request(priority):
+        model.acquire(1, priority)
+        order.append(priority)
+        model.release()
+
+    threads = []
+    for priority in ("batch", "default", "interactive", "batch"):
+        threads.append(threading.Thread(target=request, args=(priority,)))
+        threads[-1].start()
+        wait_until(lambda: model.stats()["queued"] == len(threads))
+    model.release()
+    for thread in threads:
+        thread.join(5)
+    assert order == ["interactive", "default", "batch", "batch"]
+
+
+def test_unknown_priority_is_rejected():
+    with pytest.raises(ValueError, match="Unknown priority"):
+        with rate_limiter.priority("urgent"):
+            pass
+
+
+def test_429_is_retried_after_the_pause_with_a_halved_limit(limiter):
+    model = limiter(concurrency=4)
+    handle, calls = gemini(429, 200)
+
+    start = time.monotonic()
+    with httpx.Client(transport=RateLimitedTransport(httpx.MockTransport(handle))) as client:
+        response = client.post(URL, json=BODY)
+    assert response.status_code == 200 and len(calls) == 2
+    assert time.monotonic() - start >= 0.05  # retryDelay of the 429
+    stats = model.stats()
+    # multiplicative decrease on the 429, additive increase after the success
+    assert stats["throttled"] == 1 and stats["limit"] == 2.5 and stats["in_flight"] == 0
+
+
+def test_last_429_is_returned_when_the_retries_run_out(limiter, monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_RETRIES", "1")
+    model = limiter(concurrency=4)
+    handle, calls = gemini(429)
+
+    with httpx.Client(transport=RateLimitedTransport(httpx.MockTransport(handle))) as client:
+        response = client.post(URL, json=BODY)
+    assert response.status_code == 429 and len(calls) == 2
+    assert model.stats()["throttled"] == 2 and model.stats()["limit"] == 1.0
+    assert model.stats()["in_flight"] == 0
+
+
+def test_other_requests_bypass_the_limiter(limiter):
+    model = limiter(concurrency=1)
+    model.acquire(1)  # the only slot is taken
+    handle, calls = gemini(200)
+
+    with httpx.Client(transport=RateLimitedTransport(httpx.MockTransport(handle))) as client:
+        assert client.get(URL.replace(":generateContent", "")).status_code == 200
+    assert len(calls) == 1
+
+
+def test_token_estimate_is_corrected_by_the_reported_usage(limiter):
+    model = limiter(tpm=600)  # 10 tokens/s, bucket of 100
+    handle, _ = gemini(200, total_tokens=80)
+    content = b"x" * 200  # estimated at 50 tokens
+
+    with httpx.Client(transport=RateLimitedTransport(httpx.MockTransport(handle))) as client:
+        stream = client.send(client.build_request("POST", URL, content=content), stream=True)
+        assert model.tokens.level == pytest.approx(100 - 50, abs=1)  # the estimate is taken up front
+        stream.read()
+        stream.close()
+    assert model.tokens.level == pytest.approx(100 - 80, abs=1)
+
+
+def test_requests_wait_for_the_token_bucket(limiter):
+    model = limiter(tpm=600)  # 10 tokens/s, bucket of 100
+    model.acquire(95)
+    model.release()
+
+    start = time.monotonic()
+    model.acquire(10)  # 5 tokens short: about half a second
+    assert 0.3 < time.monotonic() - start < 2.0
+
+
+def test_async_transport_retries_429(limiter):
+    model = limiter(concurrency=2)
+    handle, calls = gemini(429, 200)
+
+    async def send():
+        async with httpx.AsyncClient(transport=AsyncRateLimitedTransport(httpx.MockTransport(handle))) as client:
+            return await client.post(URL, json=BODY)
+
+    assert asyncio.run(send()).status_code == 200 and len(calls) == 2
+    assert model.stats()["throttled"] == 1 and model.stats()["in_flight"] == 0
+
+
+def test_cancelled_async_waiter_leaves_the_queue(limiter):
+    model = limiter(concurrency=1)
+    model.acquire(1)
+
+    async def give_up():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(model.acquire_async(1), 0.05)
+
+    asyncio.run(give_up())
+    assert model.stats()["queued"] == 0
+    model.release()
+    assert model.stats()["in_flight"] == 0
@@ -0,0 +1,126 @@
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from run_artifacts import ArtifactStore
+
+
+class FakeAgent:
+    def __init__(self):
+        self.role, self.goal, self.backstory = "Analyst", "Analyze {topic}", "Careful"
+        self.llm, self.tools = "gemini/gemini-2.5-flash", []
+        self.calls = 0
+
+    def execute_task(self, task, context=None, tools=None):
+        self.calls += 1
+        return f"output {self.calls}"
+
+
+class FakeCrew:
+    process = "sequential"
+
+    def __init__(self):
+        self.agent = FakeAgent()
+        self.task = SimpleNamespace(description="Analyze the data", expected_output="A summary",
+                                    agent=self.agent, tools=[], context=None, output_file=None, output=None)
+        self.agents, self.tasks = [self.agent], [self.task]
+
+    def kickoff(self, inputs=None):
+        raw = self.agent.execute_task(self.task)
+        return SimpleNamespace(raw=raw, tasks_output=[SimpleNamespace(description="Analyze the data",
+                                                                      agent="Analyst", raw=raw)])
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.delenv("ARTIFACTS_DISABLE", raising=False)
+    return ArtifactStore(str(tmp_path / "artifacts"))
+
+
+def test_unchanged_run_is_served_from_the_store(store):
+    crew = FakeCrew()
+    first = store.kickoff(crew, {"topic": "ev"}, extra={"data": "v1"})
+    second = store.kickoff(crew, {"topic": "ev"}, extra={"data": "v1"})
+    assert second.raw == first.raw == "output 1"
+    assert crew.agent.calls == 1
+
+
+def test_changed_extra_reruns_every_task(store):
+    crew = FakeCrew()
+    store.kickoff(crew, {"topic": "ev"}, extra={"data": "v1"})
+    result = store.kickoff(crew, {"topic": "ev"}, extra={"data": "v2"})
+    assert result.raw == "output 2"
+    assert store.stats["task_hits"] == 0
+
+
+def test_force_skips_run_and_task_cache(store):
+    crew = FakeCrew()
+    store.kickoff(crew, {"topic": "ev"})
+    assert store.kickoff(crew, {"topic": "ev"}, force=True).raw == "output 2"
+    assert store.stats["task_hits"] == 0
+    # the forced results are stored
+    assert store.kickoff(FakeCrew(), {"topic": "ev"}).raw == "output 2"
+
+
+def test_disable_skips_run_and_task_cache(store, monkeypatch):
+    crew = FakeCrew()
+    store.kickoff(crew, {"topic": "ev"})
+    monkeypatch.setenv("ARTIFACTS_DISABLE", "1")
+    assert store.kickoff(crew, {"topic": "ev"}).raw == "output 2"
+    assert store.stats["task_hits"] == 0
+
+
+@pytest.mark.parametrize("value", ["0", "false", ""])
+def test_falsy_disable_keeps_the_cache(store, monkeypatch, value):
+    crew = FakeCrew()
+    monkeypatch.setenv("ARTIFACTS_DISABLE", value)
+    store.kickoff(crew, {"topic": "ev"})
+    assert store.kickoff(crew, {"topic": "ev"}).raw == "output 1"
+    assert store.stats["run_hits"] == 1
+
+
+def test_stats_are_exact_under_concurrent_kickoffs(store):
+    crews = [FakeCrew() for _ in range(8)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        for _ in range(5):
+            list(pool.map(lambda i: store.kickoff(crews[i], {"topic": f"topic {i}"}, force=True), range(8)))
+    assert store.stats["task_misses"] == 40
+
+
+def build_crew(llm):
+    from crewai import Agent, Crew, Task
+
+    agent = Agent(role="Analyst", goal="Analyze {topic}", backstory="Careful", llm=llm)
+    task = Task(description="Analyze {topic}", expected_output="A summary", agent=agent)
+    return Crew(agents=[agent], tasks=[task])
+
+
+def test_run_key_is_stable_across_llm_clients(tmp_path, monkeypatch):
+    import crewai
+    import httpx
+    from litellm.llms.custom_httpx.http_handler import HTTPHandler
+
+    from llm_factory import NO_THINKING
+
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+    store = ArtifactStore(str(tmp_path / "artifacts"))
+    keys = set()
+    for _ in range(2):
+        # a new client object each time, as in a new process
+        llm = crewai.LLM(model="gemini/gemini-2.5-flash", temperature=0.2, generation_config=NO_THINKING,
+                         client=HTTPHandler(client=httpx.Client()))
+        keys.add(store.run_key(build_crew(llm), {"topic": "ev"}, {"data": "v1"}))
+    assert len(keys) == 1
+
+
+def test_run_key_changes_with_model_config(tmp_path, monkeypatch):
+    import crewai
+
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+    store = ArtifactStore(str(tmp_path / "artifacts"))
+    keys = {
+        store.run_key(build_crew(crewai.LLM(model="gemini/gemini-2.5-flash", temperature=t)), {"topic": "ev"}, None)
+        for t in (0.2, 0.7)
+    }
+    assert len(keys) == 2
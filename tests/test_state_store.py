@@ -0,0 +1,67 @@
+import json
+import os
+import time
+
+import httpx
+import pytest
+
+import state_store
+from state_store import MissingBlobError, read_state, resolve, resolve_request, write_state
+
+LONG = "search result " * 100
+
+
+def _state(output: str) -> dict:
+    event = {"tool_name": "search", "tool_output": {"content": output}}
+    return {"state": {"memory": {"messages": [{"role": "tool", "content": output}]}}, "events": [json.dumps(event)]}
+
+
+@pytest.fixture
+def state_path(tmp_path):
+    yield str(tmp_path / "agent_state.json")
+    state_store._stores.clear()
+
+
+def test_large_texts_round_trip_through_the_store(state_path):
+    stats = write_state(state_path, _state(LONG))
+    assert stats["texts"] == 2 and LONG not in open(state_path).read()
+
+    restored = read_state(state_path)
+    message = restored["state"]["memory"]["messages"][0]["content"]
+    assert state_store.REFERENCE.fullmatch(message) and resolve(message) == LONG
+    assert read_state(state_path, lazy=False) == json.loads(json.dumps(_state(LONG)))
+
+
+def test_missing_blob_fails_loudly(state_path):
+    write_state(state_path, _state(LONG))
+    store = state_store.store_for(state_path)
+    for digest in store.digests():
+        os.remove(store._file(digest))
+
+    with pytest.raises(MissingBlobError):
+        read_state(state_path)
+    with pytest.raises(MissingBlobError):
+        resolve(state_store.reference("0" * 64))
+
+
+def test_gc_keeps_recent_unreferenced_blobs(state_path):
+    write_state(state_path, _state(LONG))
+    store = state_store.store_for(state_path)
+    pending = store.put("written by another process, state not saved yet")
+
+    assert store.gc()["removed"] == 0
+    old = time.time() - 7200
+    os.utime(store._file(pending), (old, old))
+    assert store.gc()["removed"] == 1
+    assert read_state(state_path, lazy=False)["state"]["memory"]["messages"][0]["content"] == LONG
+
+
+def test_request_bodies_are_expanded_json_escaped(state_path):
+    text = LONG + '"quoted"\n'
+    write_state(state_path, _state(text))
+    reference = read_state(state_path)["state"]["memory"]["messages"][0]["content"]
+    request = httpx.Request("POST", "https://example.com", json={"contents": [{"text": reference}]})
+
+    resolved = resolve_request(request)
+    assert json.loads(resolved.content) == {"contents": [{"text": text}]}
+    assert resolved.headers["content-length"] == str(len(resolved.content))
@@ -0,0 +1,101 @@
+import json
+from types import SimpleNamespace
+from typing import List, Literal
+
+import pytest
+from pydantic import BaseModel
+
+from structured_output import (
+    coerce, extract_json_object, json_schema_guardrail, parse_lenient, repair_stats, validate_and_repair,
+)
+
+
+class FieldDiscrepancy(BaseModel):
+    field: str
+    invoice_value: str
+    severity: str
+
+
+class Report(BaseModel):
+    matched_fields: List[str]
+    discrepancies: List[FieldDiscrepancy]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('Here you go:\n```json\n{"a": 1}\n```\nDone.', {"a": 1}),
+    ('{"a": ["x"], "b": [', {"a": ["x"], "b": []}),
+    ('{"a": [{"b": [1, 2', {"a": [{"b": [1, 2]}]}),
+    ('{"a": ["x", "y",', {"a": ["x", "y"]}),
+    ('{"a": 1, "b":', {"a": 1}),
+    ('{"a": "cut off mid str', {"a": "cut off mid str"}),
+    ('{"a": "brace } in a string", "b": [1]}', {"a": "brace } in a string", "b": [1]}),
+])
+def test_extract_json_object(text, expected):
+    assert json.loads(extract_json_object(text)) == expected
+
+
+def test_extract_json_object_without_object():
+    assert extract_json_object("no json here") is None
+
+
+def test_parse_lenient_python_literals_and_trailing_commas():
+    assert parse_lenient("{'a': True, 'b': [1, 2,],}") == {"a": True, "b": [1, 2]}
+
+
+@pytest.mark.parametrize("value", ["none", "None.", "N/A", "", "null", " - "])
+def test_coerce_null_like_string_to_empty_list(value):
+    assert coerce(value, List[FieldDiscrepancy]) == []
+    assert coerce(value, List[str]) == []
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("Acme, Inc.", ["Acme, Inc."]),
+    ("vendor", ["vendor"]),
+    ("- vendor\n- Acme, Inc.\n", ["vendor", "Acme, Inc."]),
+    ("1. vendor\n2) date", ["vendor", "date"]),
+    ("vendor; payment terms", ["vendor", "payment terms"]),
+    ('["vendor", "Acme, Inc."]', ["vendor", "Acme, Inc."]),
+])
+def test_coerce_splits_only_strings_written_as_lists(value, expected):
+    assert coerce(value, List[str]) == expected
+
+
+def test_coerce_wraps_single_values():
+    assert coerce({"field": "total"}, List[FieldDiscrepancy]) == [
+        {"field": "total", "invoice_value": "", "severity": ""}
+    ]
+
+
+def test_validate_and_repair_truncated_answer():
+    text = '{"matched_fields": ["vendor", "date"], "discrepancies": "none", "extra": ['
+    report = validate_and_repair(text, Report)
+    assert report == Report(matched_fields=["vendor", "date"], discrepancies=[])
+
+
+class Verdict(BaseModel):
+    status: Literal["match", "mismatch"]
+    notes: List[str]
+
+
+def test_unrepairable_values_ask_for_a_retry():
+    guardrail = json_schema_guardrail(Verdict)
+    retries = repair_stats["full_retries"]
+
+    ok, message = guardrail(SimpleNamespace(raw='{"status": "probably fine", "notes": "n/a"}', description="check"))
+    assert not ok and "status" in message
+    assert repair_stats["full_retries"] == retries + 1
+
+    ok, result = guardrail(SimpleNamespace(raw='{"status": "match", "notes": "n/a"}', description="check"))
+    assert ok and json.loads(result) == {"status": "match", "notes": []}
+
+
+def test_failed_reask_is_counted_not_printed(capsys):
+    class BrokenLLM:
+        def call(self, prompt):
+            raise ConnectionError("down")
+
+    failed = repair_stats["failed_reasks"]
+    report = validate_and_repair('{"matched_fields": ["vendor"]}', Report, llm=BrokenLLM())
+    assert report == Report(matched_fields=["vendor"], discrepancies=[])
+    assert repair_stats["failed_reasks"] == failed + 1
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,75 @@
+import sqlite3
+
+import pytest
+
+from ticket_store import TicketStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = TicketStore(str(tmp_path / "tickets.sqlite3"))
+    yield store
+    store.close()
+
+
+def ticket(ticket_id, category="billing", created="2025-03-01T10:00:00", resolved="", sentiment="neutral"):
+    return {"ticket_id": ticket_id, "category": category, "created_at": created,
+            "resolved_at": resolved, "sentiment": sentiment}
+
+
+def category_row(store, category="billing"):
+    return store.conn.execute(
+        "SELECT tickets, resolved FROM agg_category WHERE category = ?", (category,)
+    ).fetchone()
+
+
+def test_normalize_mixes_naive_and_utc_timestamps(store):
+    record = store._normalize(ticket("1", created="2025-03-01T10:00:00", resolved="2025-03-01T12:00:00Z"))
+    assert record[4] == pytest.approx(2.0)
+
+    record = store._normalize(ticket("2", created="2025-03-31T23:00:00-02:00", resolved="2025-04-01T03:00:00"))
+    assert record[2] == "2025-04"  # period of the UTC creation time
+    assert record[4] == pytest.approx(2.0)
+
+
+def test_normalize_skips_rows_without_id_and_negative_durations(store):
+    assert store._normalize(ticket("")) is None
+    record = store._normalize(ticket("1", created="2025-03-02T00:00:00Z", resolved="2025-03-01T00:00:00Z"))
+    assert record[4] is None
+
+
+def test_reingest_is_idempotent(store):
+    rows = [ticket("1"), ticket("2", resolved="2025-03-01T20:00:00Z")]
+    assert store.ingest_rows(rows) == 2
+    assert store.ingest_rows(rows) == 0
+    assert category_row(store) == (2, 1)
+
+
+def test_reingest_updates_resolved_tickets(store):
+    store.ingest_rows([ticket("1", sentiment="negative"), ticket("2")])
+    assert category_row(store) == (2, 0)
+
+    changed = store.ingest_rows([ticket("1", resolved="2025-03-02T10:00:00Z", sentiment="positive")])
+    assert changed == 1
+    assert category_row(store) == (2, 1)
+    assert 23 < store.resolution_percentiles("billing")[50] < 26
+    assert store.sentiment_trend("billing") == [("2025-03", pytest.approx(0.5))]
+
+
+def test_reingest_moves_ticket_between_categories(store):
+    store.ingest_rows([ticket("1", category="billing")])
+    store.ingest_rows([ticket("1", category="shipping")])
+    assert store.categories() == ["shipping"]
+
+
+def test_failed_batch_is_rolled_back(store, monkeypatch):
+    store.ingest_rows([ticket("1")])
+
+    def fail(cur):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(store, "_add_staged", fail)
+    with pytest.raises(sqlite3.OperationalError):
+        store.ingest_rows([ticket("1", resolved="2025-03-02T10:00:00Z")])
+    assert category_row(store) == (1, 0)
+    assert store.conn.execute("SELECT COUNT(*) FROM tickets").fetchone()[0] == 1
@@ -0,0 +1,84 @@
+import asyncio
+import time
+
+import pytest
+
+import local_store
+from tool_registry import SharedTool, get_tool
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(local_store, "CACHE_DIR", str(tmp_path / "cache"))
+
+
+def counting_tool(results, **settings):
+    calls = []
+
+    def search(search_query: str, search_type: str = "search"):
+        """Search."""
+        calls.append((search_query, search_type))
+        return results(search_query, search_type)
+
+    return SharedTool("test_search", search, cache_ttl_s=60, **settings), calls
+
+
+def test_results_are_cached_by_arguments():
+    tool, calls = counting_tool(lambda q, t: {"organic": [q]})
+    assert tool.call(search_query="ev outlook") == {"organic": ["ev outlook"]}
+    assert tool.call(search_query="ev outlook") == {"organic": ["ev outlook"]}
+    assert len(calls) == 1
+    assert tool.peek(search_query="ev outlook")
+    assert not tool.peek(search_query="battery prices")
+
+
+def test_uncacheable_results_are_not_stored():
+    from cached_search import is_cacheable
+
+    tool, calls = counting_tool(lambda q, t: {"organic": []}, cacheable=is_cacheable)
+    tool.call(search_query="nothing")
+    tool.call(search_query="nothing")
+    assert len(calls) == 2
+    assert not tool.peek(search_query="nothing")
+
+
+def test_serper_search_keys_on_search_type():
+    serper = get_tool("serper_search")
+    assert "search_type" in serper.args_schema.model_fields
+    assert serper._cache_key({"search_query": "ev", "search_type": "news"}) != \
+        serper._cache_key({"search_query": "ev"})
+
+
+def test_concurrent_identical_calls_share_one_backend_call():
+    tool, calls = counting_tool(lambda q, t: {"organic": [q]})
+
+    async def run():
+        return await asyncio.gather(*(tool.acall(search_query="same") for _ in range(5)))
+
+    assert asyncio.run(run()) == [{"organic": ["same"]}] * 5
+    assert len(calls) == 1
+
+
+def test_memory_cache_keeps_the_most_recently_used_entries():
+    tool, _ = counting_tool(lambda q, t: {"organic": [q]}, memory_entries=2)
+    tool.call(search_query="a")
+    tool.call(search_query="b")
+    tool.call(search_query="a")  # a is now more recent than b
+    tool.call(search_query="c")
+    assert list(tool._memory) == [tool._cache_key({"search_query": q}) for q in ("a", "c")]
+
+
+def test_expired_entries_are_dropped_on_write(monkeypatch):
+    tool, _ = counting_tool(lambda q, t: {"organic": [q]})
+    tool.call(search_query="old")
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 120)  # past the 60 s TTL
+    tool.call(search_query="new")
+    assert list(tool._memory) == [tool._cache_key({"search_query": "new"})]
+
+
+def test_tavily_search_does_not_cache_failed_searches():
+    tavily = get_tool("tavily_search")
+    assert tavily.cacheable is not None
+    assert not tavily._caches("Search failed: Error occurred during web search: timeout")
+    assert tavily._caches("{'query': 'weather', 'results': [{'title': 'Sunny'}]}")
@@ -0,0 +1,355 @@
+# Local ticket store for CustomerSupportDataTool (script 6)
+#
+# Our real support export has millions of rows, far too much to hand to an agent.
+# This module ingests the export (CSV or Parquet) into SQLite in streaming batches and keeps
+# a few aggregates up to date on every ingest, so the tool can answer from them in milliseconds:
+#   - ticket counts per category (resolved / unresolved)
+#   - resolution-time histogram per category -> p50 / p90 / p99 resolution time
+#   - sentiment sum and count per category and period (month) -> sentiment trend
+#
+# Expected columns (rename with --column / column_map if the export differs):
+#   ticket_id, category, created_at, resolved_at, sentiment
+# created_at / resolved_at are ISO timestamps (without an offset they are taken as UTC);
+# sentiment is a number in [-1, 1] or one of positive / neutral / negative.
+# Re-ingesting a newer export updates tickets that changed (e.g. resolved since the last ingest):
+# their old contribution is taken out of the aggregates before the new one is added.
+#
+#   python ticket_store.py ingest tickets_export.csv
+#   python ticket_store.py summary
+
+import argparse
+import csv
+import math
+import os
+import sqlite3
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+
+DEFAULT_STORE_PATH = os.getenv("TICKET_STORE_PATH", "support_tickets.sqlite3")
+DEFAULT_COLUMNS = {
+    "ticket_id": "ticket_id",
+    "category": "category",
+    "created_at": "created_at",
+    "resolved_at": "resolved_at",
+    "sentiment": "sentiment",
+}
+SENTIMENT_LABELS = {"positive": 1.0, "neutral": 0.0, "negative": -1.0}
+# Resolution-time histogram: bucket = floor(log1p(hours) * BUCKETS_PER_E), ~5% wide buckets
+BUCKETS_PER_E = 20
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tickets (
+    ticket_id TEXT PRIMARY KEY,
+    category TEXT NOT NULL,
+    period TEXT,
+    created_at TEXT,
+    resolution_hours REAL,
+    sentiment REAL
+);
+CREATE TABLE IF NOT EXISTS agg_category (
+    category TEXT PRIMARY KEY,
+    tickets INTEGER NOT NULL,
+    resolved INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS agg_resolution (
+    category TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    tickets INTEGER NOT NULL,
+    PRIMARY KEY (category, bucket)
+);
+CREATE TABLE IF NOT EXISTS agg_sentiment (
+    category TEXT NOT NULL,
+    period TEXT NOT NULL,
+    tickets INTEGER NOT NULL,
+    sentiment_sum REAL NOT NULL,
+    PRIMARY KEY (category, period)
+);
+"""
+
+
+def _parse_time(value) -> Optional[datetime]:
+    """UTC-aware datetime (naive timestamps are taken as UTC), or None."""
+    if value in (None, ""):
+        return None
+    if not isinstance(value, datetime):
+        try:
+            value = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _parse_sentiment(value) -> Optional[float]:
+    if value in (None, ""):
+        return None
+    label = str(value).strip().lower()
+    if label in SENTIMENT_LABELS:
+        return SENTIMENT_LABELS[label]
+    try:
+        return float(label)
+    except ValueError:
+        return None
+
+
+def _bucket_upper_hours(bucket: int) -> float:
+    return math.expm1((bucket + 1) / BUCKETS_PER_E)
+
+
+def read_rows(path: str, batch_size: int = 50_000) -> Iterator[List[dict]]:
+    """
+    Stream an export file as lists of row dicts, batch_size rows at a time.
+    Args:
+        path (str): .csv or .parquet file
+        batch_size (int): Rows per batch
+    """
+    if path.endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Reading Parquet exports requires pyarrow: pip install pyarrow")
+        for record_batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+            yield record_batch.to_pylist()
+        return
+
+    with open(path, newline="", encoding="utf-8") as f:
+        batch = []
+        for row in csv.DictReader(f):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+class TicketStore:
+    """
+    SQLite-backed ticket store with incrementally maintained aggregates.
+    Args:
+        path (str): SQLite file (created if missing)
+        column_map (dict): Maps the standard column names to the export's column names
+    """
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH, column_map: Optional[Dict[str, str]] = None):
+        self.path = path
+        self.columns = {**DEFAULT_COLUMNS, **(column_map or {})}
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def _normalize(self, row: dict) -> Optional[tuple]:
+        c = self.columns
+        ticket_id = row.get(c["ticket_id"])
+        if ticket_id in (None, ""):
+            return None
+        created = _parse_time(row.get(c["created_at"]))
+        resolved = _parse_time(row.get(c["resolved_at"]))
+        hours = None
+        if created and resolved and resolved >= created:
+            hours = (resolved - created).total_seconds() / 3600
+        category = (row.get(c["category"]) or "uncategorized").strip().lower()
+        return (
+            str(ticket_id),
+            category,
+            created.strftime("%Y-%m") if created else None,
+            created.isoformat() if created else None,
+            hours,
+            _parse_sentiment(row.get(c["sentiment"])),
+            int(math.log1p(hours) * BUCKETS_PER_E) if hours is not None else None,
+        )
+
+    def ingest_rows(self, rows: List[dict]) -> int:
+        """
+        Add one batch of rows and fold the new and changed tickets into the aggregates.
+        Unchanged tickets are skipped, so re-ingesting an export is safe. The batch is one
+        transaction: on an error nothing of it is applied.
+        Returns:
+            int: Number of new or changed tickets
+        """
+        records = [r for r in map(self._normalize, rows) if r]
+        with self.conn:
+            cur = self.conn.cursor()
+            cur.execute("BEGIN")
+            cur.execute(
+                """CREATE TEMP TABLE IF NOT EXISTS staging (
+                    ticket_id TEXT PRIMARY KEY, category TEXT, period TEXT, created_at TEXT,
+                    resolution_hours REAL, sentiment REAL, bucket INTEGER)"""
+            )
+            cur.execute("DELETE FROM staging")
+            cur.executemany("INSERT OR REPLACE INTO staging VALUES (?, ?, ?, ?, ?, ?, ?)", records)
+            cur.execute(
+                """DELETE FROM staging WHERE EXISTS (
+                       SELECT 1 FROM tickets t WHERE t.ticket_id = staging.ticket_id
+                       AND t.category IS staging.category AND t.period IS staging.period
+                       AND t.created_at IS staging.created_at
+                       AND t.resolution_hours IS staging.resolution_hours AND t.sentiment IS staging.sentiment)"""
+            )
+            self._subtract_stored(cur)
+            return self._add_staged(cur)
+
+    def _subtract_stored(self, cur: sqlite3.Cursor) -> None:
+        """Take the stored version of every changed ticket in staging out of the aggregates."""
+        old = cur.execute(
+            """SELECT t.category, t.period, t.resolution_hours, t.sentiment
+               FROM tickets t JOIN staging s ON s.ticket_id = t.ticket_id"""
+        ).fetchall()
+        if not old:
+            return
+        categories, resolution, sentiment = Counter(), Counter(), Counter()
+        sentiment_sums = Counter()
+        for category, period, hours, score in old:
+            categories[(category, hours is not None)] += 1
+            if hours is not None:
+                resolution[(category, int(math.log1p(hours) * BUCKETS_PER_E))] += 1
+            if period is not None and score is not None:
+                sentiment[(category, period)] += 1
+                sentiment_sums[(category, period)] += score
+        cur.executemany(
+            "UPDATE agg_category SET tickets = tickets - ?, resolved = resolved - ? WHERE category = ?",
+            [(n, n if resolved else 0, category) for (category, resolved), n in categories.items()],
+        )
+        cur.executemany(
+            "UPDATE agg_resolution SET tickets = tickets - ? WHERE category = ? AND bucket = ?",
+            [(n, category, bucket) for (category, bucket), n in resolution.items()],
+        )
+        cur.executemany(
+            """UPDATE agg_sentiment SET tickets = tickets - ?, sentiment_sum = sentiment_sum - ?
+               WHERE category = ? AND period = ?""",
+            [(n, sentiment_sums[key], *key) for key, n in sentiment.items()],
+        )
+        for table in ("agg_category", "agg_resolution", "agg_sentiment"):
+            cur.execute(f"DELETE FROM {table} WHERE tickets <= 0")
+
+    def _add_staged(self, cur: sqlite3.Cursor) -> int:
+        """Fold the staged tickets into the aggregates and store them. Returns their number."""
+        cur.execute(
+            """INSERT INTO agg_category (category, tickets, resolved)
+               SELECT category, COUNT(*), COUNT(resolution_hours) FROM staging GROUP BY category
+               ON CONFLICT(category) DO UPDATE SET
+                   tickets = tickets + excluded.tickets,
+                   resolved = resolved + excluded.resolved"""
+        )
+        cur.execute(
+            """INSERT INTO agg_resolution (category, bucket, tickets)
+               SELECT category, bucket, COUNT(*) FROM staging WHERE bucket IS NOT NULL
+               GROUP BY category, bucket
+               ON CONFLICT(category, bucket) DO UPDATE SET tickets = tickets + excluded.tickets"""
+        )
+        cur.execute(
+            """INSERT INTO agg_sentiment (category, period, tickets, sentiment_sum)
+               SELECT category, period, COUNT(sentiment), TOTAL(sentiment) FROM staging
+               WHERE period IS NOT NULL AND sentiment IS NOT NULL
+               GROUP BY category, period
+               ON CONFLICT(category, period) DO UPDATE SET
+                   tickets = tickets + excluded.tickets,
+                   sentiment_sum = sentiment_sum + excluded.sentiment_sum"""
+        )
+        return cur.execute(
+            """INSERT OR REPLACE INTO tickets
+               SELECT ticket_id, category, period, created_at, resolution_hours, sentiment FROM staging"""
+        ).rowcount
+
+    def ingest_file(self, path: str, batch_size: int = 50_000) -> int:
+        """Stream an export file into the store. Returns the number of new or changed tickets."""
+        total = 0
+        for batch in read_rows(path, batch_size):
+            total += self.ingest_rows(batch)
+            print(f"--- ingested {total} new or changed tickets from {path} ---")
+        return total
+
+    # Queries - all served from the aggregate tables
+
+    def categories(self) -> List[str]:
+        return [r[0] for r in self.conn.execute("SELECT category FROM agg_category ORDER BY tickets DESC")]
+
+    def resolution_percentiles(self, category: str, percentiles=(50, 90, 99)) -> Dict[int, float]:
+        """Approximate resolution-time percentiles (hours) from the histogram."""
+        buckets = self.conn.execute(
+            "SELECT bucket, tickets FROM agg_resolution WHERE category = ? ORDER BY bucket", (category,)
+        ).fetchall()
+        total = sum(n for _, n in buckets)
+        result = {}
+        if not total:
+            return result
+        for p in percentiles:
+            target, seen = total * p / 100, 0
+            for bucket, n in buckets:
+                seen += n
+                if seen >= target:
+                    result[p] = _bucket_upper_hours(bucket)
+                    break
+        return result
+
+    def sentiment_trend(self, category: str, periods: int = 3) -> List[tuple]:
+        """[(period, average sentiment)] for the most recent periods, oldest first."""
+        rows = self.conn.execute(
+            """SELECT period, sentiment_sum / tickets FROM agg_sentiment
+               WHERE category = ? AND tickets > 0 ORDER BY period DESC LIMIT ?""",
+            (category, periods),
+        ).fetchall()
+        return list(reversed(rows))
+
+    def summary(self, category: Optional[str] = None, top_n: int = 5) -> str:
+        """Compact text summary for the agent (never raw rows)."""
+        rows = self.conn.execute(
+            "SELECT category, tickets, resolved FROM agg_category ORDER BY tickets DESC"
+        ).fetchall()
+        total = sum(r[1] for r in rows)
+        if category:
+            rows = [r for r in rows if r[0] == category.strip().lower()]
+        else:
+            rows = rows[:top_n]
+
+        lines = [f"Support Data Summary ({total} tickets in store):"]
+        for name, tickets, resolved in rows:
+            pct = self.resolution_percentiles(name)
+            resolution = (
+                f"resolution p50 {pct[50]:.0f}h / p90 {pct[90]:.0f}h / p99 {pct[99]:.0f}h" if pct else "no resolution data"
+            )
+            trend = self.sentiment_trend(name)
+            if trend:
+                trend_text = ", ".join(f"{period}: {avg:+.2f}" for period, avg in trend)
+                sentiment = f"sentiment {trend_text}"
+            else:
+                sentiment = "no sentiment data"
+            lines.append(
+                f"- '{name}': {tickets} tickets ({tickets / total:.0%} of total), "
+                f"{tickets - resolved} unresolved. {resolution}. {sentiment}."
+            )
+        return "\n".join(lines)
+
+    def is_empty(self) -> bool:
+        return self.conn.execute("SELECT COUNT(*) FROM agg_category").fetchone()[0] == 0
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local support ticket store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    ingest = sub.add_parser("ingest", help="Stream a CSV/Parquet export into the store")
+    ingest.add_argument("files", nargs="+")
+    ingest.add_argument("--batch-size", type=int, default=50_000)
+    ingest.add_argument("--column", action="append", default=[], metavar="NAME=EXPORT_COLUMN",
+                        help="Map a standard column to the export's column name")
+    summary = sub.add_parser("summary", help="Print the aggregate summary")
+    summary.add_argument("--category")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH)
+    args = parser.parse_args()
+
+    if args.command == "ingest":
+        store = TicketStore(args.store, dict(c.split("=", 1) for c in args.column))
+        for path in args.files:
+            store.ingest_file(path, args.batch_size)
+    else:
+        store = TicketStore(args.store)
+    print(store.summary(getattr(args, "category", None)))
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,582 @@
+# Shared tools for LlamaIndex agents and CrewAI crews
+#
+# Web search was implemented three times: Tavily `search_web` functions in scripts 1-3, a grounded
+# Gemini search in script 4 and a Serper tool in script 5, each with its own clients and no shared
+# caching or pooling. Here a tool is defined once, as a plain function, and registered with:
+# 1. A connection pool  - one keep-alive httpx pool per tool (max_concurrency connections), shared
+#                         by every agent, crew, thread and event loop in the process
+# 2. A cache            - results keyed by the normalized arguments: in memory (LRU of
+#                         TOOL_MEMORY_CACHE_MAX entries, expired ones dropped on write), plus a
+#                         persistent TTL cache in .cache/tools.sqlite3. Concurrent identical calls (from
+#                         either framework) wait for the first one instead of calling the backend again
+# 3. A concurrency limit - at most max_concurrency backend calls at a time, across frameworks
+# 4. Metrics            - calls per framework and source (cache / backend / error), slot wait and
+#                         backend latency in metrics.py; tool_report() prints hits and time saved
+# The same SharedTool is exposed as a LlamaIndex FunctionTool (.llama_index()) and as a CrewAI
+# BaseTool (.crewai()); sync and async callers are both supported.
+#
+# Usage:
+#   from tool_registry import get_tool
+#   search_web = get_tool("tavily_search").llama_index(name="search_web")   # FunctionAgent(tools=[...])
+#   search_tool = get_tool("serper_search").crewai()                        # Agent(tools=[...])
+#
+#   @register_tool("my_tool", cache_ttl_s=600, max_concurrency=2)
+#   async def my_tool(query: str) -> str:
+#       """What the tool does (the tool description). Args: ... (argument descriptions)"""
+
+import asyncio
+import concurrent.futures
+import inspect
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+from pydantic import Field, PrivateAttr, create_model
+
+from local_store import LocalKVStore, cache_path
+from metrics import record_cache, registry
+
+CALLS = registry.counter("shared_tool_calls_total", "Shared tool calls", ["tool", "framework", "source"])
+WAIT = registry.histogram("shared_tool_wait_seconds", "Time waiting for a shared tool slot", ["tool"])
+BACKEND_LATENCY = registry.histogram("shared_tool_backend_seconds", "Backend latency of shared tools", ["tool"])
+
+TOOLS: Dict[str, "SharedTool"] = {}
+
+
+class _LeaderCancelled(Exception):
+    """The call that was computing a result for waiting duplicates was cancelled."""
+
+
+def _docstring_parts(fn: Callable) -> tuple:
+    """(description, {argument: description}) from an Args:-style docstring."""
+    doc = inspect.getdoc(fn) or ""
+    description = re.split(r"\n\s*(?:Args|Returns|Raises):", doc)[0].strip()
+    args = {}
+    section = re.search(r"Args:\n(.*?)(?:\n\s*(?:Returns|Raises):|\Z)", doc, re.S)
+    for line in (section.group(1).splitlines() if section else []):
+        match = re.match(r"\s*(\w+)\s*(?:\([^)]*\))?:\s*(.+)", line)
+        if match:
+            args[match.group(1)] = match.group(2).strip()
+    return description, args
+
+
+def _args_schema(fn: Callable, name: str, arg_docs: Dict[str, str]) -> type:
+    """Pydantic model of the function's arguments (used by both frameworks)."""
+    fields = {}
+    for param in inspect.signature(fn).parameters.values():
+        annotation = param.annotation if param.annotation is not inspect.Parameter.empty else str
+        default = ... if param.default is inspect.Parameter.empty else param.default
+        fields[param.name] = (annotation, Field(default, description=arg_docs.get(param.name, param.name)))
+    title = "".join(part.title() for part in re.split(r"\W+", name) if part)
+    return create_model(f"{title}Schema", **fields)
+
+
+def _default_key(**kwargs) -> str:
+    return json.dumps(kwargs, sort_keys=True, default=str)
+
+
+class SharedTool:
+    """
+    A tool defined once, with its own connection pool, cache, concurrency limit and metrics.
+    Args:
+        name (str): Registry name (also the default tool name in both frameworks)
+        fn: The tool function (sync or async); its docstring is the tool description
+        cache_ttl_s (float): How long results are reused (0 = no caching)
+        max_concurrency (int): Backend calls at a time, across frameworks and threads
+        key: Function of the tool arguments returning the cache key (default: the arguments as JSON)
+        error_result (str): Returned to the agent instead of raising, formatted with {error}
+        cacheable: Function of a result returning False for results that must not be cached
+            (e.g. empty search results); default: every result is cached
+        memory_entries (int): Results kept in memory, least recently used dropped first
+            (default: TOOL_MEMORY_CACHE_MAX or 1024)
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable,
+        cache_ttl_s: float = 0.0,
+        max_concurrency: int = 4,
+        key: Optional[Callable[..., str]] = None,
+        error_result: Optional[str] = None,
+        cacheable: Optional[Callable[[Any], bool]] = None,
+        memory_entries: Optional[int] = None,
+    ):
+        self.name = name
+        self.fn = fn
+        self.is_async = inspect.iscoroutinefunction(fn)
+        self.cache_ttl_s = cache_ttl_s
+        self.max_concurrency = max_concurrency
+        self.key = key or _default_key
+        self.error_result = error_result
+        self.cacheable = cacheable
+        self.memory_entries = memory_entries or int(os.getenv("TOOL_MEMORY_CACHE_MAX", 1024))
+        self.description, arg_docs = _docstring_parts(fn)
+        self.args_schema = _args_schema(fn, name, arg_docs)
+
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._pool: Optional[httpx.HTTPTransport] = None
+        self._store: Optional[LocalKVStore] = None
+        self._memory: "OrderedDict[str, dict]" = OrderedDict()
+        self._inflight: Dict[str, concurrent.futures.Future] = {}
+        self._exposed: Dict[tuple, Any] = {}
+        self._stats: Dict[str, float] = {}
+        self.reset()
+
+    # Shared resources
+
+    def pool(self) -> httpx.HTTPTransport:
+        """The tool's keep-alive connection pool (thread-safe, usable from any event loop)."""
+        with self._lock:
+            if self._pool is None:
+                self._pool = httpx.HTTPTransport(
+                    limits=httpx.Limits(max_connections=self.max_concurrency,
+                                        max_keepalive_connections=self.max_concurrency,
+                                        keepalive_expiry=float(os.getenv("TOOL_KEEPALIVE_S", 90))),
+                    retries=1,
+                )
+            return self._pool
+
+    def http_client(self, **kwargs) -> httpx.Client:
+        """Sync httpx client on the tool's pool."""
+        return httpx.Client(transport=self.pool(), **kwargs)
+
+    def async_http_client(self, **kwargs) -> httpx.AsyncClient:
+        """Async httpx client on the tool's pool (closing it leaves the pool open)."""
+        from llm_factory import PooledAsyncTransport
+
+        return httpx.AsyncClient(transport=PooledAsyncTransport(self.pool()), **kwargs)
+
+    def reset(self) -> None:
+        """Forget cached results and statistics (the pool is kept)."""
+        with self._lock:
+            if self._store is not None:
+                self._store.close()
+            self._store = None
+            self._memory.clear()
+            self._stats = {"memory_hits": 0, "persistent_hits": 0, "misses": 0, "errors": 0,
+                           "latency_saved_s": 0.0, "wait_s": 0.0}
+
+    def _persistent(self) -> LocalKVStore:
+        with self._lock:
+            if self._store is None:
+                self._store = LocalKVStore(cache_path("tools.sqlite3"), table=re.sub(r"\W", "_", self.name))
+            return self._store
+
+    # Cache
+
+    def _caches(self, result: Any) -> bool:
+        return bool(self.cache_ttl_s) and (self.cacheable is None or self.cacheable(result))
+
+    def _cache_key(self, kwargs: dict) -> str:
+        return self.key(**kwargs)
+
+    def _recall(self, key: str) -> Optional[dict]:
+        """The unexpired in-memory entry of a key, marked as recently used."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            if entry["expires_at"] <= time.time():
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            return entry
+
+    def _remember(self, key: str, entry: dict) -> None:
+        """Keep an entry in memory, dropping expired entries and then the least recently used."""
+        now = time.time()
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            for stale in [k for k, e in self._memory.items() if e["expires_at"] <= now]:
+                del self._memory[stale]
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _lookup(self, key: str) -> Optional[dict]:
+        if not self.cache_ttl_s:
+            return None
+        entry = self._recall(key)
+        if entry is not None:
+            self._hit("memory_hits", entry)
+            return entry
+        entry = self._persistent().get(key)
+        if entry is not None:
+            self._remember(key, entry)
+            self._hit("persistent_hits", entry)
+        return entry
+
+    def peek(self, **kwargs) -> bool:
+        """True if a call with these arguments would be answered from the cache (nothing is counted)."""
+        if not self.cache_ttl_s:
+            return False
+        key = self._cache_key(kwargs)
+        if self._recall(key) is not None:
+            return True
+        return self._persistent().get(key) is not None
+
+    def _hit(self, kind: str, entry: dict) -> None:
+        with self._lock:
+            self._stats[kind] += 1
+            self._stats["latency_saved_s"] += entry["latency_s"]
+        record_cache(f"tool_{self.name}", True)
+
+    def _store_result(self, key: str, result: Any, latency_s: float) -> None:
+        with self._lock:
+            self._stats["misses"] += 1
+        record_cache(f"tool_{self.name}", False)
+        if not self._caches(result):
+            return
+        entry = {"result": result, "latency_s": latency_s, "expires_at": time.time() + self.cache_ttl_s}
+        self._remember(key, entry)
+        try:
+            self._persistent().set(key, entry, ttl=self.cache_ttl_s)
+        except (TypeError, ValueError):  # not JSON-serializable: kept in memory only
+            pass
+
+    def _claim(self, key: str) -> tuple:
+        """(future, True) for the first caller of a key, (the first caller's future, False) for duplicates."""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future, False
+            self._inflight[key] = future = concurrent.futures.Future()
+            return future, True
+
+    def _settle(self, key: str, future: concurrent.futures.Future, result: Any = None,
+                error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            self._inflight.pop(key, None)
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error if isinstance(error, Exception) else _LeaderCancelled())
+
+    def _failed(self, framework: str, error: Exception) -> Any:
+        with self._lock:
+            self._stats["errors"] += 1
+        CALLS.inc(tool=self.name, framework=framework, source="error")
+        if self.error_result is None:
+            raise error
+        print(f"--- Tool {self.name} failed: {error} ---")
+        return self.error_result.format(error=error)
+
+    # Calls
+
+    def call(self, framework: str = "python", **kwargs) -> Any:
+        """Call the tool from synchronous code (e.g. a CrewAI agent)."""
+        key = self._cache_key(kwargs)
+        while True:
+            entry = self._lookup(key)
+            if entry is not None:
+                CALLS.inc(tool=self.name, framework=framework, source="cache")
+                return entry["result"]
+            future, first = self._claim(key)
+            if first:
+                break
+            try:
+                future.result()
+            except _LeaderCancelled:
+                continue
+            except Exception as e:
+                return self._failed(framework, e)
+            if not self._caches(future.result()):
+                return future.result()
+
+        try:
+            start = time.perf_counter()
+            self._slots.acquire()
+            self._waited(time.perf_counter() - start)
+            try:
+                start = time.perf_counter()
+                result = self._run_async_fn(kwargs) if self.is_async else self.fn(**kwargs)
+                latency = time.perf_counter() - start
+            finally:
+                self._slots.release()
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            if not isinstance(e, Exception):
+                raise
+            return self._failed(framework, e)
+        self._finished(key, future, framework, result, latency)
+        return result
+
+    async def acall(self, framework: str = "python", **kwargs) -> Any:
+        """Call the tool from async code (e.g. a LlamaIndex agent)."""
+        key = self._cache_key(kwargs)
+        while True:
+            entry = self._lookup(key)
+            if entry is not None:
+                CALLS.inc(tool=self.name, framework=framework, source="cache")
+                return entry["result"]
+            future, first = self._claim(key)
+            if first:
+                break
+            try:
+                # shielded: a cancelled duplicate must not cancel the first caller's result
+                result = await asyncio.shield(asyncio.wrap_future(future))
+            except _LeaderCancelled:
+                continue
+            except Exception as e:
+                return self._failed(framework, e)
+            if not self._caches(result):
+                return result
+
+        try:
+            start = time.perf_counter()
+            await self._acquire_async()
+            self._waited(time.perf_counter() - start)
+            try:
+                start = time.perf_counter()
+                result = await (self.fn(**kwargs) if self.is_async else asyncio.to_thread(self.fn, **kwargs))
+                latency = time.perf_counter() - start
+            finally:
+                self._slots.release()
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            if not isinstance(e, Exception):
+                raise
+            return self._failed(framework, e)
+        self._finished(key, future, framework, result, latency)
+        return result
+
+    def _run_async_fn(self, kwargs: dict) -> Any:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.fn(**kwargs))
+        # Called synchronously from inside a running loop: run on a worker thread's own loop
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, self.fn(**kwargs)).result()
+
+    async def _acquire_async(self) -> None:
+        if self._slots.acquire(blocking=False):
+            return
+        acquiring = asyncio.ensure_future(asyncio.to_thread(self._slots.acquire))
+        try:
+            await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            # The slot is still granted to the worker thread later; give it straight back
+            acquiring.add_done_callback(lambda done: done.cancelled() or self._slots.release())
+            raise
+
+    def _waited(self, seconds: float) -> None:
+        WAIT.observe(seconds, tool=self.name)
+        with self._lock:
+            self._stats["wait_s"] += seconds
+
+    def _finished(self, key: str, future: concurrent.futures.Future, framework: str, result: Any,
+                  latency: float) -> None:
+        BACKEND_LATENCY.observe(latency, tool=self.name)
+        CALLS.inc(tool=self.name, framework=framework, source="backend")
+        self._store_result(key, result, latency)
+        self._settle(key, future, result)
+
+    # Framework adapters
+
+    def llama_index(self, name: Optional[str] = None, description: Optional[str] = None):
+        """The tool as a LlamaIndex FunctionTool."""
+        from llama_index.core.tools import FunctionTool
+
+        name, description = name or self.name, description or self.description
+        def call(**kwargs: Any) -> Any:
+            return self.call(framework="llama_index", **kwargs)
+
+        async def acall(**kwargs: Any) -> Any:
+            return await self.acall(framework="llama_index", **kwargs)
+
+        with self._lock:
+            if ("llama_index", name, description) not in self._exposed:
+                self._exposed[("llama_index", name, description)] = FunctionTool.from_defaults(
+                    fn=call,
+                    async_fn=acall,
+                    name=name,
+                    description=description,
+                    fn_schema=self.args_schema,
+                )
+            return self._exposed[("llama_index", name, description)]
+
+    def crewai(self, name: Optional[str] = None, description: Optional[str] = None):
+        """The tool as a CrewAI BaseTool."""
+        name, description = name or self.name, description or self.description
+        with self._lock:
+            if ("crewai", name, description) not in self._exposed:
+                tool = _crew_tool_class()(name=name, description=description, args_schema=self.args_schema)
+                tool._shared = self
+                self._exposed[("crewai", name, description)] = tool
+            return self._exposed[("crewai", name, description)]
+
+    # Reporting
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._stats)
+        hits = stats["memory_hits"] + stats["persistent_hits"]
+        stats["hit_rate"] = hits / (hits + stats["misses"]) if hits + stats["misses"] else 0.0
+        return stats
+
+    def report(self) -> str:
+        s = self.stats()
+        return (
+            f"Tool {self.name}: {s['memory_hits'] + s['persistent_hits']:.0f} cache hits "
+            f"({s['memory_hits']:.0f} in memory, {s['persistent_hits']:.0f} persistent), {s['misses']:.0f} backend calls, "
+            f"{s['errors']:.0f} errors, hit rate {s['hit_rate']:.0%}, ~{s['latency_saved_s']:.1f}s latency saved, "
+            f"{s['wait_s']:.1f}s waiting for a slot"
+        )
+
+
+_crew_tool = None
+
+
+def _crew_tool_class():
+    # Built on first use, so the LlamaIndex scripts do not import crewai
+    global _crew_tool
+    if _crew_tool is None:
+        from crewai.tools import BaseTool
+
+        class SharedCrewTool(BaseTool):
+            """CrewAI view of a SharedTool."""
+
+            _shared: Any = PrivateAttr(default=None)
+
+            def _run(self, **kwargs: Any) -> Any:
+                return self._shared.call(framework="crewai", **kwargs)
+
+        _crew_tool = SharedCrewTool
+    return _crew_tool
+
+
+def register_tool(name: str, **settings) -> Callable[[Callable], Callable]:
+    """Decorator: register a function as a shared tool (see SharedTool for the settings)."""
+
+    def register(fn: Callable) -> Callable:
+        TOOLS[name] = SharedTool(name, fn, **settings)
+        return fn
+
+    return register
+
+
+def get_tool(name: str) -> SharedTool:
+    if name not in TOOLS:
+        raise KeyError(f"Unknown tool {name!r}, registered: {', '.join(sorted(TOOLS))}")
+    return TOOLS[name]
+
+
+def reset_tools() -> None:
+    """Forget the cached results of every tool (the benchmarks call this between iterations)."""
+    for tool in TOOLS.values():
+        tool.reset()
+
+
+def tool_report() -> List[str]:
+    return [tool.report() for tool in TOOLS.values() if sum(tool.stats()[k] for k in ("memory_hits", "persistent_hits", "misses", "errors"))]
+
+
+# Web search tools
+
+def _search_key(query: str = "", search_query: str = "", search_type: str = "search") -> str:
+    from cached_search import normalize_query
+
+    return f"{search_type}:{normalize_query(query or search_query)}"
+
+
+def _cacheable_search(result: Any) -> bool:
+    from cached_search import is_cacheable
+
+    return is_cacheable(result)
+
+
+_tavily_client = None
+
+
+@register_tool(
+    "tavily_search",
+    cache_ttl_s=float(os.getenv("TAVILY_CACHE_TTL", 600)),  # live data (weather, news): short TTL
+    max_concurrency=4,
+    key=_search_key,
+    error_result="Search failed: Error occurred during web search: {error}",
+    cacheable=_cacheable_search,
+)
+async def tavily_search(query: str) -> str:
+    """
+    Search the web using Tavily API and return results as a string.
+    Args:
+        query (str): The search query to execute
+    Returns:
+        str: Search results from Tavily API
+    """
+    global _tavily_client
+    import tavily  # looked up at call time, so a patched client (benchmarks/standins.py) is used
+    from call_policy import call_with_policy
+
+    if _tavily_client is None or not isinstance(_tavily_client, tavily.AsyncTavilyClient):
+        _tavily_client = tavily.AsyncTavilyClient()
+        # AsyncTavilyClient opens a new httpx.AsyncClient (new connection) per search and takes no
+        # client argument; its private _client_creator is replaced instead (tavily-python is pinned
+        # to 0.7.x in requirements.txt / pyproject.toml for this)
+        if not hasattr(_tavily_client, "_client_creator"):
+            print("--- tavily-python has no AsyncTavilyClient._client_creator: searches are not pooled ---")
+        else:
+            tool, base_url = get_tool("tavily_search"), _tavily_client._api_base_url
+            _tavily_client._client_creator = lambda: tool.async_http_client(
+                base_url=base_url,
+                headers={
+                    "Content-Type": "application/json",
+                    "Authorization": f"Bearer {os.getenv('TAVILY_API_KEY')}",
+                    "X-Client-Source": "tavily-python",
+                },
+            )
+    # deadline from the turn budget, optional hedged request (see call_policy.py)
+    return str(await call_with_policy("tavily_search", _tavily_client.search, query))
+
+
+@register_tool("grounded_search", cache_ttl_s=float(os.getenv("GROUNDED_CACHE_TTL", 3600)), max_concurrency=2,
+               key=_search_key)
+async def grounded_search(query: str) -> str:
+    """
+    Useful for searching the web about a specific query or topic
+    Args:
+        query (str): The query or topic to research
+    """
+    from google.genai import types
+
+    from call_policy import call_with_policy
+    from llm_factory import google_genai_llm
+
+    # gemini-2.5-pro with Google Search grounding, on the shared LLM connection pool (llm_factory.py)
+    llm_with_search = google_genai_llm(
+        model="gemini-2.5-pro",
+        generation_config=types.GenerateContentConfig(tools=[types.Tool(google_search=types.GoogleSearch())]),
+    )
+    # deadline from the workflow budget, optional hedged request (see call_policy.py)
+    response = await call_with_policy("grounded_search", llm_with_search.acomplete, f"""Please research given this query or topic,
+    and return the result\n<query_or_topic>{query}</query_or_topic>""")
+    return str(response)
+
+
+_serper_backend = None
+
+
+@register_tool("serper_search", cache_ttl_s=float(os.getenv("SEARCH_CACHE_TTL", 24 * 3600)), max_concurrency=4,
+               key=_search_key, cacheable=_cacheable_search)
+def serper_search(search_query: str, search_type: str = "search") -> Any:
+    """
+    A tool that can be used to search the internet with a search_query. Supports different search types: 'search' (default), 'news'
+    Args:
+        search_query (str): Mandatory search query you want to use to search the internet
+        search_type (str): Type of search, 'search' or 'news'
+    """
+    global _serper_backend
+    import cached_search
+
+    if _serper_backend is None:
+        # Serper (or SEARCH_BACKEND=offline), requests sent through the tool's pool
+        _serper_backend = cached_search.default_backend(client=get_tool("serper_search").http_client())
+    return _serper_backend.search(search_query, search_type)
@@ -0,0 +1,237 @@
+# Low-overhead tracing setup shared by the scripts
+#
+# phoenix.otel.register(..., auto_instrument=True) exports every span to Phoenix one at a time
+# (SimpleSpanProcessor), inline with the agent's work, and exports whole tool outputs.
+# setup_tracing() builds the tracer provider itself:
+# 1. Head sampling   - ParentBased(TraceIdRatioBased(TRACING_SAMPLE_RATIO)): unsampled traces
+#                      are never recorded at all
+# 2. Tail sampling   - with TRACING_TAIL=1, finished spans are buffered per trace and the whole
+#                      trace is kept only if it has an error, its root span took longer than
+#                      TRACING_SLOW_MS, or it falls in the TRACING_TAIL_KEEP_RATIO fraction
+# 3. Batched export  - a BatchSpanProcessor exports from a background thread; its queue is bounded
+#                      (TRACING_MAX_QUEUE), so a slow collector drops spans instead of growing memory
+# 4. Export path     - TRACING_EXPORT=phoenix (default) | otlp (local collector, OTEL_EXPORTER_OTLP_TRACES_ENDPOINT)
+#                      | file (JSON lines, TRACING_FILE) | console | none (no instrumentation at all)
+# 5. Truncation      - attribute values (prompts, tool outputs) are cut at TRACING_MAX_ATTRIBUTE_LENGTH
+# The OpenInference instrumentors installed in the environment (LlamaIndex, CrewAI, ...) are
+# loaded from their entry points, once per process, like auto_instrument=True does.
+#
+# Usage:
+#   from tracing import setup_tracing
+#   tracer_provider = setup_tracing(project_name="my-project")
+#
+# Overhead per agent turn: python -m benchmarks.tracing_overhead
+
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+from importlib.metadata import entry_points
+from typing import Dict, List, Optional, Sequence
+
+from opentelemetry import trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan, SpanLimits, SpanProcessor, TracerProvider
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor,
+    ConsoleSpanExporter,
+    SpanExporter,
+    SpanExportResult,
+)
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+from opentelemetry.trace import StatusCode
+
+PROJECT_NAME_ATTRIBUTE = "openinference.project.name"
+_instrumented: Dict[str, object] = {}
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+class JsonLinesSpanExporter(SpanExporter):
+    """Appends finished spans to a local file, one JSON object per line."""
+
+    def __init__(self, path: str = "traces.jsonl"):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        lines = "".join(json.dumps(json.loads(span.to_json())) + "\n" for span in spans)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self) -> None:
+        pass
+
+
+class TailSamplingProcessor(SpanProcessor):
+    """
+    Buffers the spans of each trace until its root span ends, then keeps or drops the whole trace.
+    Args:
+        next_processor: Processor that receives the spans of kept traces (e.g. a BatchSpanProcessor)
+        slow_ms (float): Always keep traces whose root span took at least this long
+        keep_ratio (float): Fraction of the remaining (fast, successful) traces to keep
+        max_traces (int): Open traces buffered at most; the oldest is dropped beyond that
+    """
+
+    def __init__(self, next_processor: SpanProcessor, slow_ms: float = 10_000, keep_ratio: float = 0.1,
+                 max_traces: int = 1000):
+        self._next = next_processor
+        self.slow_ns = int(slow_ms * 1e6)
+        self.keep_bound = int(keep_ratio * (2 ** 64))
+        self.max_traces = max_traces
+        self._pending: "OrderedDict[int, List[ReadableSpan]]" = OrderedDict()
+        # Spans that end after their root (background tasks) follow the trace's decision
+        self._decided: "OrderedDict[int, bool]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"traces_kept": 0, "traces_dropped": 0, "traces_evicted": 0}
+
+    def on_start(self, span, parent_context=None) -> None:
+        self._next.on_start(span, parent_context=parent_context)
+
+    def _keep(self, trace_id: int, spans: List[ReadableSpan], root: ReadableSpan) -> bool:
+        if any(s.status.status_code == StatusCode.ERROR for s in spans):
+            return True
+        if root.end_time - root.start_time >= self.slow_ns:
+            return True
+        # Lower 64 bits of the trace id are random, as in TraceIdRatioBased
+        return (trace_id & 0xFFFFFFFFFFFFFFFF) < self.keep_bound
+
+    def on_end(self, span: ReadableSpan) -> None:
+        trace_id = span.context.trace_id
+        with self._lock:
+            if trace_id in self._decided:
+                keep, spans = self._decided[trace_id], [span]
+            else:
+                spans = self._pending.setdefault(trace_id, [])
+                spans.append(span)
+                if span.parent is not None and not span.parent.is_remote:
+                    while len(self._pending) > self.max_traces:
+                        self._pending.popitem(last=False)
+                        self.stats["traces_evicted"] += 1
+                    return
+                spans = self._pending.pop(trace_id)
+                keep = self._keep(trace_id, spans, span)
+                self._decided[trace_id] = keep
+                if len(self._decided) > self.max_traces:
+                    self._decided.popitem(last=False)
+                self.stats["traces_kept" if keep else "traces_dropped"] += 1
+        if keep:
+            for s in spans:
+                self._next.on_end(s)
+
+    def shutdown(self) -> None:
+        # Traces whose root never ended (e.g. interrupted runs) are exported as they are
+        with self._lock:
+            pending = [s for spans in self._pending.values() for s in spans]
+            self._pending.clear()
+        for s in pending:
+            self._next.on_end(s)
+        self._next.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self._next.force_flush(timeout_millis)
+
+
+def make_exporter(mode: str, endpoint: Optional[str] = None) -> Optional[SpanExporter]:
+    """
+    Span exporter for an export mode.
+    Args:
+        mode (str): phoenix | otlp | file | console
+        endpoint (str): Collector endpoint (phoenix / otlp)
+    """
+    if mode == "phoenix":
+        from phoenix.otel import HTTPSpanExporter
+
+        return HTTPSpanExporter(endpoint=endpoint)
+    if mode == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+        return OTLPSpanExporter(
+            endpoint=endpoint or os.getenv("OTEL_EXPORTER_OTLP_TRACES_ENDPOINT", "http://localhost:4318/v1/traces")
+        )
+    if mode == "file":
+        return JsonLinesSpanExporter(os.getenv("TRACING_FILE", "traces.jsonl"))
+    if mode == "console":
+        return ConsoleSpanExporter()
+    raise ValueError(f"Unknown TRACING_EXPORT mode: {mode!r} (expected phoenix, otlp, file, console or none)")
+
+
+def instrument_installed_libraries(tracer_provider: TracerProvider) -> List[str]:
+    """Instrument every installed OpenInference library once per process."""
+    if sys.version_info < (3, 10):
+        eps = entry_points().get("openinference_instrumentor", [])
+    else:
+        eps = entry_points(group="openinference_instrumentor")
+    for ep in eps:
+        if ep.name in _instrumented:
+            continue
+        instrumentor = ep.load()()
+        instrumentor.instrument(tracer_provider=tracer_provider)
+        _instrumented[ep.name] = instrumentor
+    return list(_instrumented)
+
+
+def setup_tracing(
+    project_name: str,
+    endpoint: Optional[str] = None,
+    export: Optional[str] = None,
+    sample_ratio: Optional[float] = None,
+    tail_sampling: Optional[bool] = None,
+    max_queue_size: Optional[int] = None,
+    max_attribute_length: Optional[int] = None,
+    instrument: bool = True,
+) -> Optional[TracerProvider]:
+    """
+    Configure sampled, batched tracing (arguments default to the TRACING_* environment variables).
+    Args:
+        project_name (str): Phoenix project the spans belong to
+        endpoint (str): Collector endpoint for the phoenix / otlp export modes
+        export (str): phoenix | otlp | file | console | none
+        sample_ratio (float): Head sampling ratio (1.0 = every trace)
+        tail_sampling (bool): Keep only slow, failed or a fraction of the other traces
+        max_queue_size (int): Spans waiting for export at most; more are dropped
+        max_attribute_length (int): Attribute values are truncated to this many characters
+        instrument (bool): Instrument the installed OpenInference libraries
+    Returns:
+        TracerProvider, or None when tracing is disabled
+    """
+    export = (export or os.getenv("TRACING_EXPORT", "phoenix")).lower()
+    if export == "none":
+        return None
+    sample_ratio = _env_float("TRACING_SAMPLE_RATIO", 1.0) if sample_ratio is None else sample_ratio
+    if tail_sampling is None:
+        tail_sampling = os.getenv("TRACING_TAIL", "0").lower() in ("1", "true", "yes")
+    max_queue_size = max_queue_size or int(os.getenv("TRACING_MAX_QUEUE", 2048))
+    max_attribute_length = max_attribute_length or int(os.getenv("TRACING_MAX_ATTRIBUTE_LENGTH", 4096))
+
+    tracer_provider = TracerProvider(
+        resource=Resource.create({PROJECT_NAME_ATTRIBUTE: project_name}),
+        sampler=ParentBased(TraceIdRatioBased(sample_ratio)),
+        span_limits=SpanLimits(max_attribute_length=max_attribute_length),
+    )
+    processor: SpanProcessor = BatchSpanProcessor(
+        make_exporter(export, endpoint),
+        max_queue_size=max_queue_size,
+        max_export_batch_size=min(512, max_queue_size),
+        schedule_delay_millis=_env_float("TRACING_EXPORT_DELAY_MS", 2000),
+    )
+    if tail_sampling:
+        processor = TailSamplingProcessor(
+            processor,
+            slow_ms=_env_float("TRACING_SLOW_MS", 10_000),
+            keep_ratio=_env_float("TRACING_TAIL_KEEP_RATIO", 0.1),
+        )
+    tracer_provider.add_span_processor(processor)
+    trace.set_tracer_provider(tracer_provider)
+
+    if instrument:
+        instrument_installed_libraries(tracer_provider)
+    print(
+        f"--- Tracing: project {project_name!r}, export {export}, head sampling {sample_ratio:.0%}"
+        f"{', tail sampling' if tail_sampling else ''}, queue {max_queue_size} ---"
+    )
+    return tracer_provider